@@ -0,0 +1,95 @@
+# bench_components.py
+# Küçük bileşen temizliği: eski döngü (clean[labels == i] = 255) vs LUT.
+# Kullanım (testly_backend/ içinden):
+#   python -m bench.bench_components [--input storage/uploads] [--limit N]
+
+import argparse, glob, time
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+
+from testly_backend.services.refined_question_pipeline import (
+    imread_u, is_image, auto_block_size, filter_components, page_crop_user
+)
+
+
+def _filter_loop(binv, min_area):
+    # Eski davranış: bileşen başına tam kare geçiş
+    num, labels, stats, _ = cv.connectedComponentsWithStats(binv, 8)
+    clean = np.zeros_like(binv)
+    for i in range(1, num):
+        if stats[i, cv.CC_STAT_AREA] >= min_area:
+            clean[labels == i] = 255
+    return clean, num - 1
+
+
+def _page_binv(bgr):
+    H, W = bgr.shape[:2]
+    k = max(3, round(W / 400))
+    g = cv.cvtColor(bgr, cv.COLOR_BGR2GRAY)
+    g = cv.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(g)
+    thr = cv.adaptiveThreshold(g, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C,
+                               cv.THRESH_BINARY, 2 * k + 1, 10)
+    binv = cv.bitwise_not(thr)
+    mask = np.zeros_like(binv)
+    scale = np.sqrt(0.8)
+    new_W = int(W * scale); new_H = int(H * scale)
+    x1 = (W - new_W) // 2; y1 = (H - new_H) // 2
+    cv.rectangle(mask, (x1, y1), (x1 + new_W, y1 + new_H), 255, -1)
+    return cv.bitwise_and(binv, mask)
+
+
+def _refine_binv(page_crop):
+    H, W = page_crop.shape[:2]
+    g = cv.cvtColor(page_crop, cv.COLOR_BGR2GRAY)
+    g = cv.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(g)
+    thr = cv.adaptiveThreshold(g, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C,
+                               cv.THRESH_BINARY, auto_block_size(H, W), 10)
+    return 255 - thr
+
+
+def _time(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - t0) * 1000.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="small component removal: loop vs LUT")
+    ap.add_argument("--input", default="storage/uploads")
+    ap.add_argument("--limit", type=int, default=0)
+    args = ap.parse_args()
+
+    paths = sorted(p for p in glob.glob(str(Path(args.input) / "*")) if is_image(p))
+    if args.limit:
+        paths = paths[:args.limit]
+    if not paths:
+        print(f"[warn] no images under {Path(args.input).resolve()}")
+        return
+
+    tot_loop = tot_lut = 0.0
+    print(f"{'file':<14}{'stage':<8}{'comps':>7}{'loop ms':>11}{'lut ms':>10}{'speedup':>9}")
+    for p in paths:
+        bgr = imread_u(p, cv.IMREAD_COLOR)
+        if bgr is None:
+            print(f"[err] read fail: {p}")
+            continue
+        pc, _ = page_crop_user(bgr, debug=False)
+        for stage, binv in (("page", _page_binv(bgr)), ("refine", _refine_binv(pc))):
+            H, W = binv.shape[:2]
+            min_area = 0.00005 * W * H
+            (ref, ncomp), t_loop = _time(_filter_loop, binv, min_area)
+            new, t_lut = _time(filter_components, binv, min_area)
+            if not np.array_equal(ref, new):
+                print(f"[err] mask mismatch: {p} ({stage})")
+            tot_loop += t_loop; tot_lut += t_lut
+            print(f"{Path(p).stem[:12]:<14}{stage:<8}{ncomp:>7}"
+                  f"{t_loop:>11.1f}{t_lut:>10.1f}{t_loop / max(t_lut, 1e-6):>8.1f}x")
+
+    print(f"[total] loop {tot_loop:.0f} ms, lut {tot_lut:.0f} ms, "
+          f"speedup {tot_loop / max(tot_lut, 1e-6):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
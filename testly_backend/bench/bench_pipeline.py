@@ -0,0 +1,242 @@
+# bench_pipeline.py
+# Soru hattı için benchmark + golden regresyon kontrolü.
+#
+#   python -m bench.bench_pipeline                       # storage/uploads, 1 worker
+#   python -m bench.bench_pipeline --workers 1,2,4 --report bench_report.json
+#   python -m bench.bench_pipeline --update-golden       # golden çıktıları yeniden yaz
+#   python -m bench.bench_pipeline --encode              # çıktı biçimi x efor karşılaştırması
+#   python -m bench.bench_pipeline --morph packed        # bit paketli merge morfolojisi
+#   python -m bench.bench_pipeline --binarize sauvola    # eşikleme yöntemi; golden'a (gaussian) göre doğruluk
+#
+# Her görüntü için process_bytes çalıştırılır (timings=True); aşama ve uçtan
+# uca gecikme yüzdelikleri, worker başına tepe bellek (ru_maxrss) ve her
+# worker sayısı için throughput raporlanır. best_box / final_bw golden
+# çıktılarla karşılaştırılır (kaynak koordinatlarda kutu IoU'su, piksel
+# uyumu). --min-iou / --min-agreement altına düşen görüntü varsa çıkış
+# kodu 1 olur.
+
+import argparse, glob, json, os, resource, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+
+from testly_backend.services.binarize import get_methods, parse_spec, set_methods
+from testly_backend.services.encode import EFFORTS, FORMATS, encode_bw, read_bw
+from testly_backend.services.morphology import ENGINES, get_engine, set_engine
+from testly_backend.services.processing import process_bytes
+from testly_backend.services.refined_question_pipeline import is_image
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_GOLDEN = BENCH_DIR / "golden"
+
+
+def _source_quad(meta):
+    # best_box page crop koordinatında; page_rect ile kaynak koordinata taşı
+    box = np.float32(meta["best_box"]).reshape(4, 2)
+    x, y = meta.get("page_rect", [0, 0])[:2]
+    return box + np.float32([x, y])
+
+
+def box_iou(a, b) -> float:
+    a = cv.convexHull(np.float32(a)); b = cv.convexHull(np.float32(b))
+    inter, _ = cv.intersectConvexConvex(a, b)
+    union = cv.contourArea(a) + cv.contourArea(b) - inter
+    return float(inter / union) if union > 0 else 0.0
+
+
+def pixel_agreement(bw, ref) -> float:
+    if bw.shape != ref.shape:
+        # Boyut farkı: golden'ı mevcut çıktının boyutuna örnekle
+        ref = cv.resize(ref, (bw.shape[1], bw.shape[0]), interpolation=cv.INTER_NEAREST)
+    return float(np.count_nonzero(bw == ref)) / bw.size
+
+
+def _init_worker(morph, binarize):
+    set_engine(morph)
+    set_methods(**binarize)
+
+
+def _run_one(path, golden_dir, opts, update_golden):
+    stem = Path(path).stem
+    data = Path(path).read_bytes()
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        ok, out_path, meta = process_bytes(data, tmp, stem, timings=True, **opts)
+        wall = (time.perf_counter() - t0) * 1000.0
+        bw = read_bw(out_path) if ok else None
+
+    rec = {"file": Path(path).name, "ok": ok, "wall_ms": wall,
+           "bytes": len(data), "timings": meta.pop("timings", {}),
+           "error": meta.get("error") or meta.get("exception"),
+           "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}
+
+    g_json = Path(golden_dir) / f"{stem}.json"
+    g_png = Path(golden_dir) / f"{stem}_final.png"
+    if update_golden:
+        if ok:
+            g_json.write_text(json.dumps(meta, indent=1))
+            cv.imwrite(str(g_png), bw)
+        return rec
+    if g_json.exists():
+        ref = json.loads(g_json.read_text())
+        if ok:
+            rec["iou"] = box_iou(_source_quad(meta), _source_quad(ref))
+            ref_bw = cv.imread(str(g_png), cv.IMREAD_GRAYSCALE) if g_png.exists() else None
+            rec["agreement"] = pixel_agreement(bw, ref_bw) if ref_bw is not None else None
+        else:
+            rec["iou"] = rec["agreement"] = 0.0
+    return rec
+
+
+def _pct(values, qs=(50, 90, 99)):
+    if not values:
+        return {}
+    arr = np.asarray(values, dtype=np.float64)
+    out = {f"p{q}": round(float(np.percentile(arr, q)), 3) for q in qs}
+    out["mean"] = round(float(arr.mean()), 3)
+    return out
+
+
+def run(paths, workers, golden_dir, opts, update_golden=False):
+    t0 = time.perf_counter()
+    if workers <= 1:
+        recs = [_run_one(p, golden_dir, opts, update_golden) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(get_engine(), get_methods())) as ex:
+            recs = list(ex.map(_run_one, paths, [golden_dir] * len(paths),
+                               [opts] * len(paths), [update_golden] * len(paths)))
+    wall = time.perf_counter() - t0
+
+    stages = {}
+    for r in recs:
+        for name, ms in r["timings"].items():
+            stages.setdefault(name, []).append(ms)
+    ious = [r["iou"] for r in recs if r.get("iou") is not None]
+    agr = [r["agreement"] for r in recs if r.get("agreement") is not None]
+    return {
+        "workers": workers,
+        "images": len(recs),
+        "failures": sum(1 for r in recs if not r["ok"]),
+        "wall_s": round(wall, 3),
+        "throughput_ips": round(len(recs) / wall, 3) if wall > 0 else None,
+        "latency_ms": _pct([r["wall_ms"] for r in recs]),
+        "stages_ms": {k: _pct(v) for k, v in sorted(stages.items())},
+        "peak_rss_mb": round(max((r["maxrss_mb"] for r in recs), default=0.0), 1),
+        "accuracy": {"iou": _pct(ious, (1, 10, 50)), "agreement": _pct(agr, (1, 10, 50)),
+                     "compared": len(ious)},
+        "per_image": recs,
+    }
+
+
+def encode_sweep(golden_dir, repeat=3):
+    """
+    Golden final_bw çıktılarını her biçim x eforla kodlar: toplam bayt,
+    8 bit PNG'ye oran ve görüntü başına kodlama süresi (en iyi tekrar).
+    """
+    bws = [read_bw(str(p)) for p in sorted(Path(golden_dir).glob("*_final.png"))]
+    if not bws:
+        return []
+    rows = []
+    for fmt in FORMATS:
+        for effort in EFFORTS:
+            size, ms = 0, []
+            for bw in bws:
+                best = float("inf")
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    data = encode_bw(bw, fmt, effort)
+                    best = min(best, (time.perf_counter() - t0) * 1000.0)
+                size += len(data)
+                ms.append(best)
+            rows.append({"format": fmt, "effort": effort, "bytes": size,
+                         "encode_ms": _pct(ms, (50, 90))})
+    base = next(r["bytes"] for r in rows if r["format"] == "png" and r["effort"] == "balanced")
+    for r in rows:
+        r["ratio"] = round(r["bytes"] / base, 3)
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description="question pipeline benchmark + golden check")
+    ap.add_argument("--input", default="storage/uploads")
+    ap.add_argument("--golden", default=str(DEFAULT_GOLDEN))
+    ap.add_argument("--workers", default="1", help="virgülle ayrılmış, ör. 1,2,4")
+    ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--gray", action="store_true")
+    ap.add_argument("--format", default="png", choices=list(FORMATS))
+    ap.add_argument("--effort", default="balanced", choices=list(EFFORTS))
+    ap.add_argument("--morph", default="opencv", choices=list(ENGINES),
+                    help="merge morfolojisi motoru")
+    ap.add_argument("--binarize", default="", type=parse_spec,
+                    help="sauvola | page=mean,refine=sauvola (golden: gaussian)")
+    ap.add_argument("--sauvola-k", type=float, default=None)
+    ap.add_argument("--encode", action="store_true", help="yalnızca biçim x efor karşılaştırması")
+    ap.add_argument("--update-golden", action="store_true")
+    ap.add_argument("--min-iou", type=float, default=0.9)
+    ap.add_argument("--min-agreement", type=float, default=0.98)
+    ap.add_argument("--report", default="", help="JSON rapor yolu (boşsa stdout)")
+    args = ap.parse_args()
+    set_engine(args.morph)
+    set_methods(**args.binarize, sauvola_k=args.sauvola_k)
+
+    if args.encode:
+        rows = encode_sweep(args.golden)
+        for r in rows:
+            print(f"[{r['format']}/{r['effort']}] {r['bytes']} B (x{r['ratio']}), "
+                  f"p50 {r['encode_ms'].get('p50')} ms", file=sys.stderr)
+        text = json.dumps({"golden": str(Path(args.golden).resolve()), "encode": rows}, indent=1)
+        if args.report:
+            Path(args.report).write_text(text)
+        else:
+            print(text)
+        return 0 if rows else 1
+
+    paths = sorted(p for p in glob.glob(str(Path(args.input) / "**" / "*"), recursive=True)
+                   if is_image(p))
+    if args.limit:
+        paths = paths[:args.limit]
+    if not paths:
+        print(f"[warn] no images under {Path(args.input).resolve()}", file=sys.stderr)
+        return 1
+    Path(args.golden).mkdir(parents=True, exist_ok=True)
+    opts = {"gray": args.gray, "fmt": args.format, "effort": args.effort}
+
+    if args.update_golden:
+        res = run(paths, 1, args.golden, opts, update_golden=True)
+        print(f"[golden] {res['images'] - res['failures']} outputs -> {Path(args.golden).resolve()}",
+              file=sys.stderr)
+        return 0
+
+    runs = [run(paths, int(w), args.golden, opts) for w in args.workers.split(",") if w.strip()]
+    report = {"input": str(Path(args.input).resolve()), "options": opts, "morph": args.morph,
+              "binarize": get_methods(),
+              "cpu_count": os.cpu_count(), "runs": runs}
+
+    bad = [r["file"] for r in runs[0]["per_image"]
+           if r.get("iou") is not None and
+           (r["iou"] < args.min_iou or (r.get("agreement") or 0.0) < args.min_agreement)]
+    report["regressions"] = bad
+
+    for r in runs:
+        print(f"[workers={r['workers']}] {r['images']} imgs, {r['throughput_ips']} img/s, "
+              f"p50 {r['latency_ms'].get('p50')} ms, p90 {r['latency_ms'].get('p90')} ms, "
+              f"peak rss {r['peak_rss_mb']} MB, failures {r['failures']}", file=sys.stderr)
+    acc = runs[0]["accuracy"]
+    print(f"[accuracy] compared {acc['compared']}, iou p1 {acc['iou'].get('p1')}, "
+          f"agreement p1 {acc['agreement'].get('p1')}, regressions {len(bad)}", file=sys.stderr)
+
+    text = json.dumps(report, indent=1)
+    if args.report:
+        Path(args.report).write_text(text)
+    else:
+        print(text)
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
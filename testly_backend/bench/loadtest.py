@@ -0,0 +1,171 @@
+# loadtest.py
+# POST /api/v1/process-image için yük testi; workers x threads ızgarasında
+# en iyi gunicorn yapılandırmasını bulur.
+#
+#   python -m bench.loadtest --grid 1x1,2x1,2x2,4x1 --duration 20
+#   python -m bench.loadtest --url http://127.0.0.1:5000   # çalışan sunucuya tek koşu
+#
+# Izgara modunda her kombinasyon için gunicorn (gunicorn.conf.py) geçici bir
+# STORAGE_DIR ile, önbellek kapalı başlatılır; istemci eşzamanlılığı
+# varsayılan olarak 2 x workers x threads. Throughput, gecikme yüzdelikleri
+# ve hata sayısı raporlanır; en yüksek throughput'lu kombinasyon önerilir.
+
+import argparse, glob, json, os, socket, subprocess, sys, tempfile, threading, time, uuid
+import urllib.error, urllib.request
+from pathlib import Path
+
+import numpy as np
+
+from testly_backend.services.refined_question_pipeline import is_image
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _multipart(field, filename, data):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n").encode() + data + \
+           f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url, proc, timeout=120.0):
+    t_end = time.time() + timeout
+    while time.time() < t_end:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/api/v1/health", timeout=2) as r:
+                if r.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.5)
+    raise RuntimeError("server not ready")
+
+
+def drive(url, payloads, concurrency, duration, warmup=2):
+    """duration saniye boyunca concurrency istemciyle yük uygular."""
+    lat, errors = [], [0]
+    lock = threading.Lock()
+    t_start = time.perf_counter()
+    t_measure = t_start + warmup
+    t_end = t_measure + duration
+
+    def client(i):
+        n = i
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= t_end:
+                return
+            name, body, ctype = payloads[n % len(payloads)]
+            n += concurrency
+            req = urllib.request.Request(f"{url}/api/v1/process-image", data=body,
+                                         headers={"Content-Type": ctype}, method="POST")
+            try:
+                with urllib.request.urlopen(req, timeout=300) as r:
+                    r.read()
+                    ok = r.status == 200
+            except (urllib.error.URLError, ConnectionError, OSError):
+                ok = False
+            t1 = time.perf_counter()
+            if t0 < t_measure or t1 > t_end:
+                continue  # ısınma ya da pencere dışı
+            with lock:
+                if ok:
+                    lat.append((t1 - t0) * 1000.0)
+                else:
+                    errors[0] += 1
+
+    ts = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+
+    arr = np.asarray(lat) if lat else np.zeros(1)
+    return {"concurrency": concurrency, "requests": len(lat), "errors": errors[0],
+            "throughput_rps": round(len(lat) / duration, 3),
+            "latency_ms": {f"p{q}": round(float(np.percentile(arr, q)), 1) for q in (50, 90, 99)}}
+
+
+def run_combo(workers, threads, payloads, args):
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as storage:
+        env = dict(os.environ, BIND=f"127.0.0.1:{port}", WEB_WORKERS=str(workers),
+                   WEB_THREADS=str(threads), STORAGE_DIR=storage,
+                   RESULT_CACHE="0", KEEP_UPLOADS="0")
+        proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+                                cwd=ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _wait_ready(url, proc)
+            conc = args.concurrency or 2 * workers * threads
+            res = drive(url, payloads, conc, args.duration, args.warmup)
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return {"workers": workers, "threads": threads, **res}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="process-image load test / workers x threads sweep")
+    ap.add_argument("--input", default="storage/uploads")
+    ap.add_argument("--limit", type=int, default=8)
+    ap.add_argument("--grid", default="1x1,2x1,1x2,2x2", help="workersxthreads, virgülle")
+    ap.add_argument("--url", default="", help="verilirse sunucu başlatılmaz, tek koşu")
+    ap.add_argument("--concurrency", type=int, default=0)
+    ap.add_argument("--duration", type=float, default=20.0)
+    ap.add_argument("--warmup", type=float, default=2.0)
+    ap.add_argument("--report", default="")
+    args = ap.parse_args()
+
+    paths = sorted(p for p in glob.glob(str(Path(args.input) / "**" / "*"), recursive=True)
+                   if is_image(p))[:args.limit]
+    if not paths:
+        print(f"[warn] no images under {Path(args.input).resolve()}", file=sys.stderr)
+        return 1
+    payloads = [(Path(p).name, *_multipart("image", Path(p).name, Path(p).read_bytes()))
+                for p in paths]
+
+    if args.url:
+        _wait_ready(args.url, None)
+        runs = [drive(args.url, payloads, args.concurrency or 4, args.duration, args.warmup)]
+    else:
+        runs = []
+        for combo in args.grid.split(","):
+            w, t = (int(v) for v in combo.lower().split("x"))
+            r = run_combo(w, t, payloads, args)
+            runs.append(r)
+            print(f"[{w}x{t}] c={r['concurrency']} {r['throughput_rps']} req/s, "
+                  f"p50 {r['latency_ms']['p50']} ms, p90 {r['latency_ms']['p90']} ms, "
+                  f"errors {r['errors']}", file=sys.stderr)
+
+    report = {"cpu_count": os.cpu_count(), "images": len(paths), "runs": runs}
+    ok = [r for r in runs if r["requests"] and not r["errors"]]
+    if ok and not args.url:
+        best = max(ok, key=lambda r: (r["throughput_rps"], -r["latency_ms"]["p90"]))
+        report["best"] = {"workers": best["workers"], "threads": best["threads"]}
+        print(f"[best] WEB_WORKERS={best['workers']} WEB_THREADS={best['threads']}",
+              file=sys.stderr)
+
+    text = json.dumps(report, indent=1)
+    if args.report:
+        Path(args.report).write_text(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+# gunicorn.conf.py
+#   gunicorn -c gunicorn.conf.py
+# WEB_WORKERS x WEB_THREADS eşzamanlı istek; her worker'da OpenCV thread
+# sayısı CV_THREADS (0 ise çekirdekler / (workers x threads)).
+import os
+
+# Varsayılan en fazla 4 worker: her worker'ın kabul kontrolü bellek bütçesi
+# (2 GiB / workers, en az MAX_PIXELS'lik bir görüntü) kullanılabilir kalır;
+# kalan çekirdekler worker başına OpenCV thread'lerine gider
+workers = int(os.getenv("WEB_WORKERS", min(4, os.cpu_count() or 1)))
+# Config süreç başına bütçeleri (iş kuyruğu, batch, kabul kontrolü) buna böler;
+# testly_backend import edilmeden önce ayarlanmalı
+os.environ["WEB_WORKERS"] = str(workers)
+# Saklama sweep thread'i master'da (preload) değil worker'larda başlar
+os.environ["STORAGE_SWEEP_IN_APP"] = "0"
+
+from testly_backend.services.jobs import cv_threads_for  # noqa: E402
+
+wsgi_app = "wsgi:app"
+bind = os.getenv("BIND", "0.0.0.0:5000")
+threads = int(os.getenv("WEB_THREADS", 1))
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = int(os.getenv("WEB_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+# Uzun süre çalışan worker'larda parçalanmış belleği geri vermek için
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+preload_app = True
+accesslog = os.getenv("ACCESS_LOG") or None
+
+
+def post_fork(server, worker):
+    import cv2 as cv
+    n = int(os.getenv("CV_THREADS", 0)) or cv_threads_for(workers * threads)
+    cv.setNumThreads(n)
+    server.log.info("worker %s: cv threads %d", worker.pid, n)
+    # Kilit dosyası süreçler arasında tek tarayıcıya izin verir
+    worker.app.wsgi().extensions["retention"].start()
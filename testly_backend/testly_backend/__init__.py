@@ -1,24 +1,170 @@
 # testly_backend/__init__.py
-from flask import Flask, send_from_directory
+import io, json
+import click
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Request
 from flask_cors import CORS
 from config import Config
 from .api.v1 import api_v1
+from .services.admission import Admission
+from .services.binarize import set_methods
+from .services.jobs import JobQueue, JobStore, cv_threads_for
+from .services.morphology import set_engine
+from .services.result_cache import ResultCache
+from .services.results_index import ResultsIndex
+from .services.static_files import serve_immutable
+from .services.storage import Retention, shard_name
+from .services.tracking import Tracker
+
+class InMemoryRequest(Request):
+    # Yüklenen dosyalar geçici dosyaya değil belleğe alınır
+    # (boyut MAX_CONTENT_LENGTH ile zaten sınırlı)
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        return io.BytesIO()
 
 def create_app():
     app = Flask(__name__)
+    app.request_class = InMemoryRequest
     app.config.from_object(Config)
     CORS(app, resources={r"/api/*": {"origins": app.config["CORS_ORIGINS"]}})
+    set_engine(app.config["MORPH_ENGINE"])
+    binarize = {"page": app.config["BINARIZE_PAGE"], "refine": app.config["BINARIZE_REFINE"],
+                "final": app.config["BINARIZE_FINAL"], "sauvola_k": app.config["SAUVOLA_K"]}
+    set_methods(**binarize)
+
+    # Asenkron iş kuyruğu (havuz ilk işte kurulur; havuz worker başına, iş
+    # durumları JobStore'da ortak)
+    app.extensions["jobs"] = JobQueue(
+        backend=app.config["JOBS_BACKEND"],
+        workers=app.config["JOBS_WORKERS"],
+        max_pending=app.config["JOBS_MAX_PENDING"],
+        timeout=app.config["JOBS_TIMEOUT"],
+        ttl=app.config["JOBS_TTL"],
+        cv_threads=app.config["CV_THREADS"] or cv_threads_for(
+            app.config["JOBS_WORKERS"] * app.config["WEB_WORKERS"]),
+        morph_engine=app.config["MORPH_ENGINE"],
+        binarize=binarize,
+        store=JobStore(app.config["JOBS_STORE_PATH"]),
+    )
+
+    # Senkron işleme için kabul kontrolü
+    app.extensions["admission"] = Admission(
+        max_concurrent=app.config["ADMISSION_MAX_CONCURRENT"],
+        memory_budget=app.config["ADMISSION_MEMORY_BUDGET"],
+        max_queue=app.config["ADMISSION_MAX_QUEUE"],
+        queue_timeout=app.config["ADMISSION_QUEUE_TIMEOUT"],
+    )
+
+    # Canlı önizleme takip oturumları
+    app.extensions["tracker"] = Tracker(
+        app.config["TRACK_DIR"],
+        long_edge=app.config["DETECT_LONG_EDGE_PREVIEW"],
+        ttl=app.config["TRACK_TTL"],
+        max_sessions=app.config["TRACK_MAX_SESSIONS"],
+        min_score=app.config["TRACK_MIN_SCORE"],
+        margin=app.config["TRACK_MARGIN"],
+        smoothing=app.config["TRACK_SMOOTHING"],
+        max_frame_bytes=app.config["TRACK_MAX_FRAME_BYTES"],
+    )
+
+    # Çoklu yükleme havuzu: OpenCV GIL'i bıraktığı için thread yeterli
+    app.extensions["batch_pool"] = ThreadPoolExecutor(
+        max_workers=max(1, app.config["BATCH_PARALLELISM"]), thread_name_prefix="batch")
+
+    # Sonuç önbelleği
+    if app.config["RESULT_CACHE"]:
+        app.extensions["result_cache"] = ResultCache(
+            app.config["RESULT_CACHE_PATH"],
+            app.config["OUTPUT_DIR"],
+            max_age=app.config["RESULT_CACHE_MAX_AGE"],
+            max_bytes=app.config["RESULT_CACHE_MAX_BYTES"],
+            upload_dir=app.config["UPLOAD_DIR"],
+        )
+
+    # İşlenmiş soru indeksi (yazımlar arka planda, gruplu)
+    if app.config["RESULTS_INDEX"]:
+        app.extensions["results_index"] = ResultsIndex(
+            app.config["RESULTS_DB_URI"],
+            app.config["OUTPUT_DIR"],
+            pool_size=app.config["RESULTS_DB_POOL_SIZE"],
+            batch_size=app.config["RESULTS_BATCH_SIZE"],
+            flush_interval=app.config["RESULTS_FLUSH_INTERVAL"],
+            max_pending=app.config["RESULTS_MAX_PENDING"],
+        )
+
+    # Saklama politikası (arka planda; süreçler arası tek tarayıcı, kilit dosyası)
+    app.extensions["retention"] = Retention(
+        {"uploads": {"root": app.config["UPLOAD_DIR"], "max_age": app.config["UPLOAD_MAX_AGE"],
+                     "max_bytes": app.config["UPLOAD_MAX_BYTES"]},
+         "outputs": {"root": app.config["OUTPUT_DIR"], "max_age": app.config["OUTPUT_MAX_AGE"],
+                     "max_bytes": app.config["OUTPUT_MAX_BYTES"]}},
+        interval=app.config["STORAGE_SWEEP_INTERVAL"],
+        lock_path=app.config["OUTPUT_DIR"].parent / ".retention.lock",
+        stats_path=app.config["OUTPUT_DIR"].parent / ".retention.json",
+    )
+    # preload_app'li gunicorn'da thread worker'larda başlatılır (gunicorn.conf.py post_fork)
+    if app.config["STORAGE_SWEEP_IN_APP"]:
+        app.extensions["retention"].start()
 
     # API
     app.register_blueprint(api_v1, url_prefix="/api/v1")
 
-    # Statik servis: işlenmiş ve yüklenen dosyalar
+    # Toplu işleme: flask --app app batch <input_dir> [--workers N]
+    @app.cli.command("batch")
+    @click.argument("input_dir")
+    @click.option("--output-dir", default=None, help="varsayılan OUTPUT_DIR")
+    @click.option("--workers", type=int, default=None)
+    @click.option("--retry-failed", is_flag=True)
+    def batch_command(input_dir, output_dir, workers, retry_failed):
+        from .services.batch import run_batch
+        summary = run_batch(input_dir, output_dir or app.config["OUTPUT_DIR"],
+                            workers=workers, retry_failed=retry_failed,
+                            gray=app.config["GRAY_PIPELINE"],
+                            morph_engine=app.config["MORPH_ENGINE"],
+                            binarize=binarize)
+        click.echo(json.dumps(summary, indent=1))
+
+    # Çok sayfalı belge (PDF / TIFF), sayfa sayfa: flask --app app document <yol>
+    @app.cli.command("document")
+    @click.argument("path")
+    @click.option("--output-dir", default=None, help="varsayılan OUTPUT_DIR")
+    @click.option("--workers", type=int, default=None)
+    @click.option("--in-flight", type=int, default=0, help="aynı anda bellekteki en fazla sayfa")
+    def document_command(path, output_dir, workers, in_flight):
+        from .services.pdf_service import run_document
+        summary = run_document(path, output_dir or app.config["OUTPUT_DIR"],
+                               workers=workers, in_flight=in_flight,
+                               dpi=app.config["DOCUMENT_DPI"],
+                               max_pages=app.config["DOCUMENT_MAX_PAGES"],
+                               max_pixels=app.config["MAX_PIXELS"],
+                               gray=app.config["GRAY_PIPELINE"],
+                               morph_engine=app.config["MORPH_ENGINE"],
+                               binarize=binarize,
+                               progress=lambda rec: click.echo(json.dumps(rec, ensure_ascii=False)))
+        click.echo(json.dumps(summary, indent=1))
+
+    # Saklama politikasını hemen uygula: flask --app app sweep
+    @app.cli.command("sweep")
+    def sweep_command():
+        click.echo(json.dumps(app.extensions["retention"].run_once(), indent=1))
+
+    # Statik servis: işlenmiş ve yüklenen dosyalar (immutable + ETag/304).
+    # Dosyalar ab/cd/<ad> altında; eski düz adlar (dizinsiz) yoksa shard'a çevrilir.
+    def _static(kind, directory, filename):
+        if "/" not in filename and not (directory / filename).is_file():
+            filename = shard_name(filename)
+        prefix = (f"{app.config['STATIC_ACCEL_PREFIX'].rstrip('/')}/{kind}"
+                  if app.config["STATIC_HANDOFF"] == "nginx" else None)
+        return serve_immutable(directory, filename, max_age=app.config["STATIC_MAX_AGE"],
+                               accel_prefix=prefix)
+
     @app.get("/uploads/<path:filename>")
     def uploads_file(filename):
-        return send_from_directory(app.config["UPLOAD_DIR"], filename, as_attachment=False)
+        return _static("uploads", app.config["UPLOAD_DIR"], filename)
 
     @app.get("/outputs/<path:filename>")
     def outputs_file(filename):
-        return send_from_directory(app.config["OUTPUT_DIR"], filename, as_attachment=False)
+        return _static("outputs", app.config["OUTPUT_DIR"], filename)
 
     return app
@@ -1,9 +1,17 @@
-# testly_backend/api/v1.py
-import os, uuid
+import json, os, uuid
+from datetime import timezone
 from pathlib import Path
-from flask import Blueprint, current_app, request, jsonify, url_for
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context, url_for
 from werkzeug.utils import secure_filename
-from ..services.processing import process_file
+from ..services.admission import Rejected
+from ..services.encode import EFFORTS, FORMATS
+from ..services.pdf_service import Document, DocumentError, stream_document
+from ..services.processing import ImageTooLarge, decode_plan, detect_bytes, process_bytes
+from ..services.storage import rel_name, shard_name, write_bytes_async
+from ..services.jobs import QueueFull
+from ..services.result_cache import cache_key, upload_hash
+from ..services.results_index import question_rows
+from ..services.metrics import CONTENT_TYPE, metrics, observe_result
 
 api_v1 = Blueprint("api_v1", __name__)
 
@@ -15,12 +23,161 @@ def _allowed(filename: str) -> bool:
     ext = os.path.splitext(filename)[1].lower()
     return ext in current_app.config["ALLOWED_EXTS"]
 
+def _flag(name: str) -> bool:
+    return request.values.get(name, "0").lower() in ("1", "true", "yes")
+
+def _count(endpoint: str, outcome: str):
+    metrics.inc("testly_requests_total", {"endpoint": endpoint, "outcome": outcome})
+
+def _owner():
+    # Sahip kimliği (istemcinin gönderdiği; kimlik doğrulama yok)
+    owner = request.headers.get("X-User-Id") or request.values.get("user_id") or ""
+    return owner.strip()[:64] or None
+
+def _recorder(digest: str):
+    """
+    Başarılı sonucu soru indeksine işleyen fonksiyon (app context dışında da
+    çağrılabilir); indeks kapalıysa None. cached: önbellekten dönen sonuç;
+    sahipsizse yazılmaz, sahibinde zaten varsa tekrarlanmaz.
+    """
+    index = current_app.extensions.get("results_index")
+    if index is None:
+        return None
+    owner, out_dir = _owner(), current_app.config["OUTPUT_DIR"]
+    def record(meta: dict, upload_name: str, result_path: str, cached: bool = False):
+        if cached and owner is None:
+            return
+        index.record(question_rows(meta, digest, upload_name,
+                                   rel_name(out_dir, result_path), owner), dedupe=cached)
+    return record
+
+def _finish(ok: bool, meta: dict, upload_bytes: int, want_timings: bool,
+            cache=None, key=None, upload_name="", result_path="", record=None):
+    # Metrikleri işle, indekse yaz; istemci istemediyse süreleri meta'dan çıkar
+    observe_result(ok, meta, upload_bytes)
+    if ok and record is not None:
+        record(meta, upload_name, result_path)
+    timings = meta.pop("timings", None)
+    if ok and cache is not None:
+        cache.put(key, upload_name, result_path, meta)
+    if want_timings and timings is not None:
+        meta["timings"] = timings
+
+def _keep_upload(data: bytes, uid: str, ext: str, up_dir: Path, keep: bool):
+    """
+    Orijinali arka planda saklar; işleme bellekteki baytlardan yapılır.
+    Dönen fonksiyon (bir kez, işlemeden sonra çağrılır) yazımı bekler ve
+    yükleme adını döner; saklanmıyorsa ya da yazılamadıysa "" (original_url
+    null: henüz var olmayan dosyanın URL'i verilmez).
+    """
+    if not keep:
+        return lambda: ""
+    upload_name = shard_name(secure_filename(f"{uid}{ext}"))
+    fut = write_bytes_async(up_dir / upload_name, data)
+    def stored() -> str:
+        if fut.result():
+            return upload_name
+        metrics.inc("testly_upload_write_failures_total")
+        return ""
+    return stored
+
+def _work_cost(data: bytes, cfg) -> int:
+    """
+    Başlıktaki boyuttan tahmini çalışma belleği (bayt); decode yok.
+    Piksel bütçesini aşıp reddedilecek görüntüler burada 413 alır.
+    """
+    try:
+        plan = decode_plan(data, cfg["MAX_PIXELS"], cfg["OVERSIZE_POLICY"],
+                           cfg["MAX_DECODE_PIXELS"])
+    except ImageTooLarge:
+        raise Rejected("too_large", 413)
+    if plan is None:
+        # Başlık okunamadı: eşzamanlı işler arasında adil pay
+        return cfg["ADMISSION_MEMORY_BUDGET"] // max(1, cfg["ADMISSION_MAX_CONCURRENT"])
+    # Hat çalışma kümesi + küçültme öncesi geçici tam decode (3 kanal)
+    return (plan["work_pixels"] * cfg["ADMISSION_BYTES_PER_PIXEL"]
+            + (plan["decode_pixels"] - plan["work_pixels"]) * 3 + len(data))
+
+def _rejected(endpoint: str, e: Rejected):
+    _count(endpoint, "rejected")
+    metrics.inc("testly_admission_rejected_total", {"reason": e.reason})
+    headers = {"Retry-After": str(e.retry_after)} if e.retry_after else {}
+    return jsonify({"error": e.reason}), e.status, headers
+
+def _on_job_done(cache, key, upload_bytes, want_timings, record=None):
+    def on_done(job):
+        job["context"]["upload"] = job["context"]["upload"]()  # yazım bitti mi
+        if job["error"] is not None:
+            # Hata / zaman aşımı: sonuç yok, yalnızca metrikler
+            observe_result(False, {"error": "timeout"} if job["status"] == "timeout"
+                           else {"exception": job["error"]}, upload_bytes)
+            return
+        ok, result_path, meta = job["result"]
+        _finish(ok, meta, upload_bytes, want_timings,
+                cache, key, job["context"]["upload"], result_path, record)
+    return on_done
+
+def _result_urls(upload_name: str, result_path: str, meta: dict = None) -> dict:
+    # Tam URL döndür (yükleme saklanmıyorsa original_url null); result_path
+    # OUTPUT_DIR altında mutlak ya da ona göreli (önbellek kaydı)
+    urls = {
+        "original_url": url_for("uploads_file", filename=upload_name, _external=True)
+                        if upload_name else None,
+        "processed_url": url_for("outputs_file",
+                                 filename=rel_name(current_app.config["OUTPUT_DIR"], result_path),
+                                 _external=True),
+    }
+    if meta and "questions" in meta:
+        urls["processed_urls"] = [url_for("outputs_file", filename=q["output"], _external=True)
+                                  for q in meta["questions"]]
+    return urls
+
+def _out_format() -> str:
+    """
+    Sonuç biçimi: format parametresi, yoksa Accept'te açıkça istenen
+    image/webp ya da image/tiff, yoksa OUTPUT_FORMAT. Geçersizse ValueError.
+    """
+    fmt = request.values.get("format", "").lower()
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {sorted(FORMATS)}")
+        return fmt
+    accepted = {m for m, q in request.accept_mimetypes if q > 0}
+    for name in ("webp", "tiff"):
+        if FORMATS[name][1] in accepted:
+            return name
+    return current_app.config["OUTPUT_FORMAT"]
+
+def _effort() -> str:
+    effort = request.values.get("effort", current_app.config["ENCODE_EFFORT"]).lower()
+    if effort not in EFFORTS:
+        raise ValueError(f"effort must be one of {list(EFFORTS)}")
+    return effort
+
+def _opts() -> dict:
+    # Hat parametreleri (önbellek anahtarına da girer); geçersizse ValueError
+    cfg = current_app.config
+    opts = {"gray": cfg["GRAY_PIPELINE"],
+            "explain": _flag("explain"), "max_pixels": cfg["MAX_PIXELS"],
+            "oversize": cfg["OVERSIZE_POLICY"], "max_decode_pixels": cfg["MAX_DECODE_PIXELS"],
+            "fmt": _out_format(), "effort": _effort()}
+    if _flag("multi"):
+        opts["multi"] = {"min_score": cfg["MULTI_MIN_SCORE"], "nms_iou": cfg["MULTI_NMS_IOU"],
+                         "max_questions": cfg["MULTI_MAX_QUESTIONS"]}
+    return opts
+
 @api_v1.post("/process-image")
 def process_image():
     """
     multipart/form-data:
       - image: dosya
       - show: '0'|'1' (opsiyonel, debug görsellerini üretmez)
+      - async: '0'|'1' (opsiyonel; 1 ise hemen job_id döner -> GET /jobs/<id>)
+      - timings: '0'|'1' (opsiyonel; aşama süreleri meta.timings altında)
+      - explain: '0'|'1' (opsiyonel; ilk adaylar skor/öznitelikle meta.candidates altında)
+      - multi: '0'|'1' (opsiyonel; sayfadaki tüm sorular -> processed_urls, meta.questions)
+      - format: png|png1|tiff|webp (opsiyonel; yoksa Accept: image/webp|image/tiff)
+      - effort: fast|balanced|small (opsiyonel; kodlama hızı <-> dosya boyutu)
     """
     if "image" not in request.files:
         return jsonify({"error": "image is required"}), 400
@@ -33,22 +190,512 @@ def process_image():
     up_dir: Path = current_app.config["UPLOAD_DIR"]
     out_dir: Path = current_app.config["OUTPUT_DIR"]
 
+    data = f.read()
+    try:
+        opts = _opts()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    want_timings = _flag("timings")
+    timings = want_timings or current_app.config["METRICS"]
+    digest = upload_hash(data)
+    record = _recorder(digest)
+
+    # Aynı fotoğraf aynı parametrelerle daha önce işlendiyse decode etmeden dön
+    cache = current_app.extensions.get("result_cache")
+    key = None
+    if cache is not None:
+        key = cache_key(digest, opts)
+        hit = cache.get(key)
+        if hit is not None:
+            if record is not None:
+                record(hit["meta"], hit["upload_name"], hit["output_name"], cached=True)
+            _count("process-image", "cached")
+            return jsonify({**_result_urls(hit["upload_name"], hit["output_name"], hit["meta"]),
+                            "meta": hit["meta"], "cached": True})
+
+    # Başlıktan boyut: piksel bütçesini aşan görüntü decode edilmeden 413
+    try:
+        cost = _work_cost(data, current_app.config)
+    except Rejected as e:
+        return _rejected("process-image", e)
+
     uid = uuid.uuid4().hex
     ext = os.path.splitext(f.filename)[1].lower()
-    safe_name = secure_filename(f"{uid}{ext}")
-    up_path = up_dir / safe_name
-    f.save(str(up_path))
+    keep = current_app.config["KEEP_UPLOADS"]
+
+    if _flag("async"):
+        # Eşzamanlılık iş kuyruğunda sınırlı (JOBS_WORKERS, JOBS_MAX_PENDING)
+        upload = _keep_upload(data, uid, ext, up_dir, keep)
+        jobs = current_app.extensions["jobs"]
+        try:
+            job_id = jobs.submit(process_bytes, data, str(out_dir), uid,
+                                 context={"upload": upload},
+                                 on_done=_on_job_done(cache, key, len(data), want_timings,
+                                                      record),
+                                 show=False, timings=timings, shard=True, **opts)
+        except QueueFull:
+            _count("process-image", "rejected")
+            return jsonify({"error": "queue_full"}), 503, {"Retry-After": "5"}
+        except Exception:
+            # Havuz kurulamadı / kapandı: iş kuyruktan zaten silindi
+            current_app.logger.exception("job dispatch failed")
+            _count("process-image", "rejected")
+            return jsonify({"error": "queue_unavailable"}), 503, {"Retry-After": "5"}
+        _count("process-image", "queued")
+        return jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": url_for("api_v1.job_status", job_id=job_id, _external=True),
+        }), 202
 
-    ok, result_path, meta = process_file(str(up_path), str(out_dir), show=False)
+    # Kabul kontrolü: doluysa kısa bekle, olmazsa hızlı 429/503
+    try:
+        with current_app.extensions["admission"].admit(cost):
+            upload = _keep_upload(data, uid, ext, up_dir, keep)
+            ok, result_path, meta = process_bytes(data, str(out_dir), uid, show=False,
+                                                  timings=timings, shard=True, **opts)
+            upload_name = upload()
+    except Rejected as e:
+        return _rejected("process-image", e)
+    _finish(ok, meta, len(data), want_timings, cache, key, upload_name, result_path, record)
     if not ok:
+        _count("process-image", "failed")
         return jsonify({"error": "processing_failed", "detail": meta}), 500
 
-    # Tam URL döndür
-    original_url = url_for("uploads_file", filename=up_path.name, _external=True)
-    processed_url = url_for("outputs_file", filename=Path(result_path).name, _external=True)
+    _count("process-image", "ok")
+    return jsonify({**_result_urls(upload_name, result_path, meta), "meta": meta})
+
+@api_v1.post("/detect")
+def detect():
+    """
+    Kamera önizlemesi için hızlı tespit (dosya yazılmaz, önbellek yok).
+    Kadraj ipucudur; kaydedilecek kare /process-image'e tam çözünürlükte
+    yüklenir (bkz. processing.detect_bytes).
+    multipart/form-data:
+      - image: küçük önizleme karesi
+      - source_long_edge: asıl çekimin uzun kenarı (opsiyonel)
+      - top_k: 1..5 (opsiyonel; ek adaylar candidates altında)
+      - timings: '0'|'1' (opsiyonel)
+    Dönüş: {found, good, quad, score, page_rect, frame_size, candidates};
+    koordinatlar gönderilen karede.
+    """
+    if "image" not in request.files:
+        return jsonify({"error": "image is required"}), 400
+    cfg = current_app.config
+    try:
+        source_long_edge = max(0, int(request.values.get("source_long_edge", 0)))
+        top_k = min(5, max(1, int(request.values.get("top_k", 1))))
+    except ValueError:
+        return jsonify({"error": "source_long_edge and top_k must be integers"}), 400
+
+    data = request.files["image"].read()
+    want_timings = _flag("timings")
+    res = detect_bytes(data, cfg["DETECT_LONG_EDGE_PREVIEW"], source_long_edge, top_k,
+                       max_pixels=cfg["MAX_PIXELS"],
+                       timings=want_timings or cfg["METRICS"])
+    timings = res.pop("timings", None)
+    if timings is not None:
+        metrics.observe("testly_detect_seconds", timings["total"] / 1000.0)
+        if want_timings:
+            res["timings"] = timings
+    if "error" in res:
+        _count("detect", "failed")
+        return jsonify(res), 413 if res["error"] == "too_large" else 400
+
+    res["found"] = res["quad"] is not None
+    res["good"] = res["found"] and res["score"] >= cfg["DETECT_GOOD_SCORE"]
+    _count("detect", "ok")
+    return jsonify(res)
 
+@api_v1.post("/track")
+def track_create():
+    """
+    Ardışık önizleme kareleri için takip oturumu açar.
+      - source_long_edge: asıl çekimin uzun kenarı (opsiyonel, bkz. /detect)
+    Kareler POST /track/<id>/frames, sonuç POST /track/<id>/finish.
+    """
+    try:
+        source_long_edge = max(0, int(request.values.get("source_long_edge", 0)))
+    except ValueError:
+        return jsonify({"error": "source_long_edge must be an integer"}), 400
+    sid = current_app.extensions["tracker"].create(source_long_edge)
+    _count("track", "created")
     return jsonify({
-        "original_url": original_url,
-        "processed_url": processed_url,
-        "meta": meta
-    })
+        "session_id": sid,
+        "ttl": current_app.config["TRACK_TTL"],
+        "frames_url": url_for("api_v1.track_frame", session_id=sid, _external=True),
+        "finish_url": url_for("api_v1.track_finish", session_id=sid, _external=True),
+    }), 201
+
+@api_v1.post("/track/<session_id>/frames")
+def track_frame(session_id):
+    """
+    multipart/form-data: image (sıradaki kare).
+    Dönüş: {frame, mode: track|detect, quad, score, sharpness, best_frame,
+    frame_size, good}; koordinatlar gönderilen karede.
+    """
+    if "image" not in request.files:
+        return jsonify({"error": "image is required"}), 400
+    f = request.files["image"]
+    cfg = current_app.config
+    try:
+        res = current_app.extensions["tracker"].frame(
+            session_id, f.read(), max_pixels=cfg["MAX_PIXELS"],
+            ext=os.path.splitext(f.filename or "")[1].lower())
+    except ImageTooLarge:
+        _count("track", "failed")
+        return jsonify({"error": "too_large"}), 413
+    if res is None:
+        return jsonify({"error": "session not found"}), 404
+    if "error" in res:
+        _count("track", "failed")
+        return jsonify(res), 400
+    res["good"] = res["score"] is not None and res["score"] >= cfg["DETECT_GOOD_SCORE"]
+    _count("track", "frame")
+    return jsonify(res)
+
+@api_v1.post("/track/<session_id>/finish")
+def track_finish(session_id):
+    """
+    En keskin kare process-image hattından geçer (tespit tam çözünürlükte
+    yeniden yapılır; önizleme quad'ı yalnızca kare seçimi için); oturum
+    kapanır. format, effort, explain, multi: process-image ile aynı.
+    meta.preview_score: karenin önizlemedeki takip skoru.
+    """
+    tracker = current_app.extensions["tracker"]
+    try:
+        best = tracker.best(session_id)
+    except KeyError:
+        return jsonify({"error": "session not found"}), 404
+    if best is None:
+        return jsonify({"error": "no_candidate"}), 409
+    try:
+        opts = _opts()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    cfg = current_app.config
+    data = best["data"]
+    want_timings = _flag("timings")
+    try:
+        cost = _work_cost(data, cfg)
+        with current_app.extensions["admission"].admit(cost):
+            uid = uuid.uuid4().hex
+            upload = _keep_upload(data, uid, best["ext"] or ".jpg",
+                                  cfg["UPLOAD_DIR"], cfg["KEEP_UPLOADS"])
+            ok, result_path, meta = process_bytes(
+                data, str(cfg["OUTPUT_DIR"]), uid,
+                timings=want_timings or cfg["METRICS"], shard=True, **opts)
+            upload_name = upload()
+    except Rejected as e:
+        return _rejected("track", e)
+    _finish(ok, meta, len(data), want_timings, upload_name=upload_name,
+            result_path=result_path, record=_recorder(upload_hash(data)))
+    if not ok:
+        _count("track", "failed")
+        return jsonify({"error": "processing_failed", "detail": meta}), 500
+    tracker.close(session_id)
+    _count("track", "ok")
+    meta.update(frame=best["frame"], preview_score=round(best["score"], 4),
+                sharpness=round(best["sharpness"], 2))
+    return jsonify({**_result_urls(upload_name, result_path, meta), "meta": meta})
+
+@api_v1.delete("/track/<session_id>")
+def track_close(session_id):
+    if not current_app.extensions["tracker"].close(session_id):
+        return jsonify({"error": "session not found"}), 404
+    return "", 204
+
+def _process_item(data: bytes, digest: str, ext: str, opts: dict, timings: bool,
+                  want_timings: bool, cache, up_dir: Path, out_dir: Path, keep_uploads: bool,
+                  admission, cost: int, record=None):
+    # Çoklu yüklemenin tek öğesi; worker thread'de çalışır (app context yok)
+    key = None
+    if cache is not None:
+        key = cache_key(digest, opts)
+        hit = cache.get(key)
+        if hit is not None:
+            if record is not None:
+                record(hit["meta"], hit["upload_name"], hit["output_name"], cached=True)
+            return True, hit["upload_name"], hit["output_name"], hit["meta"], True
+    uid = uuid.uuid4().hex
+    with admission.admit(cost):
+        upload = _keep_upload(data, uid, ext, up_dir, keep_uploads)
+        ok, result_path, meta = process_bytes(data, str(out_dir), uid, show=False,
+                                              timings=timings, shard=True, **opts)
+        upload_name = upload()
+    _finish(ok, meta, len(data), want_timings, cache, key, upload_name, result_path, record)
+    return ok, upload_name, result_path, meta, False
+
+@api_v1.post("/process-images")
+def process_images():
+    """
+    multipart/form-data:
+      - images: dosya (birden çok kez)
+      - timings, explain, multi, format, effort: process-image ile aynı (opsiyonel)
+    Görüntüler BATCH_PARALLELISM sınırıyla eşzamanlı işlenir; sonuçlar
+    girdi sırasıyla, öğe bazında hata bilgisiyle döner.
+    """
+    files = request.files.getlist("images")
+    if not files:
+        return jsonify({"error": "images is required"}), 400
+    if len(files) > current_app.config["BATCH_MAX_FILES"]:
+        return jsonify({"error": "too_many_images",
+                        "max": current_app.config["BATCH_MAX_FILES"]}), 400
+
+    cfg = current_app.config
+    try:
+        opts = _opts()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    want_timings = _flag("timings")
+    timings = want_timings or cfg["METRICS"]
+    cache = current_app.extensions.get("result_cache")
+    pool = current_app.extensions["batch_pool"]
+
+    results, futures = [], []
+    for i, f in enumerate(files):
+        item = {"index": i, "filename": f.filename}
+        results.append(item)
+        if not f.filename:
+            item["error"] = "empty filename"
+        elif not _allowed(f.filename):
+            item["error"] = "unsupported extension"
+        else:
+            ext = os.path.splitext(f.filename)[1].lower()
+            data = f.read()
+            try:
+                cost = _work_cost(data, cfg)
+            except Rejected as e:
+                metrics.inc("testly_admission_rejected_total", {"reason": e.reason})
+                _count("process-images", "rejected")
+                item["error"] = e.reason
+                continue
+            digest = upload_hash(data)
+            futures.append((item, pool.submit(
+                _process_item, data, digest, ext, opts, timings, want_timings, cache,
+                cfg["UPLOAD_DIR"], cfg["OUTPUT_DIR"], cfg["KEEP_UPLOADS"],
+                current_app.extensions["admission"], cost, _recorder(digest))))
+
+    for item, fut in futures:
+        try:
+            ok, upload_name, result_path, meta, cached = fut.result()
+        except Rejected as e:
+            # Kabul kontrolü: yalnızca bu öğe reddedilir
+            metrics.inc("testly_admission_rejected_total", {"reason": e.reason})
+            _count("process-images", "rejected")
+            item["error"] = e.reason
+            if e.retry_after:
+                item["retry_after"] = e.retry_after
+            continue
+        except Exception as e:
+            ok, meta, cached = False, {"exception": str(e)}, False
+        if ok:
+            item.update(_result_urls(upload_name, result_path, meta))
+            item["meta"] = meta
+            if cached:
+                item["cached"] = True
+            _count("process-images", "cached" if cached else "ok")
+        else:
+            item["error"] = "processing_failed"
+            item["detail"] = meta
+            _count("process-images", "failed")
+
+    failed = sum(1 for r in results if "error" in r)
+    return jsonify({"count": len(results), "failed": failed, "results": results})
+
+def _page_submit(pool, admission, bytes_per_pixel: int):
+    # Belge sayfası havuzda, kabul kontrolüyle (maliyet rasterden) işlenir
+    def run(fn, img, *args, **kwargs):
+        cost = img.nbytes + img.shape[0] * img.shape[1] * bytes_per_pixel
+        try:
+            with admission.admit(cost):
+                return fn(img, *args, **kwargs)
+        except Rejected as e:
+            metrics.inc("testly_admission_rejected_total", {"reason": e.reason})
+            return False, "", {"error": e.reason}
+    return lambda fn, *args, **kwargs: pool.submit(run, fn, *args, **kwargs)
+
+@api_v1.post("/process-document")
+def process_document():
+    """
+    multipart/form-data:
+      - document: PDF ya da çok sayfalı TIFF
+      - dpi: PDF rasterleştirme çözünürlüğü, 72..600 (opsiyonel, DOCUMENT_DPI)
+      - timings, explain, multi, format, effort: process-image ile aynı (opsiyonel)
+    Yanıt application/x-ndjson, sayfa bittikçe bir satır (bitiş sırasıyla):
+      {"event": "document", "pages", "original_url"}
+      {"event": "page", "page", "processed_url", "meta"}  (hata: "error", "detail")
+      {"event": "done", "pages", "ok", "failed"}
+    """
+    if "document" not in request.files:
+        return jsonify({"error": "document is required"}), 400
+    f = request.files["document"]
+    if not f.filename:
+        return jsonify({"error": "empty filename"}), 400
+    ext = os.path.splitext(f.filename)[1].lower()
+    if ext not in current_app.config["DOCUMENT_EXTS"]:
+        return jsonify({"error": "unsupported extension"}), 415
+
+    cfg = current_app.config
+    try:
+        opts = _opts()
+        dpi = int(request.values.get("dpi", cfg["DOCUMENT_DPI"]))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not 72 <= dpi <= 600:
+        return jsonify({"error": "dpi must be in 72..600"}), 400
+    want_timings = _flag("timings")
+    opts = {k: v for k, v in opts.items() if k not in ("oversize", "max_decode_pixels")}
+    opts["timings"] = want_timings or cfg["METRICS"]
+
+    data = f.read()
+    try:
+        doc = Document(data, dpi=dpi, max_pixels=cfg["MAX_PIXELS"],
+                       max_decode_pixels=cfg["MAX_DECODE_PIXELS"], gray=opts["gray"])
+    except DocumentError as e:
+        _count("process-document", "failed")
+        return jsonify({"error": "unreadable_document", "detail": str(e)}), 400
+    if doc.pages > cfg["DOCUMENT_MAX_PAGES"]:
+        doc.close()
+        _count("process-document", "rejected")
+        return jsonify({"error": "too_many_pages", "pages": doc.pages,
+                        "max": cfg["DOCUMENT_MAX_PAGES"]}), 413
+
+    metrics.observe("testly_upload_bytes", len(data))
+    uid = uuid.uuid4().hex
+    upload = _keep_upload(data, uid, ext, cfg["UPLOAD_DIR"], cfg["KEEP_UPLOADS"])
+    record = _recorder(upload_hash(data))
+    submit = _page_submit(current_app.extensions["batch_pool"],
+                          current_app.extensions["admission"], cfg["ADMISSION_BYTES_PER_PIXEL"])
+
+    def lines():
+        counts = {"ok": 0, "failed": 0}
+        pages = None
+        try:
+            upload_name = upload()
+            yield json.dumps({"event": "document", "pages": doc.pages,
+                              "original_url": url_for("uploads_file", filename=upload_name,
+                                                      _external=True) if upload_name else None}) + "\n"
+            pages = stream_document(doc, str(cfg["OUTPUT_DIR"]), uid, submit=submit,
+                                    max_in_flight=cfg["DOCUMENT_MAX_IN_FLIGHT"], shard=True,
+                                    **opts)
+            for r in pages:
+                ok, meta = r["ok"], r["meta"]
+                _finish(ok, meta, None, want_timings, upload_name=upload_name,
+                        result_path=r["path"], record=record)
+                item = {"event": "page", "page": r["page"]}
+                if ok:
+                    urls = _result_urls(upload_name, r["path"], meta)
+                    item.update({k: v for k, v in urls.items() if k != "original_url"})
+                    item["meta"] = meta
+                else:
+                    item.update(error=meta.get("error", "processing_failed"), detail=meta)
+                counts["ok" if ok else "failed"] += 1
+                yield json.dumps(item) + "\n"
+            yield json.dumps({"event": "done", "pages": counts["ok"] + counts["failed"],
+                              **counts}) + "\n"
+        finally:
+            # İstemci koptuysa bekleyen sayfa işleri iptal edilir
+            if pages is not None:
+                pages.close()
+            doc.close()
+            _count("process-document", "failed" if counts["failed"] else "ok")
+
+    resp = Response(stream_with_context(lines()), mimetype="application/x-ndjson")
+    # Gövde hiç okunmazsa üreteç başlamaz, finally çalışmaz: belge yanıtla kapanır
+    resp.call_on_close(doc.close)
+    return resp
+
+@api_v1.get("/questions")
+def list_questions():
+    """
+    İşlenmiş sorular, yeniden eskiye (sayfa başına limit).
+    Parametreler:
+      - user_id (ya da X-User-Id başlığı): sahip (zorunlu)
+      - limit: 1..100 (opsiyonel, varsayılan 20)
+      - cursor: önceki yanıttaki next_cursor (opsiyonel)
+    """
+    index = current_app.extensions.get("results_index")
+    if index is None:
+        return jsonify({"error": "results index disabled"}), 404
+    try:
+        limit = int(request.args.get("limit", 20))
+        cursor = request.args.get("cursor")
+        before = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "limit and cursor must be integers"}), 400
+    if not 1 <= limit <= 100:
+        return jsonify({"error": "limit must be in 1..100"}), 400
+    owner = _owner()
+    if owner is None:
+        return jsonify({"error": "user_id is required"}), 400
+
+    page = index.list(owner, limit, before)
+    items = []
+    for r in page["items"]:
+        created = r["created_at"]
+        if created.tzinfo is None:  # SQLite saat dilimini saklamaz (UTC yazılır)
+            created = created.replace(tzinfo=timezone.utc)
+        items.append({
+            "id": r["id"],
+            "created_at": created.isoformat(),
+            "processed_url": url_for("outputs_file", filename=r["output_path"], _external=True),
+            "original_url": url_for("uploads_file", filename=r["upload_name"], _external=True)
+                            if r["upload_name"] else None,
+            "question_index": r["question_index"],
+            "best_box": r["best_box"],
+            "score": r["score"],
+            "width": r["width"],
+            "height": r["height"],
+            "format": r["format"],
+            "upload_hash": r["upload_hash"],
+        })
+    nxt = page["next_cursor"]
+    return jsonify({"items": items, "next_cursor": str(nxt) if nxt is not None else None})
+
+@api_v1.get("/cache/stats")
+def cache_stats():
+    cache = current_app.extensions.get("result_cache")
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cache.stats()})
+
+@api_v1.get("/metrics")
+def metrics_endpoint():
+    for status, n in current_app.extensions["jobs"].stats().items():
+        metrics.set("testly_jobs", n, {"status": status})
+    for name, v in current_app.extensions["admission"].stats().items():
+        metrics.set("testly_admission", v, {"state": name})
+    metrics.set("testly_track_sessions", current_app.extensions["tracker"].stats()["sessions"])
+    for area, s in current_app.extensions["retention"].stats().items():
+        for name, v in s.items():
+            metrics.set("testly_storage", v, {"area": area, "field": name})
+    cache = current_app.extensions.get("result_cache")
+    if cache is not None:
+        for name, v in cache.stats().items():
+            metrics.set("testly_result_cache", v, {"field": name})
+    index = current_app.extensions.get("results_index")
+    if index is not None:
+        for name, v in index.stats().items():
+            metrics.set("testly_results_index", v, {"field": name})
+    return Response(metrics.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+@api_v1.get("/jobs/<job_id>")
+def job_status(job_id):
+    job = current_app.extensions["jobs"].get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+
+    body = {"job_id": job_id, "status": job["status"]}
+    if job["status"] == "done":
+        ok, result_path, meta = job["result"]
+        if ok:
+            body.update(_result_urls(job["context"]["upload"], result_path, meta))
+            body["meta"] = meta
+        else:
+            body["status"] = "failed"
+            body["error"] = "processing_failed"
+            body["detail"] = meta
+    elif job["error"]:
+        body["error"] = job["error"]
+    return jsonify(body)
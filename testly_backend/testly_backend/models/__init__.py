@@ -0,0 +1,4 @@
+from sqlalchemy import MetaData
+
+# Tüm tablolar (bkz. question.py); create_all ile oluşturulur
+metadata = MetaData()
@@ -0,0 +1,25 @@
+from sqlalchemy import (JSON, BigInteger, Column, DateTime, Float, Index, Integer, SmallInteger,
+                        String, Table, func)
+
+from . import metadata
+
+# İşlenmiş her soru bir satır (multi: sayfadaki her soru ayrı satır, aynı upload_hash).
+# Sayfalama id üzerinden (keyset): owner + id indeksi.
+questions = Table(
+    "questions", metadata,
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Column("owner", String(64), nullable=True),
+    Column("upload_hash", String(64), nullable=False),   # yüklenen baytların sha256'sı
+    Column("upload_name", String(255), nullable=True),   # uploads/ altında; saklanmadıysa NULL
+    Column("output_path", String(255), nullable=False),  # outputs/ altında göreli yol
+    Column("question_index", SmallInteger, nullable=False, default=0),  # multi: 1.., tek: 0
+    Column("best_box", JSON, nullable=True),
+    Column("score", Float, nullable=True),
+    Column("width", Integer, nullable=False),
+    Column("height", Integer, nullable=False),
+    Column("format", String(8), nullable=False),
+    Column("timings", JSON, nullable=True),
+    Index("questions_owner_id", "owner", "id"),
+    Index("questions_upload_hash", "upload_hash"),
+)
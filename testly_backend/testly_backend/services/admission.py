@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class Rejected(Exception):
+    """Kabul edilmeyen istek: HTTP durum kodu ve Retry-After (saniye)."""
+
+    def __init__(self, reason: str, status: int, retry_after: Optional[int] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Admission:
+    """
+    İşleme isteği kabul kontrolü: eşzamanlı iş sayısı (max_concurrent) ve
+    tahmini çalışma belleği toplamı (memory_budget) sınırlı. Sığmayan istek
+    en fazla max_queue uzunluğunda FIFO kuyrukta queue_timeout saniye bekler.
+      kuyruk dolu          -> 429 + Retry-After
+      beklerken süre doldu -> 503 + Retry-After
+    Tek başına bütçeyi aşan iş bütçenin tamamını alır (yalnız çalışır);
+    boyut sınırları (413) bütçeden bağımsız, piksel bütçesinde uygulanır.
+    """
+
+    def __init__(self, max_concurrent: int, memory_budget: int,
+                 max_queue: int = 16, queue_timeout: float = 10.0,
+                 retry_after: int = 5):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.memory_budget = int(memory_budget)
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = float(queue_timeout)
+        self.retry_after = int(retry_after)
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._memory = 0
+        self._waiting = deque()
+
+    def _fits(self, cost: int) -> bool:
+        return self._inflight < self.max_concurrent and self._memory + cost <= self.memory_budget
+
+    def _take(self, cost: int):
+        self._inflight += 1
+        self._memory += cost
+
+    @contextmanager
+    def admit(self, cost: int):
+        """cost bayt tahmini bellekle bir iş yuvası alır; alamazsa Rejected."""
+        cost = min(int(cost), self.memory_budget)
+        with self._cond:
+            if not self._waiting and self._fits(cost):
+                self._take(cost)
+            else:
+                if len(self._waiting) >= self.max_queue:
+                    raise Rejected("busy", 429, self.retry_after)
+                ticket = object()
+                self._waiting.append(ticket)
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    # Sıra: yalnızca kuyruğun başı yer açıldığında girer
+                    while not (self._waiting[0] is ticket and self._fits(cost)):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise Rejected("overloaded", 503, self.retry_after)
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting.remove(ticket)
+                    self._cond.notify_all()
+                self._take(cost)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._inflight -= 1
+                self._memory -= cost
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {"inflight": self._inflight, "queued": len(self._waiting),
+                    "memory_bytes": self._memory}
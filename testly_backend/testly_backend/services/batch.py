@@ -0,0 +1,195 @@
+"""
+Toplu işleme motoru: bir klasör ağacındaki tüm görüntüler için
+page crop -> refine -> <output_dir>/<alt_klasör>/<stem>_final.png
+
+- Süreç havuzu (workers), eşzamanlı iş sayısı sınırlı
+- Dizin ağacı akış halinde gezilir (önceden sıralı liste kurulmaz)
+- Günlük (journal, JSONL): kesilen çalıştırma kaldığı yerden devam eder,
+  daha önce işlenmiş (aynı boyut + mtime) girdiler atlanır. Çıktı adları
+  girdiden türetilir ve üzerine yazılır: çıktı yazılıp günlüğe
+  geçmeden kesilen girdi yeniden işlendiğinde ikinci kopya oluşmaz
+- Özet: işlenen/atlanan/hatalı sayıları ve throughput
+
+CLI:
+    python -m testly_backend.services.batch <input_dir> <output_dir> [--workers N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from .binarize import parse_spec
+from .encode import EFFORTS, FORMATS
+from .jobs import _warmup, cv_threads_for
+from .morphology import ENGINES
+from .processing import process_file
+from .refined_question_pipeline import is_image
+
+JOURNAL_NAME = ".batch_journal.jsonl"
+
+
+def iter_images(root) -> Iterator[str]:
+    """Ağacı os.scandir ile akış halinde gezer, görüntü yollarını üretir."""
+    stack = [str(root)]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(e.path)
+                elif e.is_file() and is_image(e.name):
+                    yield e.path
+
+
+def load_journal(path) -> Dict[str, Dict[str, Any]]:
+    """Günlükteki son kayıtlar: {göreli_yol: kayıt}. Yarım satırlar yok sayılır."""
+    done = {}
+    p = Path(path)
+    if not p.exists():
+        return done
+    with p.open(encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # kesintide yarım kalmış satır
+            done[rec["path"]] = rec
+    return done
+
+
+def _process_one(path: str, out_dir: str, opts: Dict[str, Any]):
+    t0 = time.perf_counter()
+    ok, out_path, meta = process_file(path, out_dir, show=False, overwrite=True, **opts)
+    return ok, out_path, meta, (time.perf_counter() - t0) * 1000.0
+
+
+def run_batch(input_dir, output_dir, workers: Optional[int] = None,
+              journal_path=None, retry_failed: bool = False,
+              gray: bool = False, multi=None,
+              fmt: str = "png", effort: str = "balanced", morph_engine: str = "",
+              binarize: Optional[Dict[str, Any]] = None,
+              progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    input_dir altındaki görüntüleri işler, özet sözlüğü döner.
+    journal_path varsayılanı <output_dir>/.batch_journal.jsonl.
+    retry_failed: günlükte hatalı görünen girdiler yeniden denenir.
+    multi: select_questions argümanları (çoklu soru modu, bkz. process_file).
+    fmt / effort: çıktı biçimi ve kodlama eforu (bkz. encode.FORMATS).
+    morph_engine: worker'larda merge morfolojisi motoru (bkz. morphology.ENGINES).
+    binarize: worker'larda binarize.set_methods argümanları.
+    progress(kayıt): her tamamlanan girdi için çağrılır.
+    """
+    input_dir = Path(input_dir)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    journal_path = Path(journal_path) if journal_path else output_dir / JOURNAL_NAME
+    opts = {"gray": gray, "multi": multi, "fmt": fmt, "effort": effort}
+
+    seen = load_journal(journal_path)
+    summary = {"processed": 0, "ok": 0, "failed": 0, "skipped": 0, "failures": []}
+    t_start = time.perf_counter()
+
+    with journal_path.open("a", encoding="utf-8") as journal, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                initializer=_warmup,
+                                initargs=(cv_threads_for(workers), morph_engine, binarize)) as pool:
+
+        def record(fut):
+            rel, size, mtime = pending.pop(fut)
+            try:
+                ok, out_path, meta, ms = fut.result()
+            except Exception as e:  # worker çöktü vb.
+                ok, out_path, meta, ms = False, "", {"exception": str(e)}, 0.0
+            rec = {"path": rel, "size": size, "mtime": mtime, "ok": ok,
+                   "output": os.path.relpath(out_path, output_dir) if ok else None,
+                   "error": None if ok else (meta.get("error") or meta.get("exception")),
+                   "ms": round(ms, 1)}
+            journal.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            journal.flush()
+            summary["processed"] += 1
+            if ok:
+                summary["ok"] += 1
+            else:
+                summary["failed"] += 1
+                summary["failures"].append({"path": rel, "error": rec["error"]})
+            if progress is not None:
+                progress(rec)
+
+        pending = {}
+        max_in_flight = workers * 4
+        for path in iter_images(input_dir):
+            rel = os.path.relpath(path, input_dir)
+            st = os.stat(path)
+            prev = seen.get(rel)
+            if (prev is not None and prev["size"] == st.st_size and prev["mtime"] == st.st_mtime
+                    and (prev["ok"] or not retry_failed)):
+                summary["skipped"] += 1
+                continue
+
+            sub_out = output_dir / os.path.dirname(rel)
+            fut = pool.submit(_process_one, path, str(sub_out), opts)
+            pending[fut] = (rel, st.st_size, st.st_mtime)
+            if len(pending) >= max_in_flight:
+                finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for f in finished:
+                    record(f)
+
+        while pending:
+            finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for f in finished:
+                record(f)
+
+    wall = time.perf_counter() - t_start
+    summary["wall_s"] = round(wall, 3)
+    summary["throughput_ips"] = round(summary["processed"] / wall, 3) if wall > 0 else None
+    summary["journal"] = str(journal_path)
+    return summary
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="parallel, resumable batch question extraction")
+    ap.add_argument("input_dir")
+    ap.add_argument("output_dir")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--journal", default=None)
+    ap.add_argument("--retry-failed", action="store_true")
+    ap.add_argument("--gray", action="store_true")
+    ap.add_argument("--multi", action="store_true", help="sayfadaki tüm soruları çıkar")
+    ap.add_argument("--format", default="png", choices=list(FORMATS))
+    ap.add_argument("--effort", default="balanced", choices=list(EFFORTS))
+    ap.add_argument("--morph", default="", choices=["", *ENGINES],
+                    help="merge morfolojisi motoru")
+    ap.add_argument("--binarize", default="", type=parse_spec,
+                    help="sauvola | page=mean,refine=sauvola,final=gaussian")
+    ap.add_argument("-q", "--quiet", action="store_true")
+    args = ap.parse_args(argv)
+
+    def progress(rec):
+        print(f"[{'ok' if rec['ok'] else 'err'}] {rec['path']}"
+              + (f" -> {rec['output']}" if rec["ok"] else f" ({rec['error']})"))
+
+    summary = run_batch(args.input_dir, args.output_dir, workers=args.workers,
+                        journal_path=args.journal, retry_failed=args.retry_failed,
+                        gray=args.gray,
+                        multi={} if args.multi else None,
+                        fmt=args.format, effort=args.effort, morph_engine=args.morph,
+                        binarize=args.binarize or None,
+                        progress=None if args.quiet else progress)
+    print(json.dumps({k: v for k, v in summary.items() if k != "failures"}))
+    for f in summary["failures"]:
+        print(f"[fail] {f['path']}: {f['error']}", file=sys.stderr)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Adaptive threshold katmanı (metin beyaz: THRESH_BINARY_INV karşılığı).
+
+Aşamalar: page (page crop), refine (aday arama), final (warp sonrası).
+Yöntemler:
+  gaussian: ADAPTIVE_THRESH_GAUSSIAN_C (önceki davranış); maliyet blokla artar
+  mean    : ADAPTIVE_THRESH_MEAN_C, yerel ortalama - C
+  sauvola : T = m * (1 + k * (s / R - 1)), m / s yerel ortalama / std (C kullanılmaz)
+
+mean / sauvola kutu filtresiyle (kayan toplam) hesaplanır: piksel başına
+maliyet blok boyutundan bağımsız. Kenarda piksel tekrarı (BORDER_REPLICATE).
+Blok boyutları Gaussian için ayarlı olduğundan kutu genişliği, aynı bloktaki
+Gaussian çekirdeğin varyansına eşlenir (bkz. box_size).
+"""
+from typing import Dict, Optional
+
+import cv2 as cv
+import numpy as np
+
+METHODS = ("gaussian", "mean", "sauvola")
+STAGES = ("page", "refine", "final")
+
+_methods: Dict[str, str] = {s: "gaussian" for s in STAGES}
+_sauvola = {"k": 0.2, "r": 128.0}
+
+
+def set_methods(page: Optional[str] = None, refine: Optional[str] = None,
+                final: Optional[str] = None, sauvola_k: Optional[float] = None):
+    """Süreç genelinde aşama başına yöntem (verilmeyenler değişmez)."""
+    for st, name in (("page", page), ("refine", refine), ("final", final)):
+        if name is None:
+            continue
+        if name not in METHODS:
+            raise ValueError(f"unknown binarize method: {name}")
+        _methods[st] = name
+    if sauvola_k is not None:
+        _sauvola["k"] = float(sauvola_k)
+
+
+def get_methods() -> Dict[str, str]:
+    return dict(_methods)
+
+
+def parse_spec(spec: str) -> Dict[str, str]:
+    """
+    "sauvola" -> tüm aşamalar; "page=mean,refine=sauvola" -> yalnızca verilenler.
+    Bilinmeyen aşama/yöntemde ValueError.
+    """
+    out = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        st, _, name = part.rpartition("=")
+        if name not in METHODS:
+            raise ValueError(f"unknown binarize method: {name}")
+        for s in ([st] if st else STAGES):
+            if s not in STAGES:
+                raise ValueError(f"unknown binarize stage: {s}")
+            out[s] = name
+    return out
+
+
+def box_size(block: int) -> int:
+    """Gaussian bloğu -> aynı varyanslı kutu genişliği (tek, >= 3)."""
+    sigma = 0.3 * ((block - 1) * 0.5 - 1) + 0.8  # getGaussianKernel varsayılanı
+    return max(3, int(round(sigma * np.sqrt(12.0))) | 1)
+
+
+def _sauvola_inv(gray, block: int) -> np.ndarray:
+    size = (block, block)
+    m = cv.boxFilter(gray, cv.CV_32F, size, borderType=cv.BORDER_REPLICATE)
+    var = cv.sqrBoxFilter(gray, cv.CV_32F, size, borderType=cv.BORDER_REPLICATE)
+    var -= m * m
+    s = np.sqrt(np.maximum(var, 0.0, out=var), out=var)
+    k, r = _sauvola["k"], _sauvola["r"]
+    s *= k / r
+    s += 1.0 - k
+    s *= m  # eşik
+    return cv.compare(gray.astype(np.float32), s, cv.CMP_LE)
+
+
+def threshold_inv(gray, block: int, C: float, stage: str,
+                  method: Optional[str] = None) -> np.ndarray:
+    """
+    gray (uint8) -> 0/255, metin (koyu) 255. stage için seçili yöntem
+    (method verilirse o) kullanılır.
+    """
+    method = method or _methods[stage]
+    if method == "gaussian":
+        return cv.adaptiveThreshold(gray, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                    cv.THRESH_BINARY_INV, block, C)
+    if method == "mean":
+        return cv.adaptiveThreshold(gray, 255, cv.ADAPTIVE_THRESH_MEAN_C,
+                                    cv.THRESH_BINARY_INV, box_size(block), C)
+    if method == "sauvola":
+        return _sauvola_inv(gray, box_size(block))
+    raise ValueError(f"unknown binarize method: {method}")
@@ -0,0 +1,83 @@
+import io
+import os
+from typing import Dict, Tuple
+
+import cv2 as cv
+import numpy as np
+from PIL import Image
+
+from .storage import write_bytes
+from .timing import stage
+
+# Sonuç (final_bw, yalnızca 0/255) çıktı biçimleri: ad -> (uzantı, mime)
+FORMATS: Dict[str, Tuple[str, str]] = {
+    "png": (".png", "image/png"),     # 8 bit gri (eski davranış)
+    "png1": (".png", "image/png"),    # 1 bit paketli PNG
+    "tiff": (".tif", "image/tiff"),   # CCITT Group 4 TIFF
+    "webp": (".webp", "image/webp"),  # kayıpsız WebP
+}
+EFFORTS = ("fast", "balanced", "small")
+
+# zlib seviyesi; 8 bit PNG'de balanced OpenCV varsayılanı (eski çıktılarla aynı)
+_PNG_LEVEL = {"png": {"fast": 1, "small": 9},
+              "png1": {"fast": 1, "balanced": 6, "small": 9}}
+# Kayıpsız WebP (method, quality): quality burada sıkıştırma eforudur
+_WEBP_METHOD = {"fast": (0, 0), "balanced": (4, 75), "small": (6, 90)}
+
+
+def _cv_png(bw, fmt: str, effort: str) -> bytes:
+    params = []
+    if fmt == "png1":
+        params += [cv.IMWRITE_PNG_BILEVEL, 1]
+    if effort in _PNG_LEVEL[fmt]:
+        params += [cv.IMWRITE_PNG_COMPRESSION, _PNG_LEVEL[fmt][effort]]
+    ok, buf = cv.imencode(".png", bw, params)
+    if not ok:
+        raise ValueError("png encode failed")
+    return buf.tobytes()
+
+
+def _pil_save(bw, fmt: str, **kw) -> bytes:
+    im = Image.fromarray(bw)
+    if fmt == "TIFF":
+        im = im.convert("1", dither=Image.Dither.NONE)
+    out = io.BytesIO()
+    im.save(out, fmt, **kw)
+    return out.getvalue()
+
+
+def encode_bw(bw: np.ndarray, fmt: str = "png", effort: str = "balanced") -> bytes:
+    """
+    İkili sonucu (tek kanal, 0/255) seçilen biçimde kodlar.
+    effort: fast | balanced | small (hız <-> boyut). Group 4 sabit
+    sıkıştırmadır, effort'tan etkilenmez.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format: {fmt}")
+    if effort not in EFFORTS:
+        raise ValueError(f"unknown effort: {effort}")
+    with stage("encode"):
+        if fmt in ("png", "png1"):
+            return _cv_png(bw, fmt, effort)
+        if fmt == "tiff":
+            return _pil_save(bw, "TIFF", compression="group4")
+        method, quality = _WEBP_METHOD[effort]
+        return _pil_save(bw, "WEBP", lossless=True, method=method, quality=quality)
+
+
+def write_bw(path: str, bw: np.ndarray, fmt: str = "png", effort: str = "balanced") -> bool:
+    """encode_bw + dosyaya atomik yazma (Unicode yol güvenli)."""
+    try:
+        data = encode_bw(bw, fmt, effort)
+    except (ValueError, OSError):
+        return False
+    with stage("write"):
+        return write_bytes(path, data)
+
+
+def read_bw(path: str) -> np.ndarray:
+    """Herhangi bir çıktı biçimini 0/255 tek kanal olarak geri okur."""
+    if os.path.splitext(path)[1].lower() in (".tif", ".tiff"):
+        with Image.open(path) as im:
+            return np.asarray(im.convert("L"))
+    return cv.imdecode(np.fromfile(path, dtype=np.uint8), cv.IMREAD_GRAYSCALE)
@@ -0,0 +1,386 @@
+import json
+import logging
+import multiprocessing as mp
+import os
+import signal
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobTimeout(BaseException):
+    # BaseException: iş fonksiyonundaki `except Exception` bloklarına takılmasın
+    pass
+
+
+def cv_threads_for(concurrency: int, cpus: Optional[int] = None) -> int:
+    """Çekirdekleri eşzamanlı işlere paylaştırır: süreç başına OpenCV thread sayısı."""
+    cpus = cpus or os.cpu_count() or 1
+    return max(1, cpus // max(1, int(concurrency)))
+
+
+def _warmup(cv_threads: Optional[int] = None, morph_engine: Optional[str] = None,
+            binarize: Optional[Dict[str, Any]] = None):
+    """
+    Worker başlangıcı: OpenCV/NumPy'yi yükle ve hattı küçük bir görüntüde
+    bir kez çalıştır (ilk işin import + ilk çağrı maliyetini ödememesi için).
+    cv_threads verilirse OpenCV thread havuzu bu boyuta ayarlanır;
+    morph_engine verilirse merge morfolojisi motoru (bkz. morphology.ENGINES),
+    binarize verilirse binarize.set_methods argümanları.
+    """
+    import cv2 as cv
+    import numpy as np
+    from .binarize import set_methods
+    from .morphology import set_engine
+    from .refined_question_pipeline import page_crop_user, refine_question_from_pagecrop
+
+    if cv_threads:
+        cv.setNumThreads(int(cv_threads))
+    if morph_engine:
+        set_engine(morph_engine)
+    if binarize:
+        set_methods(**binarize)
+
+    img = np.full((240, 180, 3), 255, np.uint8)
+    cv.rectangle(img, (30, 40), (150, 200), (0, 0, 0), 2)
+    pc, _ = page_crop_user(img, debug=False)
+    refine_question_from_pagecrop(pc, debug=False)
+
+
+def _on_alarm(signum, frame):
+    raise JobTimeout()
+
+
+def _run_with_alarm(timeout: float, fn: Callable, args: tuple, kwargs: dict):
+    # Süreç worker'ında ana thread: SIGALRM ile iş gerçekten kesilir
+    # (C içindeki bir OpenCV çağrısı ise bitince kesilir).
+    if timeout and timeout > 0:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if timeout and timeout > 0:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+_JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id       TEXT PRIMARY KEY,
+    status   TEXT NOT NULL,
+    created  REAL NOT NULL,
+    finished REAL,
+    error    TEXT,
+    result   TEXT,
+    context  TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs(finished);
+"""
+
+
+class JobStore:
+    """
+    İş durumlarının süreçler arası kaydı (SQLite). Pre-fork sunucuda iş onu
+    alan worker'ın havuzunda çalışır; durum her değiştiğinde buraya yazılır,
+    böylece GET /jobs/<id> hangi worker'a düşerse düşsün yanıtlanır.
+    result ve context yalnızca iş bittiğinde (JSON) yazılır.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as db:
+            db.executescript(_JOB_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # Bağlantı fork'ta devralınmaz (pre-fork sunucu): süreç değiştiyse yenisi
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def put(self, job: Dict[str, Any]):
+        final = job["status"] not in ("queued", "running")
+        with self._conn() as db:
+            db.execute("INSERT OR REPLACE INTO jobs"
+                       "(id, status, created, finished, error, result, context) "
+                       "VALUES(?, ?, ?, ?, ?, ?, ?)",
+                       (job["id"], job["status"], job["created"], job["finished"], job["error"],
+                        json.dumps(job["result"]) if final and job["result"] is not None else None,
+                        # bitmemiş işin context'i çözülmemiş değer taşıyabilir
+                        json.dumps(job["context"], default=lambda _: None) if final else None))
+
+    def get(self, jid: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT status, created, finished, error, result, context "
+                                   "FROM jobs WHERE id = ?", (jid,)).fetchone()
+        if row is None:
+            return None
+        status, created, finished, error, result, context = row
+        return {"id": jid, "status": status, "created": created, "finished": finished,
+                "error": error, "result": json.loads(result) if result else None,
+                "context": json.loads(context) if context else {}}
+
+    def delete(self, jid: str):
+        with self._conn() as db:
+            db.execute("DELETE FROM jobs WHERE id = ?", (jid,))
+
+    def evict(self, before: float):
+        with self._conn() as db:
+            db.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (before,))
+
+
+_STORES: Dict[str, JobStore] = {}
+
+
+def _run_in_worker(store_path: str, job: Dict[str, Any], timeout: float, fn: Callable,
+                   args: tuple, kwargs: dict):
+    # Süreç worker'ı "running" geçişini ortak store'a kendisi yazar; kayıt
+    # hatası işi etkilemez
+    try:
+        store = _STORES.get(store_path)
+        if store is None:
+            store = _STORES[store_path] = JobStore(store_path)
+        store.put(job)
+    except Exception:
+        log.exception("job store write failed for job %s", job["id"])
+    return _run_with_alarm(timeout, fn, args, kwargs)
+
+
+class JobQueue:
+    """
+    Broker gerektirmeyen yerel iş kuyruğu.
+      backend="process": önceden ısıtılmış süreç havuzu (varsayılan)
+      backend="thread" : aynı süreçte thread havuzu
+    Bekleyen+çalışan iş sayısı max_pending ile sınırlı (aşılırsa QueueFull);
+    her işin çalışmaya başladığı andan itibaren timeout saniyelik süresi
+    vardır. Thread'ler kesilemez: süresi dolan iş "timeout" görünür ama
+    thread'i bitene kadar max_pending'e sayılır. Biten işler ttl saniye tutulur.
+    store verilirse durumlar oraya da yazılır ve başka süreçteki işler de
+    get() ile okunur (max_pending ve havuz süreç başınadır).
+    """
+
+    def __init__(self, backend: str = "process", workers: int = 2,
+                 max_pending: int = 32, timeout: float = 120.0,
+                 ttl: float = 3600.0, cv_threads: int = 0, morph_engine: str = "",
+                 binarize: Optional[Dict[str, Any]] = None, store: Optional[JobStore] = None):
+        self.backend = backend
+        self.workers = max(1, int(workers))
+        # Süreç worker'larında OpenCV thread sayısı (0: çekirdekler / workers)
+        self.cv_threads = int(cv_threads) or cv_threads_for(self.workers)
+        self.morph_engine = morph_engine
+        self.binarize = binarize
+        self.max_pending = max(1, int(max_pending))
+        self.timeout = float(timeout)
+        self.ttl = float(ttl)
+        self.store = store
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _executor(self):
+        # Havuz ilk işte kurulur: pre-fork sunucularda her worker kendi havuzunu açar
+        if self._pool is None:
+            if self.backend == "thread":
+                self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix="testly-job")
+            else:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=mp.get_context("spawn"),
+                                                 initializer=_warmup,
+                                                 initargs=(self.cv_threads, self.morph_engine,
+                                                           self.binarize))
+        return self._pool
+
+    def _active(self) -> int:
+        # Süresi dolmuş ama thread'i hâlâ çalışan iş de (future duruyor) sayılır
+        return sum(1 for j in self._jobs.values()
+                   if j["status"] in ("queued", "running") or "future" in j)
+
+    def _expire(self, now: float) -> List[Dict[str, Any]]:
+        # Thread backend: süre çalışmanın başladığı andan ölçülür
+        expired = []
+        if self.backend != "thread":
+            return expired
+        for j in self._jobs.values():
+            if (j["status"] == "running" and j["started"] is not None
+                    and now - j["started"] > self.timeout):
+                j["status"], j["error"] = "timeout", "timeout"
+                j["finished"] = now
+                expired.append(j)
+        return expired
+
+    def _save(self, *jobs: Dict[str, Any]):
+        # Kilit dışında çağrılır; kayıt hatası işi etkilemez
+        if self.store is None:
+            return
+        for job in jobs:
+            try:
+                self.store.put(job)
+            except Exception:
+                log.exception("job store write failed for job %s", job["id"])
+
+    def _evict(self, now: float):
+        old = [jid for jid, j in self._jobs.items()
+               if j["finished"] is not None and "future" not in j
+               and now - j["finished"] > self.ttl]
+        for jid in old:
+            del self._jobs[jid]
+
+    def submit(self, fn: Callable, *args, context: Optional[Dict[str, Any]] = None,
+               on_done: Optional[Callable[[Dict[str, Any]], None]] = None, **kwargs) -> str:
+        """
+        fn(*args, **kwargs) işini kuyruğa ekler, job id döner.
+        context: işle birlikte saklanan ve get() ile dönen ek bilgi.
+        on_done(job): iş bittiğinde worker dışında çağrılır. Başarılıysa
+        job["result"] dolu, durum "done" olmadan önce; hata ya da zaman
+        aşımında job["error"] dolu, status "failed" / "timeout" (thread
+        backend'de süresi dolan iş için thread bittiğinde).
+        Havuza gönderilemezse iş silinir ve hata yükseltilir.
+        """
+        now = time.time()
+        with self._lock:
+            expired = self._expire(now)
+            self._evict(now)
+            full = self._active() >= self.max_pending
+            if not full:
+                jid = uuid.uuid4().hex
+                job = {"id": jid, "status": "queued", "created": now, "started": None,
+                       "finished": None, "result": None, "error": None,
+                       "context": context or {}}
+                self._jobs[jid] = job
+        self._save(*expired)
+        if full:
+            raise QueueFull()
+        if self.store is not None:
+            try:
+                self.store.evict(now - self.ttl)
+            except Exception:
+                log.exception("job store eviction failed")
+        self._save(job)
+
+        try:
+            try:
+                fut = self._dispatch(job, fn, args, kwargs)
+            except BrokenProcessPool:
+                # Bir worker öldüyse havuz kullanılamaz; yenisini kur
+                self._pool = None
+                fut = self._dispatch(job, fn, args, kwargs)
+        except BaseException:
+            # Kuyrukta asılı kalıp max_pending'i doldurmasın
+            with self._lock:
+                self._jobs.pop(jid, None)
+            if self.store is not None:
+                try:
+                    self.store.delete(jid)
+                except Exception:
+                    log.exception("job store delete failed for job %s", jid)
+            raise
+        with self._lock:
+            if job["finished"] is None:
+                job["future"] = fut
+        fut.add_done_callback(lambda f, jid=jid: self._finish(jid, f, on_done))
+        return jid
+
+    def _dispatch(self, job, fn, args, kwargs):
+        if self.backend == "thread":
+            return self._executor().submit(self._run_thread, job, fn, args, kwargs)
+        if self.store is None:
+            return self._executor().submit(_run_with_alarm, self.timeout, fn, args, kwargs)
+        # context worker'a gönderilmez (çağrılabilir taşıyabilir); bitmemiş
+        # işin context'i store'a zaten yazılmaz
+        running = dict(job, status="running", context={})
+        return self._executor().submit(_run_in_worker, self.store.path, running,
+                                       self.timeout, fn, args, kwargs)
+
+    def _run_thread(self, job, fn, args, kwargs):
+        with self._lock:
+            job["started"] = time.time()
+            job["status"] = "running"
+        self._save(job)
+        return fn(*args, **kwargs)
+
+    def _finish(self, jid: str, fut, on_done):
+        with self._lock:
+            job = self._jobs.get(jid)
+            if job is None:
+                return
+            # late: zaman aşımına düşmüş (_expire kaydetti), thread artık bitti
+            late = job["status"] not in ("queued", "running")
+            job.pop("future", None)
+            ok = False
+            if not late:
+                job["finished"] = time.time()
+                exc = None if fut.cancelled() else fut.exception()
+                if fut.cancelled():
+                    job["status"], job["error"] = "failed", "cancelled"
+                elif isinstance(exc, JobTimeout):
+                    job["status"], job["error"] = "timeout", "timeout"
+                elif exc is not None:
+                    job["status"], job["error"] = "failed", str(exc)
+                else:
+                    job["result"], ok = fut.result(), True
+        if late:
+            self._notify(on_done, job)
+            return
+        # on_done sonucu işlesin, iş ancak ondan sonra "done" görünsün
+        self._notify(on_done, job)
+        if ok:
+            with self._lock:
+                job["status"] = "done"
+        self._save(job)
+
+    def _notify(self, on_done, job):
+        if on_done is not None:
+            try:
+                on_done(job)
+            except Exception:
+                log.exception("on_done failed for job %s", job["id"])
+
+    def get(self, jid: str) -> Optional[Dict[str, Any]]:
+        """İşin durumu; bu süreçte değilse (başka worker) store'dan."""
+        now = time.time()
+        started = []
+        with self._lock:
+            expired = self._expire(now)
+            job = self._jobs.get(jid)
+            if job is not None:
+                fut = job.get("future")
+                if fut is not None and self.backend != "thread" and job["status"] == "queued" \
+                        and fut.running():
+                    job["status"] = "running"
+                    started.append(job)
+                view = {k: v for k, v in job.items() if k != "future"}
+        self._save(*expired, *started)
+        if job is not None:
+            return view
+        return self.store.get(jid) if self.store is not None else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            expired = self._expire(time.time())
+            out = {"queued": 0, "running": 0, "done": 0, "failed": 0, "timeout": 0}
+            for j in self._jobs.values():
+                out[j["status"]] = out.get(j["status"], 0) + 1
+        self._save(*expired)
+        return out
+
+    def shutdown(self, wait: bool = False):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,147 @@
+import bisect
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+# Prometheus metin biçimi (text/plain; version=0.0.4). Değerler süreç
+# başınadır; pre-fork sunucuda her worker kendi sayaçlarını raporlar.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PIXEL_BUCKETS = (0.3e6, 1e6, 2e6, 5e6, 8e6, 12e6, 20e6, 35e6, 50e6, 100e6)
+BYTE_BUCKETS = (64e3, 256e3, 1e6, 2e6, 5e6, 10e6, 20e6, 50e6)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _fmt(name: str, labels: Labels, value, extra: Labels = ()) -> str:
+    lab = labels + extra
+    if lab:
+        inner = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                         for k, v in lab)
+        return f"{name}{{{inner}}} {value}"
+    return f"{name} {value}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        self.counts[bisect.bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._hists: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+
+    def counter(self, name: str, help: str):
+        self._help[name] = ("counter", help)
+        self._counters.setdefault(name, {})
+
+    def gauge(self, name: str, help: str):
+        self._help[name] = ("gauge", help)
+        self._gauges.setdefault(name, {})
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = SECONDS_BUCKETS):
+        self._help[name] = ("histogram", help)
+        self._hists.setdefault(name, {})
+        self._buckets[name] = tuple(buckets)
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, n: float = 1):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + n
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        with self._lock:
+            self._gauges[name][_labels(labels)] = value
+
+    def add(self, name: str, n: float, labels: Optional[Dict[str, str]] = None):
+        key = _labels(labels)
+        with self._lock:
+            series = self._gauges[name]
+            series[key] = series.get(key, 0) + n
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        key = _labels(labels)
+        with self._lock:
+            series = self._hists[name]
+            h = series.get(key)
+            if h is None:
+                h = series[key] = _Histogram(self._buckets[name])
+            h.observe(value)
+
+    def render(self) -> str:
+        out = []
+        with self._lock:
+            for name, (kind, help) in sorted(self._help.items()):
+                out.append(f"# HELP {name} {help}")
+                out.append(f"# TYPE {name} {kind}")
+                if kind == "histogram":
+                    for lab, h in sorted(self._hists[name].items()):
+                        acc = 0
+                        for le, c in zip(h.buckets, h.counts):
+                            acc += c
+                            out.append(_fmt(f"{name}_bucket", lab, acc, (("le", repr(float(le))),)))
+                        out.append(_fmt(f"{name}_bucket", lab, h.count, (("le", "+Inf"),)))
+                        out.append(_fmt(f"{name}_sum", lab, repr(h.sum)))
+                        out.append(_fmt(f"{name}_count", lab, h.count))
+                else:
+                    series = self._counters[name] if kind == "counter" else self._gauges[name]
+                    for lab, v in sorted(series.items()):
+                        out.append(_fmt(name, lab, v))
+        return "\n".join(out) + "\n"
+
+
+metrics = Metrics()
+metrics.counter("testly_requests_total", "Processing requests by endpoint and outcome.")
+metrics.counter("testly_failures_total", "Failed pipeline runs by reason.")
+metrics.counter("testly_upload_write_failures_total",
+                "Uploads whose original could not be stored (original_url null).")
+metrics.histogram("testly_process_seconds", "End-to-end pipeline time per image.")
+metrics.histogram("testly_stage_seconds", "Pipeline time per stage.")
+metrics.histogram("testly_detect_seconds", "Preview detection time per frame.")
+metrics.histogram("testly_image_pixels", "Decoded source image size in pixels.", PIXEL_BUCKETS)
+metrics.histogram("testly_upload_bytes", "Uploaded file size in bytes.", BYTE_BUCKETS)
+metrics.gauge("testly_jobs", "Async jobs by status.")
+metrics.gauge("testly_track_sessions", "Live preview tracking sessions (shared by all workers).")
+metrics.gauge("testly_result_cache", "Result cache counters and size.")
+metrics.gauge("testly_results_index", "Results index writes: written, pending, dropped, failed rows.")
+metrics.gauge("testly_storage", "Upload/output storage after the last retention sweep.")
+metrics.gauge("testly_admission", "Admission control: in-flight, queued requests and reserved memory.")
+metrics.counter("testly_admission_rejected_total", "Requests rejected by admission control by reason.")
+
+
+def observe_result(ok: bool, meta: Dict, upload_bytes: Optional[int] = None):
+    """Bir hat çalıştırmasının sonucunu metriklere işler."""
+    if upload_bytes is not None:
+        metrics.observe("testly_upload_bytes", upload_bytes)
+    size = meta.get("source_size")
+    if size:
+        metrics.observe("testly_image_pixels", size[0] * size[1])
+    timings = meta.get("timings") or {}
+    for name, ms in timings.items():
+        if name == "total":
+            metrics.observe("testly_process_seconds", ms / 1000.0)
+        else:
+            metrics.observe("testly_stage_seconds", ms / 1000.0, {"stage": name})
+    if not ok:
+        reason = meta.get("error") or ("exception" if "exception" in meta else "unknown")
+        metrics.inc("testly_failures_total", {"reason": reason})
@@ -0,0 +1,309 @@
+"""
+Çok sayfalı belge girişi: PDF ve çok sayfalı TIFF (taranmış testler).
+
+Sayfalar tek tek rasterleştirilir ve işlenir; belge hiçbir zaman tüm
+sayfalarıyla bellekte tutulmaz. Aynı anda en fazla max_in_flight sayfa
+(rasterleştirilmiş, kuyrukta ya da işlenmekte) bulunur; sonraki sayfa
+ancak biri bitince rasterleştirilir. Sonuçlar sayfa bittikçe üretilir.
+
+PDF rasterleştirme için pypdfium2 gerekir; TIFF kareleri Pillow ile okunur.
+
+CLI (sonuçlar satır başına bir JSON, sayfa bittikçe):
+    python -m testly_backend.services.pdf_service <belge> <output_dir> [--workers N]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Union
+
+import cv2 as cv
+import numpy as np
+from PIL import Image
+
+from .binarize import parse_spec
+from .encode import EFFORTS, FORMATS
+from .jobs import _warmup, cv_threads_for
+from .morphology import ENGINES
+from .processing import ImageTooLarge, process_array
+
+_PDF_MAGIC = b"%PDF-"
+_TIFF_MAGICS = (b"II*\x00", b"MM\x00*")
+
+# PDFium thread-safe değil: farklı belgelerde bile çağrılar sıralanmalı
+_pdfium_lock = threading.Lock()
+
+
+class DocumentError(ValueError):
+    """Açılamayan ya da desteklenmeyen belge."""
+
+
+def doc_kind(head: bytes) -> Optional[str]:
+    """Dosyanın ilk baytlarından "pdf" | "tiff"; ikisi de değilse None."""
+    if head.startswith(_PDF_MAGIC):
+        return "pdf"
+    if head[:4] in _TIFF_MAGICS:
+        return "tiff"
+    return None
+
+
+class Document:
+    """
+    Sayfa sayfa okunan belge. source: dosya yolu ya da baytlar.
+    render(i) i. sayfayı (0'dan) BGR (gray: tek kanal) uint8 dizi olarak döner:
+      PDF : dpi çözünürlükte; max_pixels'i aşacaksa ölçek düşürülür
+      TIFF: karenin kendi çözünürlüğünde; max_decode_pixels üstü ImageTooLarge
+    """
+
+    def __init__(self, source: Union[str, Path, bytes], dpi: int = 200,
+                 max_pixels: int = 0, max_decode_pixels: int = 0, gray: bool = False):
+        self.dpi = int(dpi)
+        self.max_pixels = int(max_pixels)
+        self.max_decode_pixels = int(max_decode_pixels)
+        self.gray = gray
+        self._closed = False
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = bytes(source)
+            head = source[:8]
+        else:
+            source = str(source)
+            with open(source, "rb") as fh:
+                head = fh.read(8)
+        self.kind = doc_kind(head)
+        if self.kind == "pdf":
+            self._open_pdf(source)
+        elif self.kind == "tiff":
+            try:
+                self._tif = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+                self.pages = getattr(self._tif, "n_frames", 1)
+            except Exception as e:
+                raise DocumentError(f"unreadable tiff: {e}")
+        else:
+            raise DocumentError("unsupported document (expected pdf or tiff)")
+
+    def _open_pdf(self, source):
+        try:
+            import pypdfium2 as pdfium
+        except ImportError:
+            raise DocumentError("pdf support requires pypdfium2")
+        with _pdfium_lock:
+            try:
+                self._pdf = pdfium.PdfDocument(source)
+                self.pages = len(self._pdf)
+            except pdfium.PdfiumError as e:
+                raise DocumentError(f"unreadable pdf: {e}")
+
+    def render(self, index: int) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """(görüntü, ek meta) döner."""
+        if self.kind == "pdf":
+            return self._render_pdf(index)
+        return self._render_tiff(index)
+
+    def _render_pdf(self, index: int):
+        with _pdfium_lock:
+            page = self._pdf[index]
+            try:
+                w, h = page.get_size()  # punto (1/72 inç)
+                scale = self.dpi / 72.0
+                if self.max_pixels and w * h * scale * scale > self.max_pixels:
+                    scale = (self.max_pixels / (w * h)) ** 0.5
+                bitmap = page.render(scale=scale, grayscale=self.gray)
+                try:
+                    # Bitmap PDFium belleğinde: kapatmadan önce kopyala
+                    img = np.array(bitmap.to_numpy())
+                finally:
+                    bitmap.close()
+            finally:
+                page.close()
+        if img.ndim == 3 and img.shape[2] == 1:  # gri (sürüme göre H x W x 1)
+            img = img.reshape(img.shape[:2])
+        elif img.ndim == 3 and img.shape[2] == 4:
+            img = cv.cvtColor(img, cv.COLOR_BGRA2BGR)
+        return img, {"dpi": round(scale * 72.0, 1)}
+
+    def _render_tiff(self, index: int):
+        self._tif.seek(index)
+        w, h = self._tif.size
+        if self.max_decode_pixels and w * h > self.max_decode_pixels:
+            raise ImageTooLarge(f"{w}x{h} page exceeds {self.max_decode_pixels} decode pixels")
+        img = np.array(self._tif.convert("L" if self.gray else "RGB"))
+        if img.ndim == 3:
+            cv.cvtColor(img, cv.COLOR_RGB2BGR, dst=img)
+        return img, {}
+
+    def close(self):
+        # Birden çok kez çağrılabilir (ör. akış sonu ve yanıt kapanışı)
+        if self._closed:
+            return
+        self._closed = True
+        if self.kind == "pdf":
+            with _pdfium_lock:
+                self._pdf.close()
+        else:
+            self._tif.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream_document(doc: Document, output_dir: str, stem: str,
+                    submit: Optional[Callable] = None, max_in_flight: int = 4,
+                    max_pages: int = 0, **opts) -> Iterator[Dict[str, Any]]:
+    """
+    Belgenin sayfalarını işler; her biten sayfa için
+    {"page" (1'den), "ok", "path", "meta"} üretir (bitiş sırasıyla).
+    Sayfa çıktıları <stem>_p{sayfa}_final.png (multi: _q{i}).
+    submit(fn, *args, **kwargs) -> Future: sayfa işinin havuzu; None ise
+    sayfalar bu thread'de sırayla işlenir. Rasterleştirme her durumda bu
+    thread'de. max_pages > 0: ilk max_pages sayfa. Üreteç erken kapanırsa
+    (istemci koptu) henüz başlamamış sayfa işleri iptal edilir.
+    opts: processing.process_array argümanları.
+    """
+    n = min(doc.pages, max_pages) if max_pages else doc.pages
+    max_in_flight = max(1, int(max_in_flight))
+    pending = {}
+
+    def result(page, ok, path, meta, info):
+        meta.update(info)
+        meta["page"] = page
+        return {"page": page, "ok": ok, "path": path, "meta": meta}
+
+    def collect(fut):
+        page, info = pending.pop(fut)
+        try:
+            ok, path, meta = fut.result()
+        except Exception as e:  # worker çöktü vb.
+            ok, path, meta = False, "", {"exception": str(e)}
+        return result(page, ok, path, meta, info)
+
+    try:
+        for i in range(n):
+            page = i + 1
+            try:
+                img, info = doc.render(i)
+            except ImageTooLarge as e:
+                yield result(page, False, "", {"error": "too_large", "detail": str(e)}, {})
+                continue
+            except Exception as e:
+                yield result(page, False, "", {"error": "read_fail", "detail": str(e)}, {})
+                continue
+            page_stem = f"{stem}_p{page}"
+            if submit is None:
+                yield result(page, *process_array(img, output_dir, page_stem, **opts), info)
+                continue
+            pending[submit(process_array, img, output_dir, page_stem, **opts)] = (page, info)
+            del img  # referans yalnızca iş kuyruğunda
+            while len(pending) >= max_in_flight:
+                finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for f in finished:
+                    yield collect(f)
+
+        while pending:
+            finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for f in finished:
+                yield collect(f)
+
+    finally:
+        for f in pending:
+            f.cancel()
+
+def run_document(path, output_dir, workers: Optional[int] = None, in_flight: int = 0,
+                 dpi: int = 200, max_pages: int = 0, max_pixels: int = 0,
+                 gray: bool = False, multi=None,
+                 fmt: str = "png", effort: str = "balanced", morph_engine: str = "",
+                 binarize: Optional[Dict[str, Any]] = None,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Belgeyi süreç havuzunda sayfa sayfa işler, özet sözlüğü döner.
+    in_flight: aynı anda bellekteki en fazla sayfa (0: 2 x workers).
+    morph_engine, binarize: worker ayarları (bkz. batch.run_batch).
+    progress(kayıt): her biten sayfa için (path output_dir'e göreli).
+    Belge açılamazsa DocumentError / OSError.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    opts = {"gray": gray, "multi": multi,
+            "max_pixels": max_pixels, "fmt": fmt, "effort": effort}
+    summary = {"pages": 0, "ok": 0, "failed": 0, "failures": []}
+    t_start = time.perf_counter()
+
+    with Document(path, dpi=dpi, max_pixels=max_pixels, gray=gray) as doc, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                initializer=_warmup,
+                                initargs=(cv_threads_for(workers), morph_engine, binarize)) as pool:
+        summary["document_pages"] = doc.pages
+        for rec in stream_document(doc, str(output_dir), Path(path).stem, submit=pool.submit,
+                                   max_in_flight=in_flight or 2 * workers,
+                                   max_pages=max_pages, **opts):
+            summary["pages"] += 1
+            if rec["ok"]:
+                summary["ok"] += 1
+                rec["path"] = os.path.relpath(rec["path"], output_dir)
+            else:
+                summary["failed"] += 1
+                summary["failures"].append({"page": rec["page"],
+                                            "error": rec["meta"].get("error")
+                                            or rec["meta"].get("exception")})
+            if progress is not None:
+                progress(rec)
+
+    wall = time.perf_counter() - t_start
+    summary["wall_s"] = round(wall, 3)
+    summary["pages_per_s"] = round(summary["pages"] / wall, 3) if wall > 0 else None
+    return summary
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="page-by-page question extraction from pdf / tiff")
+    ap.add_argument("document")
+    ap.add_argument("output_dir")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--in-flight", type=int, default=0,
+                    help="aynı anda bellekteki en fazla sayfa (varsayılan 2 x workers)")
+    ap.add_argument("--dpi", type=int, default=200)
+    ap.add_argument("--max-pages", type=int, default=0)
+    ap.add_argument("--max-pixels", type=int, default=0)
+    ap.add_argument("--gray", action="store_true")
+    ap.add_argument("--multi", action="store_true", help="sayfadaki tüm soruları çıkar")
+    ap.add_argument("--format", default="png", choices=list(FORMATS))
+    ap.add_argument("--effort", default="balanced", choices=list(EFFORTS))
+    ap.add_argument("--morph", default="", choices=["", *ENGINES],
+                    help="merge morfolojisi motoru")
+    ap.add_argument("--binarize", default="", type=parse_spec,
+                    help="sauvola | page=mean,refine=sauvola,final=gaussian")
+    ap.add_argument("-q", "--quiet", action="store_true")
+    args = ap.parse_args(argv)
+
+    def progress(rec):
+        print(json.dumps(rec, ensure_ascii=False), flush=True)
+
+    try:
+        summary = run_document(args.document, args.output_dir, workers=args.workers,
+                               in_flight=args.in_flight, dpi=args.dpi,
+                               max_pages=args.max_pages, max_pixels=args.max_pixels,
+                               gray=args.gray,
+                               multi={} if args.multi else None,
+                               fmt=args.format, effort=args.effort, morph_engine=args.morph,
+                               binarize=args.binarize or None,
+                               progress=None if args.quiet else progress)
+    except (OSError, DocumentError) as e:
+        print(f"[fail] {args.document}: {e}", file=sys.stderr)
+        return 2
+    print(json.dumps({k: v for k, v in summary.items() if k != "failures"}), file=sys.stderr)
+    for f in summary["failures"]:
+        print(f"[fail] page {f['page']}: {f['error']}", file=sys.stderr)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
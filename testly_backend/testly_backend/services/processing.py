@@ -1,52 +1,396 @@
 # testly_backend/services/processing.py
 from pathlib import Path
-from typing import Tuple, Dict, Any
-import os
+from typing import Tuple, Dict, Any, Optional, Union
+import io, os, time, warnings
 
 import cv2 as cv
 import numpy as np
+from PIL import Image
 
 # Senin hattın:
 from .refined_question_pipeline import (
-    imread_u, imwrite_u,
-    page_crop_user, refine_question_from_pagecrop
+    imread_u, order_quad, resize_long_edge, perspective_warp, binarize_warped,
+    QuestionPipeline, refine_question_gray
 )
+from .encode import FORMATS, encode_bw
+from .storage import atomic_write, rel_name, shard_name, write_new
+from .timing import collect, stage
 
-def process_file(input_path: str, output_dir: str, show: bool = False) -> Tuple[bool, str, Dict[str, Any]]:
+_REDUCED_GRAY = ((8, cv.IMREAD_REDUCED_GRAYSCALE_8),
+                 (4, cv.IMREAD_REDUCED_GRAYSCALE_4),
+                 (2, cv.IMREAD_REDUCED_GRAYSCALE_2))
+_REDUCED = {(2, False): cv.IMREAD_REDUCED_COLOR_2, (2, True): cv.IMREAD_REDUCED_GRAYSCALE_2,
+            (4, False): cv.IMREAD_REDUCED_COLOR_4, (4, True): cv.IMREAD_REDUCED_GRAYSCALE_4,
+            (8, False): cv.IMREAD_REDUCED_COLOR_8, (8, True): cv.IMREAD_REDUCED_GRAYSCALE_8}
+_JPEG_MAGIC = b"\xff\xd8\xff"
+
+Result = Tuple[bool, str, Dict[str, Any]]
+
+def _tolist(a):
+    return np.array(a).tolist() if a is not None else None
+
+class ImageTooLarge(ValueError):
+    pass
+
+# SOFn işaretleri (C4 DHT, C8 JPG, CC DAC değil)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def _jpeg_size(data) -> Optional[Tuple[int, int]]:
+    """JPEG segmentlerini SOFn'e kadar yürüyerek (w, h); bulunamazsa None."""
+    buf = memoryview(data)
+    i, n = 2, len(buf)
+    while i + 4 <= n:
+        if buf[i] != 0xFF:
+            return None
+        marker = buf[i + 1]
+        if marker == 0xFF:  # dolgu baytı
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # uzunluksuz işaretler
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):  # EOI / SOS: SOF'tan önce gelmemeli
+            return None
+        seg = (buf[i + 2] << 8) | buf[i + 3]
+        if marker in _JPEG_SOF:
+            if i + 9 > n:
+                return None
+            h = (buf[i + 5] << 8) | buf[i + 6]
+            w = (buf[i + 7] << 8) | buf[i + 8]
+            return (w, h) if w and h else None
+        i += 2 + seg
+    return None
+
+def header_size(data: Union[bytes, bytearray, memoryview]) -> Optional[Tuple[int, int]]:
     """
-    input_path -> page crop -> refine -> outputs/<stem>_final.png
+    Dosya başlığından (w, h); pikseller decode edilmez. JPEG'de SOF segmenti
+    doğrudan okunur (Pillow'un decompression-bomb sınırı uygulanmaz, büyük
+    JPEG'e decode_plan karar verir); diğer biçimlerde Pillow tembel açılış.
+    Okunamazsa None; Pillow'un decompression-bomb sınırını aşarsa ImageTooLarge.
     """
+    if bytes(data[:3]) == _JPEG_MAGIC:
+        size = _jpeg_size(data)
+        if size is not None:
+            return size
     try:
-        output_dir_p = Path(output_dir)
-        output_dir_p.mkdir(parents=True, exist_ok=True)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(data)) as im:
+                return im.size
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    except Exception:
+        return None
+
+def decode_plan(data, max_pixels: int, oversize: str = "downscale",
+                max_decode_pixels: int = 0) -> Optional[Dict[str, int]]:
+    """
+    Başlıktaki boyuta göre decode planı, piksel decode etmeden:
+    {"width", "height", "reduce", "decode_pixels", "work_pixels"}.
+    Görüntü max_pixels'i aşarsa:
+      oversize="reject"    -> ImageTooLarge
+      oversize="downscale" -> JPEG'de decode'u bütçeye indiren en küçük
+        IMREAD_REDUCED_* çarpanı (DCT ölçekli, tam kare hiç açılmaz); diğer
+        biçimler tam decode edilip küçültülür, max_decode_pixels üstü reddedilir.
+    Başlık okunamazsa None.
+    """
+    size = header_size(data)
+    if size is None:
+        return None
+    w, h = size
+    plan = {"width": w, "height": h, "reduce": 1,
+            "decode_pixels": w * h, "work_pixels": w * h}
+    if not max_pixels or w * h <= max_pixels:
+        return plan
+    if oversize == "reject":
+        raise ImageTooLarge(f"{w}x{h} exceeds {max_pixels} pixels")
+    if bytes(data[:3]) == _JPEG_MAGIC:
+        for r in (2, 4, 8):
+            plan["reduce"] = r
+            if (w // r) * (h // r) <= max_pixels:
+                break
+        plan["decode_pixels"] = (w // plan["reduce"]) * (h // plan["reduce"])
+    elif max_decode_pixels and w * h > max_decode_pixels:
+        raise ImageTooLarge(f"{w}x{h} exceeds {max_decode_pixels} decodable pixels")
+    plan["work_pixels"] = min(plan["decode_pixels"], max_pixels)
+    return plan
+
+def fit_pixels(img, max_pixels: int):
+    """max_pixels'e sığmayan görüntüyü en-boy oranını koruyarak küçültür (INTER_AREA)."""
+    H, W = img.shape[:2]
+    if not max_pixels or W * H <= max_pixels:
+        return img
+    s = (max_pixels / float(W * H)) ** 0.5
+    size = (max(1, int(W * s)), max(1, int(H * s)))
+    with stage("resize"):
+        return cv.resize(img, size, interpolation=cv.INTER_AREA)
+
+def decode_image(data: Union[bytes, bytearray, memoryview], flags=cv.IMREAD_COLOR):
+    """Bellekteki dosya baytlarını kopyalamadan decode eder."""
+    return cv.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+
+def decode_reduced_gray(data, src_shape, long_edge: int):
+    """
+    Önizleme için JPEG'in DCT ölçekli decode'u: uzun kenarı
+    long_edge'in altına düşmeyen en büyük 1/2, 1/4, 1/8 indirgemesi.
+    Uygun indirgeme yoksa None.
+    """
+    src_long = max(src_shape[:2])
+    for f, flag in _REDUCED_GRAY:
+        if src_long / f >= long_edge:
+            return decode_image(data, flag)
+    return None
+
+def process_file(input_path: str, output_dir: str, show: bool = False,
+                 gray: bool = False,
+                 timings: bool = False, explain: bool = False,
+                 multi: Optional[Dict[str, Any]] = None, max_pixels: int = 0,
+                 oversize: str = "downscale", max_decode_pixels: int = 0,
+                 fmt: str = "png", effort: str = "balanced", overwrite: bool = False,
+                 shard: bool = False) -> Result:
+    """
+    input_path -> page crop -> refine -> output_dir/<stem>_final.png
+    (shard: output_dir/ab/cd/..., storage.shard_name; sunucunun OUTPUT_DIR'i
+    için. Ad alınmışsa kısa rastgele ek; overwrite: ek yok, aynı addaki eski
+    çıktının yerine yazılır, yeniden denemede kopya oluşmaz)
+    gray: görüntü IMREAD_GRAYSCALE ile okunur, tüm hat tek kanalda çalışır.
+    timings: aşama süreleri (ms) meta["timings"] altında döner.
+    meta["score"]: tekli modda seçilen kutunun skoru.
+    explain: en iyi adaylar skor ve öznitelikleriyle meta["candidates"] altında.
+    multi: select_questions argümanları; verilirse sayfadaki tüm sorular
+    <stem>_q{i}.png olarak yazılır, meta["questions"] listesi döner
+    (okuma sırasıyla; output: outputs altındaki göreli yol). best_box,
+    boyut ve dönüşteki yol tekli moddaki gibi en yüksek skorlu sorunun.
+    max_pixels > 0: piksel bütçesi (bkz. decode_plan); aşan görüntü
+    oversize'a göre reddedilir ("too_large") ya da küçültülür
+    (meta["downscaled"], koordinatlar küçültülmüş görüntüde).
+    fmt, effort: çıktı biçimi ve hız/boyut tercihi (bkz. encode.encode_bw);
+    uzantı biçime göre (.png, .tif, .webp).
+    """
+    def load():
+        if max_pixels:
+            return _load_bytes(np.fromfile(input_path, dtype=np.uint8), gray,
+                               max_pixels, oversize, max_decode_pixels)
+        img = imread_u(input_path, cv.IMREAD_GRAYSCALE if gray else cv.IMREAD_COLOR)
+        return img, {}
+    return _run(load, output_dir, Path(input_path).stem, show,
+                timings, explain, multi, fmt, effort, overwrite, shard)
+
+def process_bytes(data: Union[bytes, bytearray, memoryview], output_dir: str, stem: str,
+                  show: bool = False, gray: bool = False, timings: bool = False,
+                  explain: bool = False, multi: Optional[Dict[str, Any]] = None,
+                  max_pixels: int = 0, oversize: str = "downscale",
+                  max_decode_pixels: int = 0, fmt: str = "png",
+                  effort: str = "balanced", shard: bool = False) -> Result:
+    """
+    process_file'ın bellek içi kardeşi: yüklenen dosyanın baytları diske
+    yazılıp tekrar okunmadan doğrudan decode edilir.
+    Çıktı output_dir/<stem>_final.png (multi: <stem>_q{i}.png; shard: ab/cd/ altında).
+    max_pixels, oversize, max_decode_pixels, fmt, effort: process_file ile aynı.
+    """
+    def load():
+        return _load_bytes(data, gray, max_pixels, oversize, max_decode_pixels)
+    return _run(load, output_dir, stem, show, timings, explain, multi,
+                fmt, effort, shard=shard)
+
+def process_array(img, output_dir: str, stem: str, show: bool = False,
+                  gray: bool = False, timings: bool = False, explain: bool = False, multi: Optional[Dict[str, Any]] = None,
+                  max_pixels: int = 0, fmt: str = "png", effort: str = "balanced",
+                  shard: bool = False) -> Result:
+    """
+    Bellekteki görüntü (BGR ya da gri; ör. rasterleştirilmiş belge sayfası)
+    için process_bytes: decode yok. gray: renkli girdi griye çevrilir.
+    max_pixels > 0: aşan görüntü küçültülür (meta["downscaled"]).
+    """
+    def load():
+        im, info = img, {}
+        if gray and im.ndim == 3:
+            im = cv.cvtColor(im, cv.COLOR_BGR2GRAY)
+        if max_pixels and im.shape[0] * im.shape[1] > max_pixels:
+            info["downscaled"] = {"from": [int(im.shape[1]), int(im.shape[0])], "reduce": 1}
+            im = fit_pixels(im, max_pixels)
+        return im, info
+    return _run(load, output_dir, stem, show, timings, explain, multi,
+                fmt, effort, shard=shard)
+
+def _load_bytes(data, gray: bool, max_pixels: int, oversize: str, max_decode_pixels: int):
+    # (img, ek meta) döner; bütçe aşımında ImageTooLarge
+    plan = decode_plan(data, max_pixels, oversize, max_decode_pixels) if max_pixels else None
+    reduce = plan["reduce"] if plan else 1
+    img = decode_image(data, _REDUCED[reduce, gray] if reduce > 1
+                       else cv.IMREAD_GRAYSCALE if gray else cv.IMREAD_COLOR)
+    info = {}
+    if img is not None and max_pixels and (reduce > 1 or img.shape[0] * img.shape[1] > max_pixels):
+        src = [plan["width"], plan["height"]] if plan else [img.shape[1], img.shape[0]]
+        img = fit_pixels(img, max_pixels)
+        info["downscaled"] = {"from": src, "reduce": reduce}
+    return img, info
+
+def decode_preview(data: Union[bytes, bytearray, memoryview], long_edge: int,
+                   max_pixels: int = 0):
+    """
+    Önizleme karesini gri ve uzun kenarı long_edge'e küçültülmüş decode eder
+    (JPEG'de IMREAD_REDUCED_GRAYSCALE_*). (küçük, (W, H)) döner; W, H kare
+    boyutu (EXIF yönü uygulanmış). Okunamazsa None, max_pixels aşılırsa
+    ImageTooLarge.
+    """
+    size = header_size(data)
+    if size is not None and max_pixels and size[0] * size[1] > max_pixels:
+        raise ImageTooLarge(f"{size[0]}x{size[1]} exceeds {max_pixels} pixels")
+    with stage("decode"):
+        img = None
+        if size is not None and bytes(data[:3]) == _JPEG_MAGIC:
+            img = decode_reduced_gray(data, size, long_edge)
+        if img is None:
+            img = decode_image(data, cv.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    W, H = size if size is not None else (img.shape[1], img.shape[0])
+    if (W > H) != (img.shape[1] > img.shape[0]):
+        W, H = H, W  # decode EXIF yönünü uyguladı, başlık boyutu ham
+    with stage("resize"):
+        small, _ = resize_long_edge(img, long_edge)
+    return small, (int(W), int(H))
+
+def detect_bytes(data: Union[bytes, bytearray, memoryview], long_edge: int = 640,
+                 source_long_edge: int = 0, top_k: int = 1, max_pixels: int = 0,
+                 timings: bool = False) -> Dict[str, Any]:
+    """
+    Canlı önizleme için yalnızca tespit: page crop + aday skorlama, gri ve
+    long_edge'e küçültülmüş karede; warp, eşikleme ve dosya yazımı yok.
+    JPEG'de kare doğrudan IMREAD_REDUCED_GRAYSCALE_* ile decode edilir.
+    source_long_edge: asıl çekimin uzun kenarı (kernel/blok ölçekleri ona
+    göre seçilir); 0 ise gönderilen kare. Sonuç kadraj ipucudur, tam
+    çözünürlüklü tespitle aynı kutuyu vermez (640 px önizlemede golden
+    best_box ile IoU medyanı ~0.27); kaydedilen çıktı her zaman tam
+    çözünürlükte yeniden tespit edilir.
+    Dönüş: {"frame_size", "page_rect", "quad", "score", "candidates"};
+    koordinatlar gönderilen karede, quad [tl, tr, bl, br] (aday yoksa None).
+    Okunamazsa {"error": "read_fail"}, bütçe aşımında {"error": "too_large"}.
+    """
+    with collect(timings) as t:
+        t0 = time.perf_counter()
+        try:
+            dec = decode_preview(data, long_edge, max_pixels)
+        except ImageTooLarge:
+            return {"error": "too_large"}
+        if dec is None:
+            return {"error": "read_fail"}
+        small, (W, H) = dec
+        fx, fy = W / float(small.shape[1]), H / float(small.shape[0])
+        src_scale = (source_long_edge or max(W, H)) / float(max(small.shape[:2]))
 
-        bgr = imread_u(input_path, cv.IMREAD_COLOR)
-        if bgr is None:
-            return False, "", {"error": "read_fail"}
+        pipe = QuestionPipeline(small, src_scale=src_scale, shared_clahe=True)
+        found = pipe.find(top_k=max(1, top_k))
+        x, y, w, h = pipe.page_rect()
 
-        pc, pc_stages = page_crop_user(bgr, debug=show)
-        out = refine_question_from_pagecrop(pc, invert_to_black_text=True, debug=show)
+        def to_frame(box):
+            q = (np.float32(box).reshape(4, 2) + np.float32([x, y])) * np.float32([fx, fy])
+            return np.round(order_quad(q), 1).tolist()
+
+        res = {"frame_size": [int(W), int(H)],
+               "page_rect": [int(round(x * fx)), int(round(y * fy)),
+                             int(round(w * fx)), int(round(h * fy))],
+               "quad": to_frame(found["best_box"]) if found["best_box"] is not None else None,
+               "score": round(found["score"], 4) if found["score"] is not None else None,
+               "candidates": [{"quad": to_frame(c["box"]), "score": round(c["score"], 4)}
+                              for c in found["candidates"][1:top_k]]}
+        if t is not None:
+            t["total"] = (time.perf_counter() - t0) * 1000.0
+            res["timings"] = {k: round(v, 3) for k, v in t.items()}
+    return res
+
+def _run(load, output_dir: str, stem: str, show: bool, timings: bool, explain: bool = False, multi=None,
+         fmt: str = "png", effort: str = "balanced", overwrite: bool = False,
+         shard: bool = False) -> Result:
+    with collect(timings) as t:
+        t0 = time.perf_counter()
+        try:
+            with stage("decode"):
+                img, info = load()
+        except ImageTooLarge as e:
+            ok, path, meta = False, "", {"error": "too_large", "detail": str(e)}
+        except Exception as e:
+            ok, path, meta = False, "", {"exception": str(e)}
+        else:
+            if img is None:
+                ok, path, meta = False, "", {"error": "read_fail"}
+            else:
+                ok, path, meta = _process(img, output_dir, stem, show, explain, multi,
+                                         fmt, effort, overwrite, shard)
+                meta["source_size"] = [int(img.shape[1]), int(img.shape[0])]
+                meta.update(info)
+        if t is not None:
+            t["total"] = (time.perf_counter() - t0) * 1000.0
+            meta["timings"] = {k: round(v, 3) for k, v in t.items()}
+    return ok, path, meta
+
+def _write_output(output_dir_p: Path, base: str, bw, fmt: str, effort: str,
+                  overwrite: bool = False, shard: bool = False) -> Optional[Path]:
+    # output_dir/<base>.<uzantı> (shard: ab/cd/ altında), atomik; kodlanamazsa None
+    try:
+        data = encode_bw(bw, fmt, effort)
+    except ValueError:
+        return None
+    name = base + FORMATS[fmt][0]
+    with stage("write"):
+        if overwrite:
+            path = output_dir_p / (shard_name(name) if shard else name)
+            atomic_write(path, data)
+            return path
+        return write_new(output_dir_p, name, data, shard=shard)
+
+def _process(img, output_dir: str, stem: str, show: bool,
+             explain: bool = False, multi=None,
+             fmt: str = "png", effort: str = "balanced", overwrite: bool = False,
+             shard: bool = False) -> Result:
+    try:
+        output_dir_p = Path(output_dir)
+
+        if img.ndim == 2:
+            out = refine_question_gray(img, invert_to_black_text=True, debug=show, multi=multi)
+        else:
+            # Page crop ve refine tek QuestionPipeline'da: gri dönüşüm bir kez
+            out = QuestionPipeline(img, debug=show).refine(invert_to_black_text=True,
+                                                           multi=multi)
 
         if out.get("final_bw") is None:
             return False, "", {"error": "no_candidate"}
 
-        stem = Path(input_path).stem
-        base = f"{stem}_final"
-        out_path = output_dir_p / f"{base}.png"
-        i = 1
-        while out_path.exists():
-            out_path = output_dir_p / f"{base}_{i}.png"
-            i += 1
-
-        ok = imwrite_u(str(out_path), out["final_bw"])
-        if not ok:
-            return False, "", {"error": "write_fail"}
+        if "questions" in out:
+            outputs = [(f"{stem}_q{i}", q["final_bw"]) for i, q in enumerate(out["questions"], 1)]
+        else:
+            outputs = [(f"{stem}_final", out["final_bw"])]
+        paths = []
+        for base, bw in outputs:
+            out_path = _write_output(output_dir_p, base, bw, fmt, effort, overwrite, shard)
+            if out_path is None:
+                return False, "", {"error": "write_fail"}
+            paths.append(out_path)
+        out_path = paths[out.get("top", 0)]
 
         meta = {
-            "best_box": np.array(out.get("best_box")).tolist() if out.get("best_box") is not None else None,
+            "best_box": _tolist(out.get("best_box")),
             "width": int(out["final_bw"].shape[1]),
             "height": int(out["final_bw"].shape[0]),
+            "format": fmt,
         }
+        if out.get("page_rect") is not None:
+            meta["page_rect"] = out["page_rect"]
+        if "questions" not in out and out.get("candidates"):
+            meta["score"] = round(out["candidates"][0]["score"], 4)
+        if "questions" in out:
+            meta["questions"] = [{"output": rel_name(output_dir_p, p),
+                                  "best_box": _tolist(q["best_box"]),
+                                  "score": round(q["score"], 4),
+                                  "width": int(q["final_bw"].shape[1]),
+                                  "height": int(q["final_bw"].shape[0])}
+                                 for p, q in zip(paths, out["questions"])]
+        if explain:
+            meta["candidates"] = [{"score": round(c["score"], 4),
+                                   "box": _tolist(c["box"]),
+                                   "features": {k: round(v, 4) for k, v in c["features"].items()}}
+                                  for c in out.get("candidates", [])]
         return True, str(out_path), meta
 
     except Exception as e:
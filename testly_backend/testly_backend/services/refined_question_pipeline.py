@@ -5,6 +5,10 @@ import os, math
 import cv2 as cv
 import numpy as np
 
+from .binarize import threshold_inv
+from .morphology import dilate_close
+from .timing import stage
+
 # ---------- IO helpers (Unicode-safe) ----------
 IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
 
@@ -17,15 +21,21 @@ def imread_u(path: str, flags=cv.IMREAD_COLOR):
 
 def imwrite_u(path: str, img) -> bool:
     ext = os.path.splitext(path)[1] or ".png"
-    ok, buf = cv.imencode(ext, img)
+    with stage("encode"):
+        ok, buf = cv.imencode(ext, img)
     if ok:
-        buf.tofile(path)
+        with stage("write"):
+            buf.tofile(path)
     return ok
 
 # ---------- small utils ----------
 def _odd(x: int) -> int:
     return int(x) | 1
 
+def _px(v, s=1.0):
+    # Kaynak çözünürlükte tanımlı piksel ölçüsünü önizleme ölçeğine çevirir
+    return max(1, int(round(v / s)))
+
 def auto_block_size(h, w, frac=0.022, minv=21, maxv=151):
     k = _odd(int(round(min(h, w) * frac)))
     return max(minv, min(k, maxv))
@@ -44,206 +54,494 @@ def perspective_warp(bgr, box):
     w = max(w, 10); h = max(h, 10)
     dst = np.array([[0,0],[w-1,0],[0,h-1],[w-1,h-1]], dtype=np.float32)
     M = cv.getPerspectiveTransform(box, dst)
-    return cv.warpPerspective(bgr, M, (w, h),
-                              flags=cv.INTER_CUBIC,
-                              borderValue=(255,255,255))
-
-def projection_lobes(mask_roi, axis=1, thr_frac=0.12):
-    sums = (mask_roi > 0).sum(axis=axis)
-    thr = max(3, int(round(thr_frac * (mask_roi.shape[0 if axis==1 else 1]))))
-    runs = 0; in_run = False
-    for v in sums:
-        if v >= thr:
-            if not in_run: runs += 1; in_run = True
-        else:
-            in_run = False
-    return runs
-
-def gaussian_score(x, mu, tol):
-    if tol <= 0: return 0.0
-    z = (x - mu) / (tol + 1e-6)
-    return float(np.exp(-0.5 * z * z))
-
-def clamp01(x): return max(0.0, min(1.0, float(x)))
+    with stage("warp"):
+        return cv.warpPerspective(bgr, M, (w, h),
+                                  flags=cv.INTER_CUBIC,
+                                  borderValue=(255,255,255))
+
+def gray_clahe(img):
+    """BGR ya da tek kanallı görüntüden Gray+CLAHE."""
+    g = cv.cvtColor(img, cv.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return cv.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(g)
+
+def filter_components(binv, min_area=0, max_area=None,
+                      min_w=0, min_h=0, max_aspect=None, connectivity=8):
+    """
+    Küçük bileşen temizliği, label görüntüsü üzerinde tek geçişte:
+    stats'tan her etiket için tut/at tablosu (LUT) kurulur, sonra
+    clean = lut[labels]. Bileşen başına tam kare tarama yapılmaz.
+    """
+    num, labels, stats, _ = cv.connectedComponentsWithStats(binv, connectivity)
+    area = stats[:, cv.CC_STAT_AREA]
+    keep = area >= min_area
+    if max_area is not None:
+        keep &= area <= max_area
+    if min_w or min_h or max_aspect is not None:
+        bw = stats[:, cv.CC_STAT_WIDTH]
+        bh = stats[:, cv.CC_STAT_HEIGHT]
+        keep &= (bw >= min_w) & (bh >= min_h)
+        if max_aspect is not None:
+            aspect = np.maximum(bw, bh) / np.maximum(np.minimum(bw, bh), 1)
+            keep &= aspect <= max_aspect
+    keep[0] = False  # arka plan
+    lut = np.where(keep, 255, 0).astype(np.uint8)
+    return lut[labels]
+
+def resize_long_edge(img, long_edge):
+    """Uzun kenarı long_edge olacak şekilde küçültür; (img, (sx, sy)) döner.
+    sx, sy: küçük -> kaynak koordinat çarpanları."""
+    H, W = img.shape[:2]
+    if not long_edge or max(H, W) <= long_edge:
+        return img, (1.0, 1.0)
+    s = long_edge / float(max(H, W))
+    w, h = max(1, int(round(W * s))), max(1, int(round(H * s)))
+    small = cv.resize(img, (w, h), interpolation=cv.INTER_AREA)
+    return small, (W / float(w), H / float(h))
 
 # ---------- PAGE CROP ----------
-def page_crop_user(bgr, debug=True):
+def page_crop_rect(bgr, debug=True, src_scale=1.0, gray=None):
+    """
+    Sayfa bölgesini (x, y, w, h) olarak bulur; kontur yoksa None.
+    bgr tek kanallı da olabilir. gray: önceden hesaplanmış Gray+CLAHE.
+    src_scale: bgr küçültülmüş bir önizleme ise kaynak/önizleme oranı; kernel
+    ve blok boyutları kaynak çözünürlükteki karşılıklarına göre seçilir.
+    Ölçekleme tam çözünürlüklü tespiti yeniden üretmez (bkz. detect_bytes);
+    sonuç yalnızca kadraj ipucudur.
+    """
     H, W = bgr.shape[:2]
-    k = max(3, round(W / 400))
+    s = src_scale
+    k = max(3, round(W * s / 400))
     images = [] if debug else None
 
-    g = cv.cvtColor(bgr, cv.COLOR_BGR2GRAY)
-    g = cv.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(g)
+    if gray is not None:
+        g = gray
+    else:
+        with stage("clahe"):
+            g = gray_clahe(bgr)
     if debug: images.append(("Gray+CLAHE (PC)", g))
 
-    thr = cv.adaptiveThreshold(g, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C,
-                               cv.THRESH_BINARY, 2 * k + 1, 10)
-    binv = cv.bitwise_not(thr)
-
-    mask = np.zeros_like(binv, dtype=np.uint8)
-    scale = np.sqrt(0.8)
-    new_W = int(W * scale); new_H = int(H * scale)
-    x1 = (W - new_W) // 2; y1 = (H - new_H) // 2
-    x2 = x1 + new_W;       y2 = y1 + new_H
-    cv.rectangle(mask, (x1, y1), (x2, y2), 255, -1)
-    binv = cv.bitwise_and(binv, mask)
+    with stage("threshold"):
+        # THRESH_BINARY_INV = 255 - THRESH_BINARY (ayrı invert geçişi yok)
+        binv = threshold_inv(g, max(3, _odd(_px(2 * k + 1, s))), 10, "page")
+
+        # %80 merkez maskesi: tam boy maske yerine dışarısı yerinde sıfırlanır
+        scale = np.sqrt(0.8)
+        new_W = int(W * scale); new_H = int(H * scale)
+        x1 = (W - new_W) // 2; y1 = (H - new_H) // 2
+        x2 = x1 + new_W;       y2 = y1 + new_H
+        binv[:y1] = 0; binv[y2 + 1:] = 0
+        binv[:, :x1] = 0; binv[:, x2 + 1:] = 0
     if debug: images.append(("Thr Invert + 80% Center Mask (PC)", binv))
 
-    num, labels, stats, _ = cv.connectedComponentsWithStats(binv, 8)
-    clean = np.zeros_like(binv)
-    for i in range(1, num):
-        if stats[i, cv.CC_STAT_AREA] >= 0.00005 * W * H:
-            clean[labels == i] = 255
+    with stage("components"):
+        clean = filter_components(binv, min_area=0.00005 * W * H)
     if debug: images.append(("Noise Clean (PC)", clean))
 
-    ker_h = cv.getStructuringElement(cv.MORPH_RECT, (10 * k, 3))
-    merged = cv.dilate(clean, ker_h, iterations=1)
-    ker_v = cv.getStructuringElement(cv.MORPH_RECT, (3, 35 * k))
-    merged = cv.dilate(merged, ker_v, iterations=1)
-    if debug: images.append(("Dilate HV (PC)", merged))
-
-    ker_c = cv.getStructuringElement(cv.MORPH_RECT, (5 * k, 5 * k))
-    merged = cv.morphologyEx(merged, cv.MORPH_CLOSE, ker_c, iterations=2)
-    if debug: images.append(("Closing (PC)", merged))
+    hv = [(_px(10 * k, s), _px(3, s)), (_px(3, s), _px(35 * k, s))]
+    close = (_px(5 * k, s), _px(5 * k, s))
+    if debug:
+        # Ara görseller için adım adım
+        with stage("morphology"):
+            merged = dilate_close(clean, hv, close, iterations=0)
+        images.append(("Dilate HV (PC)", merged))
+        with stage("morphology"):
+            merged = dilate_close(merged, [], close, iterations=2)
+        images.append(("Closing (PC)", merged))
+    else:
+        with stage("morphology"):
+            merged = dilate_close(clean, hv, close, iterations=2)
+
+    with stage("contours"):
+        cnts, _ = cv.findContours(merged, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+        if not cnts:
+            return None, (images or [])
+        page_contour = max(cnts, key=cv.contourArea)
+        return cv.boundingRect(page_contour), (images or [])
 
-    cnts, _ = cv.findContours(merged, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-    if not cnts:
+def page_crop_user(bgr, debug=True):
+    rect, images = page_crop_rect(bgr, debug=debug)
+    if rect is None:
         if debug: images.append(("Page Crop (fallback orig)", bgr))
-        return bgr, (images or [])
-    page_contour = max(cnts, key=cv.contourArea)
-    x_p, y_p, w_p, h_p = cv.boundingRect(page_contour)
+        return bgr, images
+    x_p, y_p, w_p, h_p = rect
     page_crop = bgr[y_p:y_p + h_p, x_p:x_p + w_p]
     if debug: images.append(("Page Crop", page_crop))
-    return page_crop, (images or [])
+    return page_crop, images
 
 # ---------- REFINE ----------
-def refine_question_from_pagecrop(page_crop_bgr,
-                                  invert_to_black_text=True,
-                                  debug=True):
-    stages = []
-    bgr = page_crop_bgr.copy()
-    H, W = bgr.shape[:2]
-    k = max(3, round(W / 400))
+# Aday öznitelikleri (candidate_features sütun sırası)
+CANDIDATE_FEATURES = ("area", "fill", "extent", "solidity", "rectangularity",
+                      "aspect", "center", "v_lobes", "h_lobes")
+
+# Lob sayısına göre hedefler ve ağırlıklar:
+# rect_mu, rect_tol, ext_mu, ext_tol, ar_mu, ar_tol, w_rect, w_ext, w_sol, w_ctr, w_ar
+_SCORE_PARAMS = np.array([
+    (0.70, 0.20, 0.65, 0.20, 1.0, 0.8, 0.30, 0.25, 0.20, 0.10, 0.15),  # >= 3 lob
+    (0.80, 0.15, 0.72, 0.18, 1.0, 0.6, 0.35, 0.25, 0.20, 0.10, 0.10),  # 2 lob
+    (0.92, 0.10, 0.85, 0.12, 1.0, 0.5, 0.45, 0.20, 0.20, 0.10, 0.05),  # 0-1 lob
+])
+
+def _lobes(I, start, length, lo, hi, thr_frac, axis):
+    """
+    projection_lobes'un tüm adaylar için NumPy karşılığı. I, maske (>0)
+    integral görüntüsü. axis=1: satır toplamları (start=y, length=h,
+    [lo, hi) = sütun aralığı); axis=0: sütun toplamları. Eşik üstü
+    koşular, bir önceki eleman eşik altındayken başlayan elemanlar sayılır.
+    """
+    L = int(length.max())
+    idx = start[:, None] + np.arange(L)[None, :]
+    valid = np.arange(L)[None, :] < length[:, None]
+    idx = np.where(valid, idx, start[:, None])
+    lo = lo[:, None]; hi = hi[:, None]
+    if axis == 1:
+        sums = I[idx + 1, hi] - I[idx + 1, lo] - I[idx, hi] + I[idx, lo]
+    else:
+        sums = I[hi, idx + 1] - I[lo, idx + 1] - I[hi, idx] + I[lo, idx]
+    thr = np.maximum(3, np.round(thr_frac * length).astype(np.int64))
+    above = (sums >= thr[:, None]) & valid
+    return above[:, 0].astype(np.int64) + (above[:, 1:] & ~above[:, :-1]).sum(axis=1)
+
+def candidate_features(cnts, clean, W, H):
+    """
+    Alan eşiğini geçen konturlar için öznitelik matrisi.
+    (boxes (n,4,2) float32, rects (n,4) x,y,w,h, feats (n, len(CANDIDATE_FEATURES))) döner.
+    Kontur başına yalnızca OpenCV geometri çağrıları yapılır; lob sayımı
+    tek integral görüntü üzerinden vektörel.
+    """
+    areas = np.array([cv.contourArea(c) for c in cnts], dtype=np.float64)
+    rects = np.array([cv.boundingRect(c) for c in cnts], dtype=np.int64).reshape(-1, 4)
+    keep = (areas >= 0.01 * W * H) & (rects[:, 2] * rects[:, 3] > 0)
+    idx = np.flatnonzero(keep)
+    if idx.size == 0:
+        return (np.zeros((0, 4, 2), np.float32), np.zeros((0, 4), np.int64),
+                np.zeros((0, len(CANDIDATE_FEATURES))))
+
+    area = areas[idx]
+    rects = rects[idx]
+    x, y, w, h = rects.T
+    hull_area = np.array([cv.contourArea(cv.convexHull(cnts[i])) for i in idx])
+    min_rects = [cv.minAreaRect(cnts[i]) for i in idx]
+    boxes = np.stack([cv.boxPoints(r) for r in min_rects]).astype(np.float32)
+    rect_area = np.maximum([r[1][0] * r[1][1] for r in min_rects], 1.0)
+
+    extent = area / (w * h + 1e-6)
+    solidity = area / (hull_area + 1e-6)
+    rectangularity = area / rect_area
+    aspect = w / h.astype(np.float64)
+    dist = np.hypot(x + w / 2.0 - W / 2.0, y + h / 2.0 - H / 2.0)
+    center = np.clip(1.0 - dist / (math.hypot(W / 2.0, H / 2.0) + 1e-6), 0.0, 1.0)
+    fill = area / (W * H + 1e-6)
+
+    I = cv.integral((clean > 0).view(np.uint8))
+    v_lobes = _lobes(I, y, h, x, x + w, 0.12, axis=1)
+    h_lobes = _lobes(I, x, w, y, y + h, 0.12, axis=0)
+
+    feats = np.column_stack([area, fill, extent, solidity, rectangularity,
+                             aspect, center, v_lobes, h_lobes])
+    return boxes, rects, feats
+
+def score_features(feats):
+    """candidate_features matrisinden skor vektörü (tek geçişte)."""
+    f = dict(zip(CANDIDATE_FEATURES, feats.T))
+    lobes = np.maximum(f["v_lobes"], f["h_lobes"])
+    P = _SCORE_PARAMS[np.where(lobes >= 3, 0, np.where(lobes == 2, 1, 2))].T
+    rect_mu, rect_tol, ext_mu, ext_tol, ar_mu, ar_tol, w_rect, w_ext, w_sol, w_ctr, w_ar = P
+
+    def gauss(v, mu, tol):
+        z = (v - mu) / (tol + 1e-6)
+        return np.exp(-0.5 * z * z)
+
+    score = (w_rect * gauss(f["rectangularity"], rect_mu, rect_tol) +
+             w_ext  * gauss(f["extent"], ext_mu, ext_tol) +
+             w_sol  * np.clip(f["solidity"], 0.0, 1.0) +
+             w_ctr  * f["center"] +
+             w_ar   * gauss(f["aspect"], ar_mu, ar_tol))
+
+    fill = f["fill"]
+    score = np.where(fill < 0.10, score - (0.10 - fill) * 1.5, score)
+    score = np.where(fill > 0.95, score - (fill - 0.95) * 3.0, score)
+    return score
+
+def rank_candidates(cnts, clean, W, H, top_k=None):
+    """
+    Aday konturları skorlar, skora göre azalan sırada
+    [{"box", "score", "rect", "features"}] döner (top_k verilirse ilk k).
+    Eşit skorda önce gelen kontur önde.
+    """
+    boxes, rects, feats = candidate_features(cnts, clean, W, H)
+    if len(boxes) == 0:
+        return []
+    scores = score_features(feats)
+    order = np.argsort(-scores, kind="stable")
+    if top_k:
+        order = order[:top_k]
+    return [{"box": boxes[i],
+             "score": float(scores[i]),
+             "rect": [int(v) for v in rects[i]],
+             "features": {k: float(v) for k, v in zip(CANDIDATE_FEATURES, feats[i])}}
+            for i in order]
+
+def draw_candidates(overlay, cands):
+    for c in cands:
+        x, y = c["rect"][:2]
+        cv.polylines(overlay, [c["box"].astype(np.int32)], True, (0,255,0), 2)
+        cv.putText(overlay, f"{c['score']:.2f}", (x, max(0,y-5)),
+                   cv.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,255), 1, cv.LINE_AA)
 
-    g = cv.cvtColor(bgr, cv.COLOR_BGR2GRAY)
-    g = cv.createCLAHE(clipLimit=2.0, tileGridSize=(8,8)).apply(g)
+def find_question_box(page_crop_bgr, debug=True, src_scale=1.0, gray=None, top_k=3):
+    """
+    Page crop üzerinde aday konturları skorlar, en iyisini seçer.
+    {"best_box", "score", "candidates", "stages"} döner; aday yoksa
+    best_box None. candidates: rank_candidates'in ilk top_k sonucu.
+    src_scale, gray: page_crop_rect ile aynı anlamda.
+    """
+    stages = []
+    H, W = page_crop_bgr.shape[:2]
+    s = src_scale
+    k = max(3, round(W * s / 400))
+
+    if gray is not None:
+        g = gray
+    else:
+        with stage("clahe"):
+            g = gray_clahe(page_crop_bgr)
     if debug: stages.append(("Gray+CLAHE", g))
 
-    blk = auto_block_size(H, W)
-    thr = cv.adaptiveThreshold(g, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C,
-                               cv.THRESH_BINARY, blk, 10)
-    binv = 255 - thr
+    with stage("threshold"):
+        blk = max(3, _odd(_px(auto_block_size(H * s, W * s), s)))
+        binv = threshold_inv(g, blk, 10, "refine")
     if debug: stages.append(("Adaptive thr -> text white", binv))
 
-    num, lbl, stats, _ = cv.connectedComponentsWithStats(binv, 8)
-    clean = np.zeros_like(binv)
-    area_min = 0.00005 * W * H
-    for i in range(1, num):
-        if stats[i, cv.CC_STAT_AREA] >= area_min:
-            clean[lbl == i] = 255
+    with stage("components"):
+        clean = filter_components(binv, min_area=0.00005 * W * H)
     if debug: stages.append(("Small component removal", clean))
 
-    ker_h = cv.getStructuringElement(cv.MORPH_RECT, (10*k, 3))
-    ker_v = cv.getStructuringElement(cv.MORPH_RECT, (3, 35*k))
-    ker_c = cv.getStructuringElement(cv.MORPH_RECT, (5*k, 5*k))
-    merged = cv.dilate(clean, ker_h, 1)
-    merged = cv.dilate(merged, ker_v, 1)
-    merged = cv.morphologyEx(merged, cv.MORPH_CLOSE, ker_c, iterations=2)
+    with stage("morphology"):
+        merged = dilate_close(clean, [(_px(10*k, s), _px(3, s)), (_px(3, s), _px(35*k, s))],
+                              (_px(5*k, s), _px(5*k, s)), iterations=2)
     if debug: stages.append(("HV dilate + close", merged))
 
-    cnts, _ = cv.findContours(merged, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
+    with stage("contours"):
+        cnts, _ = cv.findContours(merged, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
     if not cnts:
-        return {"best_box": None, "warped_bgr": None,
-                "final_bw": None, "stages": stages}
-
-    best = None
-    best_score = -1.0
-    overlay = bgr.copy()
-
-    for c in cnts:
-        area = cv.contourArea(c)
-        if area < 0.01 * W * H:
-            continue
-        x,y,w,h = cv.boundingRect(c)
-        if w*h == 0: continue
-
-        extent = area / (w*h + 1e-6)
-        hull = cv.convexHull(c)
-        solidity = area / (cv.contourArea(hull) + 1e-6)
-        rect = cv.minAreaRect(c)
-        box = cv.boxPoints(rect).astype(np.float32)
-        rect_area = max(rect[1][0]*rect[1][1], 1.0)
-        rectangularity = area / rect_area
-        ar = w / float(h) if h>0 else 0.0
-
-        cx, cy = x + w/2.0, y + h/2.0
-        dist = math.hypot(cx - W/2.0, cy - H/2.0)
-        center_score = clamp01(1.0 - dist / (math.hypot(W/2.0, H/2.0) + 1e-6))
-
-        roi = clean[max(0,y):min(H,y+h), max(0,x):min(W,x+w)]
-        if roi.size == 0: continue
-        v_lobes = projection_lobes(roi, axis=1, thr_frac=0.12)
-        h_lobes = projection_lobes(roi, axis=0, thr_frac=0.12)
-
-        # Skor hesapları
-        if max(v_lobes, h_lobes) >= 3:
-            target_rect_mu, target_rect_tol = 0.70, 0.20
-            target_extent_mu, target_extent_tol = 0.65, 0.20
-            ar_pref_mu, ar_pref_tol = 1.0, 0.8
-            w_rect, w_ext, w_sol, w_ctr, w_ar = 0.30, 0.25, 0.20, 0.10, 0.15
-        elif max(v_lobes, h_lobes) == 2:
-            target_rect_mu, target_rect_tol = 0.80, 0.15
-            target_extent_mu, target_extent_tol = 0.72, 0.18
-            ar_pref_mu, ar_pref_tol = 1.0, 0.6
-            w_rect, w_ext, w_sol, w_ctr, w_ar = 0.35, 0.25, 0.20, 0.10, 0.10
-        else:
-            target_rect_mu, target_rect_tol = 0.92, 0.10
-            target_extent_mu, target_extent_tol = 0.85, 0.12
-            ar_pref_mu, ar_pref_tol = 1.0, 0.5
-            w_rect, w_ext, w_sol, w_ctr, w_ar = 0.45, 0.20, 0.20, 0.10, 0.05
-
-        rectangularity_score = gaussian_score(rectangularity, target_rect_mu, target_rect_tol)
-        extent_score        = gaussian_score(extent, target_extent_mu, target_extent_tol)
-        solidity_score      = clamp01(solidity)
-        ar_score            = gaussian_score(ar, ar_pref_mu, ar_pref_tol)
-
-        score = (w_rect * rectangularity_score +
-                 w_ext  * extent_score +
-                 w_sol  * solidity_score +
-                 w_ctr  * center_score +
-                 w_ar   * ar_score)
-
-        fill = area / (W*H + 1e-6)
-        if fill < 0.10: score -= (0.10 - fill) * 1.5
-        if fill > 0.95: score -= (fill - 0.95) * 3.0
-
-        if score > best_score:
-            best_score = score
-            best = (box, score)
-
-        cv.polylines(overlay, [box.astype(np.int32)], True, (0,255,0), 2)
-        cv.putText(overlay, f"{score:.2f}", (x, max(0,y-5)),
-                   cv.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,255), 1, cv.LINE_AA)
+        return {"best_box": None, "score": None, "candidates": [], "stages": stages}
+
+    with stage("scoring"):
+        # debug'da tüm adaylar çizilir; aksi halde yalnızca ilk top_k gerekir
+        cands = rank_candidates(cnts, clean, W, H, top_k=None if debug else top_k)
+    if debug:
+        overlay = (cv.cvtColor(page_crop_bgr, cv.COLOR_GRAY2BGR)
+                   if page_crop_bgr.ndim == 2 else page_crop_bgr.copy())
+        draw_candidates(overlay, cands)
+        stages.append(("Candidates overlay", overlay))
+        cands = cands[:top_k] if top_k else cands
+
+    if not cands:
+        return {"best_box": None, "score": None, "candidates": [], "stages": stages}
+    return {"best_box": cands[0]["box"], "score": cands[0]["score"],
+            "candidates": cands, "stages": stages}
+
+def binarize_warped(warped, invert_to_black_text=True):
+    with stage("binarize"):
+        wg = cv.cvtColor(warped, cv.COLOR_BGR2GRAY) if warped.ndim == 3 else warped
+        blk_w = auto_block_size(*wg.shape)
+        bw = threshold_inv(wg, blk_w, 8, "final")
+        if invert_to_black_text:
+            bw = 255 - bw
+    return bw
+
+def select_questions(cands, min_score=0.6, nms_iou=0.3, max_questions=None):
+    """
+    Çoklu soru modu: skoru min_score üstündeki adaylar (en iyisi her zaman
+    dahil), örtüşen kutularda NMS (IoU > nms_iou olan düşük skorlu atılır).
+    Seçilenler okuma sırasında (yukarıdan aşağı, soldan sağa) döner;
+    "rank" skor sırasıdır (0: en iyi aday, tekli moddaki best_box).
+    """
+    keep = []
+    for c in cands:  # cands skora göre azalan
+        if keep and c["score"] < min_score:
+            break
+        hull = cv.convexHull(c["box"])
+        area = cv.contourArea(hull)
+        suppressed = False
+        for k in keep:
+            inter, _ = cv.intersectConvexConvex(hull, k["hull"])
+            union = area + k["area"] - inter
+            if union > 0 and inter / union > nms_iou:
+                suppressed = True
+                break
+        if not suppressed:
+            keep.append({**c, "hull": hull, "area": area})
+            if max_questions and len(keep) >= max_questions:
+                break
+    for rank, c in enumerate(keep):
+        c["rank"] = rank
+    keep.sort(key=lambda c: (c["rect"][1], c["rect"][0]))
+    return [{k: v for k, v in c.items() if k not in ("hull", "area")} for c in keep]
+
+def warp_questions(page_crop, boxes, invert_to_black_text=True, debug=False, stages=None):
+    """Her kutuyu warp + binarize eder; [(warped, bw)] döner."""
+    out = []
+    for i, box in enumerate(boxes, 1):
+        warped = perspective_warp(page_crop, box)
+        bw = binarize_warped(warped, invert_to_black_text)
+        if debug and stages is not None:
+            stages.append((f"Question {i} BW", bw))
+        out.append((warped, bw))
+    return out
+
+def _multi_result(picks, boxes, page_crop, invert_to_black_text, debug, stages):
+    # Çoklu mod dönüşü: en yüksek skorlu soru (tekli moddaki seçim)
+    # best_box/final_bw olarak da verilir, "top" questions'taki sırası;
+    # okuma sırası yalnızca questions'ta
+    warped = warp_questions(page_crop, boxes, invert_to_black_text, debug, stages)
+    questions = [{"best_box": b, "score": c["score"], "warped_bgr": w, "final_bw": bw}
+                 for c, b, (w, bw) in zip(picks, boxes, warped)]
+    top = min(range(len(picks)), key=lambda i: picks[i]["rank"])
+    return {"best_box": questions[top]["best_box"],
+            "warped_bgr": questions[top]["warped_bgr"],
+            "final_bw": questions[top]["final_bw"],
+            "top": top,
+            "questions": questions}
 
-    if debug: stages.append(("Candidates overlay", overlay))
-
-    if best is None:
+def refine_question_from_pagecrop(page_crop_bgr,
+                                  invert_to_black_text=True,
+                                  debug=True, multi=None):
+    """
+    multi: None ya da select_questions argümanları (dict); verilirse
+    eşiği geçen tüm sorular aynı eşik/morfoloji/kontur sonucundan
+    çıkarılır ve "questions" altında döner.
+    """
+    found = find_question_box(page_crop_bgr, debug=debug,
+                              top_k=None if multi is not None else 3)
+    stages = found["stages"]
+    best_box = found["best_box"]
+    if best_box is None:
         return {"best_box": None, "warped_bgr": None,
                 "final_bw": None, "stages": stages}
 
-    best_box, _ = best
-    warped = perspective_warp(bgr, best_box)
+    if multi is not None:
+        picks = select_questions(found["candidates"], **multi)
+        out = _multi_result(picks, [c["box"] for c in picks], page_crop_bgr,
+                            invert_to_black_text, debug, stages)
+        return {**out, "candidates": found["candidates"], "stages": stages}
+
+    warped = perspective_warp(page_crop_bgr, best_box)
     if debug: stages.append(("Warped (perspective rectified)", warped))
 
-    wg = cv.cvtColor(warped, cv.COLOR_BGR2GRAY)
-    blk_w = auto_block_size(*wg.shape)
-    bw = cv.adaptiveThreshold(wg, 255, cv.ADAPTIVE_THRESH_GAUSSIAN_C,
-                              cv.THRESH_BINARY_INV, blk_w, 8)
-    if invert_to_black_text:
-        bw = 255 - bw
+    bw = binarize_warped(warped, invert_to_black_text)
     if debug: stages.append(("Final BW", bw))
 
     return {"best_box": best_box,
             "warped_bgr": warped,
             "final_bw": bw,
+            "candidates": found["candidates"],
             "stages": stages}
+
+# ---------- ORTAK HAT ----------
+class QuestionPipeline:
+    """
+    Tek kare için page crop + refine; ortak ara sonuçlar bir kez hesaplanır.
+    Gri dönüşüm ve Gray+CLAHE tam karede üretilir, refine bunların page
+    crop ROI görünümleri üzerinde çalışır (kırpım kopyası, ikinci cvtColor
+    yok). Kırpım boyutuna bağlı olanlar (blok boyutu, kernel, bileşen
+    eşikleri) find_question_box içinde yeniden hesaplanır.
+
+    shared_clahe: CLAHE döşeme ızgarası görüntü boyutuna bağlı olduğundan
+    varsayılan olarak refine CLAHE'yi kırpımın gri ROI'sine yeniden uygular
+    (ayrı page crop + refine çağrılarıyla birebir aynı çıktı). True ise tam
+    kare CLAHE'nin ROI'si kullanılır (önizleme tespiti; golden'dan sapar).
+    src_scale: img küçültülmüş bir önizleme ise kaynak/önizleme oranı
+    (bkz. page_crop_rect).
+    """
+
+    def __init__(self, img, debug=False, src_scale=1.0, shared_clahe=False):
+        self.img = img
+        self.debug = debug
+        self.src_scale = src_scale
+        self.shared_clahe = shared_clahe
+        self.stages = []
+        self._gray = None
+        self._clahe = None
+        self._rect = None
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = (cv.cvtColor(self.img, cv.COLOR_BGR2GRAY)
+                          if self.img.ndim == 3 else self.img)
+        return self._gray
+
+    @property
+    def clahe(self):
+        """Tam kare Gray+CLAHE."""
+        if self._clahe is None:
+            with stage("clahe"):
+                self._clahe = gray_clahe(self.gray)
+        return self._clahe
+
+    def page_rect(self):
+        """Sayfa bölgesi (x, y, w, h); bulunamazsa tam kare."""
+        if self._rect is None:
+            rect, images = page_crop_rect(self.img, debug=self.debug,
+                                          src_scale=self.src_scale, gray=self.clahe)
+            self.stages += images
+            self._rect = rect if rect is not None else (0, 0, self.img.shape[1], self.img.shape[0])
+        return self._rect
+
+    def roi(self, a):
+        x, y, w, h = self.page_rect()
+        return a[y:y + h, x:x + w]
+
+    def find(self, top_k=3):
+        """Page crop ROI'sinde find_question_box."""
+        if self.shared_clahe:
+            g = self.roi(self.clahe)
+        else:
+            with stage("clahe"):
+                g = gray_clahe(self.roi(self.gray))
+        found = find_question_box(self.roi(self.img), debug=self.debug,
+                                  src_scale=self.src_scale, gray=g, top_k=top_k)
+        self.stages += found["stages"]
+        return found
+
+    def refine(self, invert_to_black_text=True, multi=None):
+        """
+        refine_question_from_pagecrop ile aynı dönüş, ek olarak page_rect
+        (kaynak koordinatında). Warp img'nin kendisinde (renkli ya da gri).
+        """
+        found = self.find(top_k=None if multi is not None else 3)
+        if found["best_box"] is None:
+            return {"best_box": None, "warped_bgr": None, "final_bw": None,
+                    "page_rect": None, "stages": self.stages}
+        page_crop = self.roi(self.img)
+        page_rect = [int(v) for v in self.page_rect()]
+
+        if multi is not None:
+            picks = select_questions(found["candidates"], **multi)
+            out = _multi_result(picks, [c["box"] for c in picks], page_crop,
+                                invert_to_black_text, self.debug, self.stages)
+            return {**out, "page_rect": page_rect,
+                    "candidates": found["candidates"], "stages": self.stages}
+
+        warped = perspective_warp(page_crop, found["best_box"])
+        if self.debug: self.stages.append(("Warped (perspective rectified)", warped))
+        bw = binarize_warped(warped, invert_to_black_text)
+        if self.debug: self.stages.append(("Final BW", bw))
+
+        return {"best_box": found["best_box"],
+                "warped_bgr": warped,
+                "final_bw": bw,
+                "page_rect": page_rect,
+                "candidates": found["candidates"],
+                "stages": self.stages}
+
+# ---------- GRAY PIPELINE ----------
+def refine_question_gray(gray, invert_to_black_text=True, debug=False, multi=None):
+    """
+    Tek kanallı hat: gri dönüşüm yok, CLAHE renkli hattaki gibi page crop
+    için tam karede, refine için kırpımda uygulanır; warp gri görüntüde.
+    Dönüş refine_question_from_pagecrop ile aynı; ek olarak page_rect.
+    multi: refine_question_from_pagecrop ile aynı.
+    """
+    return QuestionPipeline(gray, debug=debug).refine(invert_to_black_text, multi)
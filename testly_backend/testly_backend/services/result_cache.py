@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .storage import rel_name
+
+# Hat çıktısını etkileyen bir değişiklikte artırılır: eski kayıtlar eşleşmez
+CACHE_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key         TEXT PRIMARY KEY,
+    upload_name TEXT NOT NULL,
+    output_name TEXT NOT NULL,
+    meta        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created     REAL NOT NULL,
+    last_hit    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_hit ON results(last_hit);
+CREATE TABLE IF NOT EXISTS counters (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def upload_hash(data: bytes) -> str:
+    """Yüklenen baytların sha256'sı (hex)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(digest: str, params: Dict[str, Any]) -> str:
+    """upload_hash ve hat parametrelerinden anahtar (baytlar yeniden özetlenmez)."""
+    h = hashlib.sha256(digest.encode())
+    h.update(json.dumps({"v": CACHE_VERSION, **params}, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    İçerik adresli sonuç önbelleği. İndeks diskte (SQLite) tutulur, yeniden
+    başlatmalarda ve worker'lar arasında paylaşılır.
+
+    Tahliye: max_age saniyeden eski kayıtlar ve toplam çıktı boyutu
+    max_bytes'ı aşarsa en uzun süredir kullanılmayanlar indeksten silinir.
+    Çıktı dosyalarına dokunulmaz (daha önce verilen URL'ler geçerli kalır);
+    dosyaları saklama politikası siler (storage.Retention), dosyası
+    silinmiş kayıt ilk erişimde düşer. Kayıt ancak başvurduğu tüm dosyalar
+    (çıktı, multi'de her soru, upload_dir verilirse saklanan yükleme)
+    duruyorsa döner.
+    """
+
+    def __init__(self, path, output_dir, max_age: float = 7 * 24 * 3600,
+                 max_bytes: int = 2 * 1024 ** 3, upload_dir=None):
+        self.path = str(path)
+        self.output_dir = Path(output_dir)
+        self.upload_dir = Path(upload_dir) if upload_dir else None
+        self.max_age = float(max_age)
+        self.max_bytes = int(max_bytes)
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as db:
+            db.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # Bağlantı fork'ta devralınmaz (pre-fork sunucu): süreç değiştiyse yenisi
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _count(self, db, name: str, n: int = 1):
+        db.execute("INSERT INTO counters(name, value) VALUES(?, ?) "
+                   "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                   (name, n))
+
+    def _files_exist(self, upload_name: str, output_name: str, meta: Dict[str, Any]) -> bool:
+        files = [self.output_dir / output_name]
+        files += [self.output_dir / q["output"] for q in meta.get("questions", ())]
+        if upload_name and self.upload_dir is not None:
+            files.append(self.upload_dir / upload_name)
+        return all(f.exists() for f in files)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Kayıt varsa {"upload_name", "output_name", "meta"}; yoksa None."""
+        now = time.time()
+        with self._conn() as db:
+            row = db.execute("SELECT upload_name, output_name, meta, created "
+                             "FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                upload_name, output_name, meta, created = row
+                meta = json.loads(meta)
+                if now - created <= self.max_age and \
+                        self._files_exist(upload_name, output_name, meta):
+                    db.execute("UPDATE results SET last_hit = ? WHERE key = ?", (now, key))
+                    self._count(db, "hits")
+                    return {"upload_name": upload_name, "output_name": output_name,
+                            "meta": meta}
+                # Süresi dolmuş ya da dosyalarından biri silinmiş
+                db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._count(db, "evictions")
+            self._count(db, "misses")
+        return None
+
+    def put(self, key: str, upload_name: str, output_path: str, meta: Dict[str, Any]):
+        now = time.time()
+        out = Path(output_path)
+        # Çoklu soru: output_path questions'tan biri, tüm çıktılar sayılır
+        files = [self.output_dir / q["output"] for q in meta["questions"]] \
+            if "questions" in meta else [out]
+        size = sum(f.stat().st_size for f in files if f.exists())
+        with self._conn() as db:
+            db.execute("INSERT OR REPLACE INTO results"
+                       "(key, upload_name, output_name, meta, size, created, last_hit) "
+                       "VALUES(?, ?, ?, ?, ?, ?, ?)",
+                       (key, upload_name, rel_name(self.output_dir, out), json.dumps(meta),
+                        size, now, now))
+            self._evict(db, now)
+
+    def _evict(self, db, now: float):
+        n = db.execute("DELETE FROM results WHERE created < ?",
+                       (now - self.max_age,)).rowcount
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total > self.max_bytes:
+            drop = []
+            for key, size in db.execute("SELECT key, size FROM results ORDER BY last_hit"):
+                if total <= self.max_bytes:
+                    break
+                drop.append((key,))
+                total -= size
+            db.executemany("DELETE FROM results WHERE key = ?", drop)
+            n += len(drop)
+        if n:
+            self._count(db, "evictions", n)
+
+    def stats(self) -> Dict[str, int]:
+        db = self._conn()
+        out = {"hits": 0, "misses": 0, "evictions": 0}
+        out.update(dict(db.execute("SELECT name, value FROM counters")))
+        entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        out["entries"] = entries
+        out["bytes"] = size
+        return out
@@ -0,0 +1,202 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, create_engine, delete, event, insert, select
+
+from ..models import metadata
+from ..models.question import questions
+
+log = logging.getLogger(__name__)
+
+
+def question_rows(meta: Dict[str, Any], upload_hash: str, upload_name: str,
+                  output_path: str, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Başarılı bir hat sonucundan (meta) indeks satırları: tek soru bir satır,
+    multi'de meta["questions"] başına bir satır. output_path outputs/ altında göreli.
+    Tek soruda skor meta["score"], yoksa (eski önbellek kaydı) en iyi aday.
+    """
+    base = {"created_at": datetime.now(timezone.utc),
+            "owner": owner, "upload_hash": upload_hash, "upload_name": upload_name or None,
+            "format": meta.get("format", "png"), "timings": meta.get("timings")}
+    if "questions" in meta:
+        return [{**base, "output_path": q["output"], "question_index": i,
+                 "best_box": q["best_box"], "score": q["score"],
+                 "width": q["width"], "height": q["height"]}
+                for i, q in enumerate(meta["questions"], 1)]
+    score = meta.get("score")
+    if score is None and meta.get("candidates"):
+        score = meta["candidates"][0]["score"]
+    return [{**base, "output_path": output_path, "question_index": 0,
+             "best_box": meta.get("best_box"), "score": score,
+             "width": meta["width"], "height": meta["height"]}]
+
+
+class ResultsIndex:
+    """
+    İşlenmiş soruların kalıcı indeksi (SQLAlchemy; SQLite ya da Postgres).
+
+    Yazımlar istek yolunda yapılmaz: record() satırları bellek kuyruğuna
+    ekler, arka plan thread'i en fazla batch_size satırı ya da
+    flush_interval saniyede birikeni tek transaction'da executemany ile
+    yazar. Kuyruk max_pending'i aşarsa satır düşürülür (sayılır).
+    Bağlantılar engine havuzundan; pre-fork sunucuda fork sonrası ilk
+    kullanımda havuz ve yazıcı thread süreç başına yeniden kurulur.
+    output_dir verilirse çıktı dosyası silinmiş (saklama politikası) satırlar
+    listede gösterilmez ve ilk listelemede silinir.
+    """
+
+    def __init__(self, url: str, output_dir=None, pool_size: int = 5, batch_size: int = 100,
+                 flush_interval: float = 1.0, max_pending: int = 10000):
+        self.url = url
+        self.output_dir = Path(output_dir) if output_dir else None
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = float(flush_interval)
+        self.max_pending = max(1, int(max_pending))
+        kw: Dict[str, Any] = {"pool_pre_ping": True}
+        if url.startswith("sqlite"):
+            kw["connect_args"] = {"check_same_thread": False, "timeout": 5.0}
+        else:
+            kw.update(pool_size=int(pool_size), max_overflow=int(pool_size))
+        self.engine = create_engine(url, **kw)
+        if url.startswith("sqlite"):
+            event.listen(self.engine, "connect", _sqlite_pragmas)
+        metadata.create_all(self.engine)
+        self._counts = {"written": 0, "dropped": 0, "failed": 0}
+        self._lock = threading.Lock()
+        self._engine_pid = os.getpid()
+        self._pid = None  # yazıcı thread'in süreci
+        self._queue: "queue.Queue" = queue.Queue()
+        atexit.register(self.flush)
+
+    def _check_fork(self):
+        # Fork'ta devralınan havuz bağlantıları kullanılmaz (üst süreç kapatmaz)
+        if self._engine_pid != os.getpid():
+            with self._lock:
+                if self._engine_pid != os.getpid():
+                    self.engine.dispose(close=False)
+                    self._engine_pid = os.getpid()
+
+    def _ensure_writer(self):
+        self._check_fork()
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            threading.Thread(target=self._loop, args=(self._queue,),
+                             name="testly-index", daemon=True).start()
+            self._pid = os.getpid()
+
+    def record(self, rows: List[Dict[str, Any]], dedupe: bool = False):
+        """
+        Satırları yazım kuyruğuna ekler (bloklamaz). dedupe: aynı sahip için
+        aynı output_path'li satır zaten varsa yazılmaz (önbellekten dönen sonuç).
+        """
+        if not rows:
+            return
+        self._ensure_writer()
+        if self._queue.qsize() + len(rows) > self.max_pending:
+            with self._lock:
+                self._counts["dropped"] += len(rows)
+            return
+        for r in rows:
+            self._queue.put((r, dedupe))
+
+    def _drain(self, q: "queue.Queue") -> List[Tuple[Dict[str, Any], bool]]:
+        # İlk satırı bekle, sonra flush_interval boyunca batch_size'a kadar topla
+        batch = [q.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                batch.append(q.get(timeout=left))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Tuple[Dict[str, Any], bool]]):
+        q = questions.c
+        rows, seen = [], set()
+        try:
+            with self.engine.begin() as conn:
+                for r, dedupe in batch:
+                    k = (r["owner"], r["output_path"])
+                    if dedupe and (k in seen or conn.execute(
+                            select(q.id).where(and_(q.owner == r["owner"],
+                                                    q.output_path == r["output_path"]))
+                            .limit(1)).first() is not None):
+                        continue
+                    seen.add(k)
+                    rows.append(r)
+                if rows:
+                    conn.execute(insert(questions), rows)
+        except Exception:
+            log.exception("results index write failed (%d rows)", len(batch))
+            with self._lock:
+                self._counts["failed"] += len(batch)
+            return
+        with self._lock:
+            self._counts["written"] += len(rows)
+
+    def _loop(self, q: "queue.Queue"):
+        while True:
+            batch = self._drain(q)
+            self._write(batch)
+            for _ in batch:
+                q.task_done()
+
+    def flush(self):
+        """Kuyruktaki tüm satırlar yazılana kadar bekler."""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def list(self, owner: str, limit: int = 20,
+             before: Optional[int] = None) -> Dict[str, Any]:
+        """
+        owner'ın soruları, yeniden eskiye; before: önceki sayfanın
+        next_cursor'ı (id). {"items", "next_cursor"} döner; dosyası silinmiş
+        satırlar atlandığından sayfa limit'ten kısa olabilir.
+        """
+        q = questions.c
+        stmt = select(questions).where(q.owner == owner)
+        if before is not None:
+            stmt = stmt.where(q.id < before)
+        stmt = stmt.order_by(q.id.desc()).limit(limit + 1)
+        self._check_fork()
+        with self.engine.connect() as conn:
+            rows = [dict(r._mapping) for r in conn.execute(stmt)]
+        more = len(rows) > limit
+        rows = rows[:limit]
+        nxt = rows[-1]["id"] if more else None
+        if self.output_dir is not None:
+            gone = [r["id"] for r in rows if not (self.output_dir / r["output_path"]).exists()]
+            if gone:
+                with self.engine.begin() as conn:
+                    conn.execute(delete(questions).where(q.id.in_(gone)))
+                rows = [r for r in rows if r["id"] not in gone]
+        return {"items": rows, "next_cursor": nxt}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._counts)
+        out["pending"] = self._queue.qsize() if self._pid == os.getpid() else 0
+        return out
+
+
+def _sqlite_pragmas(dbapi_conn, _record):
+    # Çok süreçli okuma/yazma: WAL; yazım sırası zaten tek thread
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.close()
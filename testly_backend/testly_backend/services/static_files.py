@@ -0,0 +1,78 @@
+import hashlib
+import mimetypes
+import os
+import stat
+import threading
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import quote
+
+from flask import Response, abort, request, send_file
+from werkzeug.security import safe_join
+
+# İçerik özeti önbelleği: (yol, mtime_ns, boyut) -> etag. Dosya adları
+# benzersiz ve içerik değişmez; özet dosya başına bir kez hesaplanır.
+_ETAG_CACHE_SIZE = 4096
+_CHUNK = 1024 * 1024
+_etags: "OrderedDict[tuple, str]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def content_etag(path: str, st: os.stat_result) -> str:
+    """Dosya içeriğinin sha256'sından (ilk 32 hane) güçlü ETag değeri."""
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _lock:
+        etag = _etags.get(key)
+        if etag is not None:
+            _etags.move_to_end(key)
+            return etag
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_CHUNK), b""):
+            h.update(chunk)
+    etag = h.hexdigest()[:32]
+    with _lock:
+        _etags[key] = etag
+        while len(_etags) > _ETAG_CACHE_SIZE:
+            _etags.popitem(last=False)
+    return etag
+
+
+def serve_immutable(directory, filename: str, max_age: int = 31536000,
+                    accel_prefix: Optional[str] = None) -> Response:
+    """
+    Değişmez (benzersiz adlı) dosyayı uzun ömürlü önbellek başlıklarıyla sunar:
+    Cache-Control: public, max-age, immutable + içerik özetli güçlü ETag,
+    If-None-Match eşleşirse 304 (gövde okunmaz).
+
+    accel_prefix verilirse gövde nginx'e bırakılır (X-Accel-Redirect:
+    <accel_prefix>/<filename>, filename URL-kodlu; internal location). X-Sendfile için Flask'ın
+    USE_X_SENDFILE ayarı send_file tarafından uygulanır.
+    """
+    path = safe_join(str(directory), filename)
+    if path is None:
+        abort(404)
+    try:
+        st = os.stat(path)
+    except OSError:
+        abort(404)
+    if not stat.S_ISREG(st.st_mode):
+        abort(404)
+    etag = content_etag(path, st)
+
+    if accel_prefix:
+        rv = Response(status=200, mimetype=mimetypes.guess_type(filename)[0]
+                      or "application/octet-stream")
+        rv.headers["X-Accel-Redirect"] = f"{accel_prefix.rstrip('/')}/{quote(filename)}"
+        rv.set_etag(etag)
+        rv.last_modified = st.st_mtime
+        rv.cache_control.public = True
+        rv.cache_control.max_age = max_age
+        rv.cache_control.immutable = True
+        # 304 dalı burada; nginx yalnızca 200'de dosyayı gönderir
+        return rv.make_conditional(request)
+
+    rv = send_file(path, etag=etag, max_age=max_age, conditional=True,
+                   last_modified=st.st_mtime)
+    rv.cache_control.immutable = True
+    return rv
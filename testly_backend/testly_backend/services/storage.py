@@ -0,0 +1,239 @@
+import atexit
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+log = logging.getLogger(__name__)
+
+# Disk yazımları istek yolundan çıkarılır (orijinal yüklemenin saklanması gibi)
+_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="testly-io")
+atexit.register(_writer.shutdown, wait=True)
+
+# uploads/ ve outputs/ altında ad özetinden iki seviye alt dizin (ab/cd/<ad>):
+# 65536 dizin, her birinde az sayıda dosya
+SHARD_DEPTH = 2
+TMP_SUFFIX = ".tmp"
+
+
+def shard_name(name: str) -> str:
+    """Dosya adı -> kök altındaki göreli yol ("ab/cd/<ad>"), addan türetilir."""
+    h = hashlib.sha1(name.encode("utf-8")).hexdigest()
+    return "/".join([h[2 * i:2 * i + 2] for i in range(SHARD_DEPTH)] + [name])
+
+
+def rel_name(root: Union[str, Path], path: Union[str, Path]) -> str:
+    """Kök altındaki dosyanın URL'de kullanılan göreli adı (/ ayraçlı); zaten göreliyse aynen."""
+    p = Path(path)
+    try:
+        return p.relative_to(root).as_posix()
+    except ValueError:
+        return p.as_posix()
+
+
+def _tmp_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}{TMP_SUFFIX}")
+
+
+def atomic_write(path: Union[str, Path], data: bytes, overwrite: bool = True) -> bool:
+    """
+    Geçici dosyaya yazıp yeniden adlandırır: okuyucu yarım dosya görmez.
+    overwrite=False: hedef varsa dokunulmaz, False döner (hard link ile,
+    var mı diye ayrı kontrol yok).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(path)
+    try:
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        if overwrite:
+            os.replace(tmp, path)
+            return True
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            return False
+        return True
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def write_new(root: Union[str, Path], name: str, data: bytes, shard: bool = True) -> Path:
+    """
+    root altında shard_name(name) yoluna (shard=False: root/name) atomik
+    yazar ve yolu döner. Ad alınmışsa (aynı stem'li iki girdi) kısa rastgele
+    ek alır; ad yoklanmaz.
+    """
+    place = shard_name if shard else (lambda n: n)
+    path = Path(root) / place(name)
+    if atomic_write(path, data, overwrite=False):
+        return path
+    stem, ext = os.path.splitext(name)
+    path = Path(root) / place(f"{stem}_{uuid.uuid4().hex[:8]}{ext}")
+    atomic_write(path, data)
+    return path
+
+
+def write_bytes(path: Union[str, Path], data: bytes) -> bool:
+    try:
+        return atomic_write(path, data)
+    except OSError:
+        log.exception("write failed: %s", path)
+        return False
+
+
+def write_bytes_async(path: Union[str, Path], data: bytes) -> Future:
+    """Arka planda yazar; data yazım bitene kadar değiştirilmemeli."""
+    return _writer.submit(write_bytes, path, data)
+
+
+def _scan(root: str):
+    # (yol, boyut, mtime, son kullanım) ; alt dizinler dahil
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            it = os.scandir(d)
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.is_file(follow_symlinks=False):
+                        st = e.stat(follow_symlinks=False)
+                        yield e.path, e.name, st.st_size, st.st_mtime, max(st.st_atime, st.st_mtime)
+                except OSError:
+                    continue
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.unlink(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def sweep(root: Union[str, Path], max_age: float = 0, max_bytes: int = 0,
+          now: Optional[float] = None, tmp_age: float = 3600.0) -> Dict[str, int]:
+    """
+    Tek dizin için saklama politikası:
+      - max_age > 0: mtime'ı daha eski dosyalar silinir
+      - max_bytes > 0: toplam aşılırsa en uzun süredir kullanılmayanlar
+        (atime; relatime/noatime bağlamalarda mtime'a düşer) silinir
+      - tmp_age'den eski yarım kalmış geçici dosyalar silinir
+    {"files", "bytes", "deleted", "freed"} döner (silme sonrası durum).
+    """
+    now = time.time() if now is None else now
+    keep, deleted, freed = [], 0, 0
+    for path, name, size, mtime, used in _scan(str(root)):
+        stale_tmp = name.startswith(".") and name.endswith(TMP_SUFFIX) and now - mtime > tmp_age
+        if stale_tmp or (max_age > 0 and now - mtime > max_age):
+            if _remove(path):
+                deleted += 1
+                freed += size
+        elif not name.startswith("."):
+            keep.append((used, size, path))
+    total = sum(size for _, size, _ in keep)
+    if max_bytes > 0 and total > max_bytes:
+        keep.sort()  # en eski kullanım önde
+        i = 0
+        while i < len(keep) and total > max_bytes:
+            _, size, path = keep[i]
+            if _remove(path):
+                deleted += 1
+                freed += size
+            total -= size
+            i += 1
+        keep = keep[i:]
+    return {"files": len(keep), "bytes": total, "deleted": deleted, "freed": freed}
+
+
+class Retention:
+    """
+    uploads/ ve outputs/ için arka planda periyodik sweep.
+    areas: ad -> {"root", "max_age", "max_bytes"} (0 = sınırsız).
+    Aynı depolamayı paylaşan süreçlerden (gunicorn worker'ları) yalnızca
+    kilit dosyasını alan sweep yapar; sonuç stats_path'e yazılır, stats()
+    oradan okur (sweep yapmayan süreçler de raporlar). interval 0 ise thread
+    başlatılmaz (run_once elle çağrılabilir). Thread fork'ta devralınmaz:
+    pre-fork sunucuda start() worker'da (post_fork) çağrılır.
+    """
+
+    def __init__(self, areas: Dict[str, Dict[str, Any]], interval: float = 600.0,
+                 lock_path: Optional[Union[str, Path]] = None,
+                 stats_path: Optional[Union[str, Path]] = None):
+        self.areas = areas
+        self.interval = float(interval)
+        self.lock_path = str(lock_path) if lock_path else None
+        self.stats_path = str(stats_path) if stats_path else None
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    def run_once(self) -> Optional[Dict[str, Dict[str, int]]]:
+        """Tüm alanları tarar; başka bir süreç tarıyorsa None."""
+        fh = None
+        if self.lock_path:
+            fh = open(self.lock_path, "a")
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fh.close()
+                return None
+        try:
+            now = time.time()
+            out = {name: sweep(a["root"], a.get("max_age", 0), a.get("max_bytes", 0), now)
+                   for name, a in self.areas.items()}
+        finally:
+            if fh is not None:
+                fh.close()
+        with self._lock:
+            self._stats = out
+        if self.stats_path:
+            atomic_write(self.stats_path, json.dumps(out).encode())
+        for name, s in out.items():
+            if s["deleted"]:
+                log.info("retention %s: deleted %d files (%d bytes)", name, s["deleted"], s["freed"])
+        return out
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("retention sweep failed")
+
+    def start(self):
+        # Süreç başına bir thread (fork'tan önce başlatılan çocukta yoktur)
+        if self.interval > 0 and (self._thread is None or self._pid != os.getpid()):
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name="testly-retention", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Son sweep sonrası alan başına {"files", "bytes", "deleted", "freed"}."""
+        if self.stats_path:
+            try:
+                with open(self.stats_path, "rb") as fh:
+                    return json.load(fh)
+            except (OSError, ValueError):
+                pass
+        with self._lock:
+            return {k: dict(v) for k, v in self._stats.items()}
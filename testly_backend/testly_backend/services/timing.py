@@ -0,0 +1,49 @@
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# Etkin zamanlama sözlüğü (yoksa stage() hiçbir şey ölçmez)
+_current: ContextVar[Optional[Dict[str, float]]] = ContextVar("testly_timings", default=None)
+
+
+class stage:
+    """
+    with stage("clahe"): ...
+    collect() içindeyse süreyi (ms) aynı ada ekler; değilse maliyeti
+    bir ContextVar okumasından ibarettir.
+    """
+    __slots__ = ("name", "timings", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.timings = _current.get()
+
+    def __enter__(self):
+        if self.timings is not None:
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timings is not None:
+            ms = (time.perf_counter() - self.t0) * 1000.0
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + ms
+        return False
+
+
+class collect:
+    """with collect() as timings: ... -> {aşama: ms}"""
+    __slots__ = ("timings", "token")
+
+    def __init__(self, enabled: bool = True):
+        self.timings = {} if enabled else None
+        self.token = None
+
+    def __enter__(self):
+        if self.timings is not None:
+            self.token = _current.set(self.timings)
+        return self.timings
+
+    def __exit__(self, *exc):
+        if self.token is not None:
+            _current.reset(self.token)
+        return False
@@ -0,0 +1,250 @@
+import fcntl
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import cv2 as cv
+import numpy as np
+
+from .processing import ImageTooLarge, decode_preview
+from .refined_question_pipeline import QuestionPipeline, find_question_box, gray_clahe, order_quad
+from .storage import atomic_write
+from .timing import stage
+
+_SID = re.compile(r"[0-9a-f]{32}")
+# Keskinlik bu boyutta kare yamada ölçülür
+SHARPNESS_PATCH = 256
+
+
+def _quad_iou(a, b) -> float:
+    a = cv.convexHull(np.float32(a)); b = cv.convexHull(np.float32(b))
+    inter, _ = cv.intersectConvexConvex(a, b)
+    union = cv.contourArea(a) + cv.contourArea(b) - inter
+    return float(inter / union) if union > 0 else 0.0
+
+
+def _bounds(quad, margin, W, H):
+    x0, y0 = quad.min(0); x1, y1 = quad.max(0)
+    mx, my = margin * (x1 - x0), margin * (y1 - y0)
+    return (max(0, int(x0 - mx)), max(0, int(y0 - my)),
+            min(W, int(np.ceil(x1 + mx))), min(H, int(np.ceil(y1 + my))))
+
+
+def sharpness(gray, quad) -> float:
+    """
+    quad içinin SHARPNESS_PATCH kare yamaya warp'ında Laplace varyansı; quad'ın
+    karedeki boyutundan bağımsız, kareler arasında karşılaştırılabilir.
+    """
+    q = order_quad(quad)
+    if cv.contourArea(q[[0, 1, 3, 2]]) < 1.0:
+        return 0.0
+    n = SHARPNESS_PATCH - 1
+    M = cv.getPerspectiveTransform(q, np.float32([[0, 0], [n, 0], [0, n], [n, n]]))
+    with stage("sharpness"):
+        patch = cv.warpPerspective(gray, M, (SHARPNESS_PATCH, SHARPNESS_PATCH),
+                                   flags=cv.INTER_LINEAR, borderMode=cv.BORDER_REPLICATE)
+        return float(cv.Laplacian(patch, cv.CV_16S).var())
+
+
+class Tracker:
+    """
+    Ardışık önizleme kareleri için oturumlu soru takibi.
+
+    Her karede önceki (yumuşatılmış) quad'ın margin kadar genişletilmiş
+    çevresinde find_question_box çalışır; skor min_score altına düşerse,
+    bulunan kutu öncekiyle IoU 0.5 altında kalırsa ya da henüz quad yoksa
+    tam tespite (page crop + aday skorlama) dönülür.
+    Quad üstel ortalamayla yumuşatılır (smoothing = yeni karenin ağırlığı;
+    IoU 0.5 altındaki sıçramada sıfırlanır). En keskin karenin baytları ve
+    quad'ı saklanır; önizleme quad'ı yalnızca kare seçimi içindir, çıktı o
+    karede tam çözünürlüklü tespitle üretilir (bkz. api/v1 track_finish).
+
+    Durum root dizininde tutulur, worker'lar arasında paylaşılır: <id>.json
+    (quad, skor, en iyi karenin bilgisi), <id>.frame (en keskin karenin
+    baytları) ve <id>.lock (flock; bir oturumun kareleri hangi worker'a
+    gelirse gelsin sırayla işlenir). max_frame_bytes üstü kare ImageTooLarge.
+    Oturumlar ttl saniye kullanılmazsa silinir; max_sessions aşılırsa en
+    uzun süredir kullanılmayan düşer.
+    """
+
+    def __init__(self, root, long_edge: int = 640, ttl: float = 60.0, max_sessions: int = 256,
+                 min_score: float = 0.6, margin: float = 0.25, smoothing: float = 0.5,
+                 max_frame_bytes: int = 8 * 1024 ** 2):
+        self.root = Path(root)
+        self.long_edge = int(long_edge)
+        self.ttl = float(ttl)
+        self.max_sessions = max(1, int(max_sessions))
+        self.min_score = float(min_score)
+        self.margin = float(margin)
+        self.smoothing = float(smoothing)
+        self.max_frame_bytes = int(max_frame_bytes)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, sid: str, suffix: str) -> Path:
+        return self.root / f"{sid}{suffix}"
+
+    @contextmanager
+    def _locked(self, sid: str):
+        with open(self._path(sid, ".lock"), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            yield
+
+    def _remove(self, sid: str) -> bool:
+        found = False
+        for suffix in (".json", ".frame", ".lock"):
+            try:
+                self._path(sid, suffix).unlink()
+                found = found or suffix == ".json"
+            except FileNotFoundError:
+                pass
+        return found
+
+    def _evict(self, now: float):
+        # Son kullanım = durum dosyasının mtime'ı
+        seen = []
+        for p in self.root.glob("*.json"):
+            try:
+                seen.append((p.stat().st_mtime, p.stem))
+            except FileNotFoundError:
+                continue
+        seen.sort()
+        extra = len(seen) - self.max_sessions
+        for i, (mtime, sid) in enumerate(seen):
+            if i >= extra and now - mtime <= self.ttl:
+                break
+            self._remove(sid)
+
+    def _load(self, sid: str) -> Optional[Dict[str, Any]]:
+        if not _SID.fullmatch(sid):
+            return None
+        p = self._path(sid, ".json")
+        try:
+            if time.time() - p.stat().st_mtime > self.ttl:
+                self._remove(sid)
+                return None
+            s = json.loads(p.read_bytes())
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(p)
+        if s["size"] is not None:
+            s["size"] = tuple(s["size"])
+        if s["quad"] is not None:
+            s["quad"] = np.float32(s["quad"])
+        return s
+
+    def _save(self, sid: str, s: Dict[str, Any]):
+        out = dict(s, quad=s["quad"].tolist() if s["quad"] is not None else None)
+        atomic_write(self._path(sid, ".json"), json.dumps(out).encode())
+
+    def create(self, source_long_edge: int = 0) -> str:
+        sid = uuid.uuid4().hex
+        self._save(sid, {"created": time.time(), "source_long_edge": int(source_long_edge),
+                         "frames": 0, "size": None, "quad": None, "score": None,
+                         "best": None})
+        self._evict(time.time())
+        return sid
+
+    def frame(self, sid: str, data: bytes, max_pixels: int = 0,
+              ext: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Oturuma bir kare ekler (ext: dosya uzantısı, en iyi kareyle saklanır). Oturum yoksa None; aksi halde
+        {"frame", "mode": "track"|"detect", "quad", "score", "sharpness",
+        "best_frame", "frame_size"} (koordinatlar karede, quad [tl, tr, bl, br]).
+        decode_preview hataları ve max_frame_bytes aşımı (ImageTooLarge)
+        çağırana geçer; okunamayan karede {"error": "read_fail"}.
+        """
+        if self.max_frame_bytes and len(data) > self.max_frame_bytes:
+            raise ImageTooLarge(f"{len(data)} byte frame exceeds {self.max_frame_bytes} bytes")
+        if not _SID.fullmatch(sid) or not self._path(sid, ".json").exists():
+            return None
+        dec = decode_preview(data, self.long_edge, max_pixels)
+        if dec is None:
+            return {"error": "read_fail"}
+        small, size = dec
+        H, W = small.shape[:2]
+        f = np.float32([size[0] / float(W), size[1] / float(H)])
+
+        with self._locked(sid):
+            s = self._load(sid)
+            if s is None:
+                self._remove(sid)  # yarışta kalan kilit dosyası
+                return None
+            src_scale = (s["source_long_edge"] or max(size)) / float(max(W, H))
+            s["frames"] += 1
+            if s["size"] != size:
+                s["size"], s["quad"], s["score"] = size, None, None  # kare boyutu değişti
+            prev = s["quad"] / f if s["quad"] is not None else None
+
+            mode, box, score = "detect", None, None
+            if prev is not None and s["score"] is not None and s["score"] >= self.min_score:
+                x0, y0, x1, y1 = _bounds(prev, self.margin, W, H)
+                roi = small[y0:y1, x0:x1]
+                found = find_question_box(roi, debug=False, src_scale=src_scale,
+                                          gray=gray_clahe(roi), top_k=1)
+                if found["best_box"] is not None and found["score"] >= self.min_score:
+                    cand = found["best_box"] + np.float32([x0, y0])
+                    # Çevreyi yutan kutu (kayma) kabul edilmez
+                    if _quad_iou(cand, prev) >= 0.5:
+                        mode, box, score = "track", cand, found["score"]
+            if box is None:
+                pipe = QuestionPipeline(small, src_scale=src_scale, shared_clahe=True)
+                found = pipe.find(top_k=1)
+                if found["best_box"] is not None:
+                    x, y = pipe.page_rect()[:2]
+                    box, score = found["best_box"] + np.float32([x, y]), found["score"]
+
+            res = {"frame": s["frames"], "mode": mode, "frame_size": list(size),
+                   "quad": None, "score": None, "sharpness": None}
+            if box is not None:
+                q = order_quad(box)
+                if prev is not None and _quad_iou(q, prev) >= 0.5:
+                    a = self.smoothing
+                    q = a * q + (1.0 - a) * prev
+                s["quad"], s["score"] = q * f, float(score)
+                sharp = sharpness(small, q)
+                best = s["best"]
+                if best is None or sharp > best["sharpness"]:
+                    atomic_write(self._path(sid, ".frame"), data)
+                    s["best"] = {"frame": s["frames"], "ext": ext,
+                                 "quad": s["quad"].tolist(), "size": list(size),
+                                 "score": float(score), "sharpness": sharp}
+                res.update(quad=np.round(s["quad"], 1).tolist(), score=round(float(score), 4),
+                           sharpness=round(sharp, 2))
+            else:
+                s["score"] = None  # sonraki kare tam tespitle başlar
+            self._save(sid, s)
+            res["best_frame"] = s["best"]["frame"] if s["best"] is not None else None
+            return res
+
+    def best(self, sid: str) -> Optional[Dict[str, Any]]:
+        """
+        En keskin kare: {"frame", "data", "ext", "quad", "size", "score", "sharpness"};
+        henüz quad bulunan kare yoksa None, oturum yoksa KeyError.
+        """
+        if not _SID.fullmatch(sid) or not self._path(sid, ".json").exists():
+            raise KeyError(sid)
+        with self._locked(sid):
+            s = self._load(sid)
+            if s is None:
+                self._remove(sid)
+                raise KeyError(sid)
+            if s["best"] is None:
+                return None
+            try:
+                data = self._path(sid, ".frame").read_bytes()
+            except FileNotFoundError:
+                raise KeyError(sid)
+        best = s["best"]
+        return dict(best, data=data, quad=np.float32(best["quad"]), size=tuple(best["size"]))
+
+    def close(self, sid: str) -> bool:
+        return bool(_SID.fullmatch(sid)) and self._remove(sid)
+
+    def stats(self) -> Dict[str, int]:
+        self._evict(time.time())
+        return {"sessions": sum(1 for _ in self.root.glob("*.json"))}
@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+
+from testly_backend.services.admission import Admission, Rejected
+
+
+def test_admits_within_limits_and_releases():
+    adm = Admission(max_concurrent=2, memory_budget=100)
+    with adm.admit(40):
+        with adm.admit(40):
+            assert adm.stats() == {"inflight": 2, "queued": 0, "memory_bytes": 80}
+    assert adm.stats() == {"inflight": 0, "queued": 0, "memory_bytes": 0}
+
+
+def test_oversized_cost_is_clamped_and_runs_alone():
+    adm = Admission(max_concurrent=4, memory_budget=100, max_queue=0)
+    with adm.admit(10 ** 9):
+        assert adm.stats()["memory_bytes"] == 100
+        with pytest.raises(Rejected) as e:
+            with adm.admit(1):
+                pass
+        assert (e.value.reason, e.value.status) == ("busy", 429)
+    with adm.admit(10 ** 9):
+        pass
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    adm = Admission(max_concurrent=1, memory_budget=100, max_queue=0, retry_after=7)
+    with adm.admit(1):
+        with pytest.raises(Rejected) as e:
+            with adm.admit(1):
+                pass
+    assert (e.value.status, e.value.retry_after) == (429, 7)
+
+
+def test_queue_timeout_is_503():
+    adm = Admission(max_concurrent=1, memory_budget=100, max_queue=1, queue_timeout=0.05)
+    with adm.admit(1):
+        with pytest.raises(Rejected) as e:
+            with adm.admit(1):
+                pass
+    assert (e.value.reason, e.value.status) == ("overloaded", 503)
+    assert adm.stats()["queued"] == 0
+
+
+def test_waiters_enter_in_fifo_order():
+    adm = Admission(max_concurrent=1, memory_budget=100, max_queue=4, queue_timeout=5.0)
+    order = []
+
+    def worker(i):
+        with adm.admit(1):
+            order.append(i)
+
+    with adm.admit(1):
+        threads = []
+        for i in range(3):
+            t = threading.Thread(target=worker, args=(i,))
+            t.start()
+            threads.append(t)
+            while adm.stats()["queued"] < i + 1:  # sıraya girdiğinden emin ol
+                time.sleep(0.001)
+    for t in threads:
+        t.join(5.0)
+    assert order == [0, 1, 2]
@@ -0,0 +1,62 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from testly_backend.services.batch import JOURNAL_NAME, load_journal, run_batch
+
+ROOT = Path(__file__).resolve().parents[1]
+SAMPLES = sorted((ROOT / "storage" / "uploads").glob("*.jpg"))[:2]
+
+
+@pytest.fixture
+def tree(tmp_path):
+    if len(SAMPLES) < 2:
+        pytest.skip("sample uploads not available")
+    src = tmp_path / "in"
+    (src / "sub").mkdir(parents=True)
+    shutil.copy(SAMPLES[0], src / "a.jpg")
+    shutil.copy(SAMPLES[1], src / "sub" / "b.jpg")
+    (src / "bad.jpg").write_bytes(b"not a jpeg")
+    (src / "notes.txt").write_text("skip me")
+    return src, tmp_path / "out"
+
+
+def _run(src, out, **kw):
+    return run_batch(src, out, workers=1, **kw)
+
+
+def test_resume_skips_done_and_retries_failed(tree):
+    src, out = tree
+    s = _run(src, out)
+    assert (s["processed"], s["ok"], s["failed"], s["skipped"]) == (3, 2, 1, 0)
+    assert s["failures"] == [{"path": "bad.jpg", "error": "read_fail"}]
+    assert (out / "a_final.png").exists() and (out / "sub" / "b_final.png").exists()
+
+    s = _run(src, out)
+    assert (s["processed"], s["skipped"]) == (0, 3)
+
+    s = _run(src, out, retry_failed=True)
+    assert (s["processed"], s["failed"], s["skipped"]) == (1, 1, 2)
+
+    # Değişen girdi (boyut/mtime) yeniden işlenir, çıktı üzerine yazılır
+    st = os.stat(src / "a.jpg")
+    os.utime(src / "a.jpg", (st.st_atime, st.st_mtime + 10))
+    s = _run(src, out)
+    assert (s["processed"], s["ok"], s["skipped"]) == (1, 1, 2)
+    assert sorted(p.name for p in out.rglob("*.png")) == ["a_final.png", "b_final.png"]
+
+    journal = load_journal(out / JOURNAL_NAME)
+    assert set(journal) == {"a.jpg", os.path.join("sub", "b.jpg"), "bad.jpg"}
+    assert journal["a.jpg"]["ok"] and journal["a.jpg"]["output"] == "a_final.png"
+
+
+def test_load_journal_ignores_partial_line_and_keeps_last(tmp_path):
+    p = tmp_path / JOURNAL_NAME
+    recs = [{"path": "x.jpg", "size": 1, "mtime": 1.0, "ok": False},
+            {"path": "x.jpg", "size": 1, "mtime": 1.0, "ok": True}]
+    p.write_text("".join(json.dumps(r) + "\n" for r in recs) + '{"path": "y.jp')
+    assert load_journal(p) == {"x.jpg": recs[1]}
+    assert load_journal(tmp_path / "missing.jsonl") == {}
@@ -0,0 +1,28 @@
+# Golden regresyon kapısı: bench ile aynı kontrol, CI'da pytest altında.
+# Girdiler storage/uploads, beklenen çıktılar bench/golden.
+import glob
+from pathlib import Path
+
+import pytest
+
+from bench.bench_pipeline import DEFAULT_GOLDEN, run
+from testly_backend.services.refined_question_pipeline import is_image
+
+ROOT = Path(__file__).resolve().parents[1]
+MIN_IOU = 0.9
+MIN_AGREEMENT = 0.98
+
+PATHS = sorted(p for p in glob.glob(str(ROOT / "storage" / "uploads" / "*"))
+               if is_image(p) and (DEFAULT_GOLDEN / f"{Path(p).stem}.json").exists())
+
+
+@pytest.mark.skipif(not PATHS, reason="golden corpus not available")
+@pytest.mark.parametrize("gray", [False, True], ids=["color", "gray"])
+def test_golden_gate(gray):
+    res = run(PATHS, 1, str(DEFAULT_GOLDEN), {"gray": gray, "fmt": "png", "effort": "balanced"})
+    assert res["failures"] == 0
+    assert res["accuracy"]["compared"] == len(PATHS)
+    bad = {r["file"]: (round(r["iou"], 3), round(r["agreement"] or 0.0, 3))
+           for r in res["per_image"]
+           if r["iou"] < MIN_IOU or (r["agreement"] or 0.0) < MIN_AGREEMENT}
+    assert not bad
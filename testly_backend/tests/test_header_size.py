@@ -0,0 +1,79 @@
+import io
+
+import cv2 as cv
+import numpy as np
+import pytest
+from PIL import Image
+
+from testly_backend.services.processing import (ImageTooLarge, _jpeg_size, decode_plan,
+                                                header_size)
+
+
+def _img(w, h):
+    rng = np.random.default_rng(w + h)
+    return rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+
+
+def _pil_jpeg(w, h, **kw):
+    buf = io.BytesIO()
+    Image.fromarray(_img(w, h)).save(buf, "JPEG", **kw)
+    return buf.getvalue()
+
+
+def _sof_only(w, h):
+    # SOI + APP0 + SOF0 başlığı; piksel verisi yok
+    app0 = b"\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof = b"\xff\xc0\x00\x11\x08" + h.to_bytes(2, "big") + w.to_bytes(2, "big") + \
+        b"\x03\x01\x22\x00\x02\x11\x01\x03\x11\x01"
+    return b"\xff\xd8" + app0 + sof
+
+
+@pytest.mark.parametrize("w,h", [(1, 1), (17, 9), (640, 480), (2252, 4000)])
+def test_jpeg_size_baseline(w, h):
+    ok, buf = cv.imencode(".jpg", _img(w, h))
+    assert ok and _jpeg_size(buf.tobytes()) == (w, h)
+
+
+def test_jpeg_size_progressive_with_exif():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: başlık boyutu ham (döndürülmemiş) kalır
+    data = _pil_jpeg(123, 45, progressive=True, exif=exif.tobytes())
+    assert _jpeg_size(data) == (123, 45)
+
+
+def test_jpeg_size_skips_fill_bytes():
+    data = _sof_only(300, 200)
+    assert _jpeg_size(data[:2] + b"\xff\xff" + data[2:]) == (300, 200)
+
+
+@pytest.mark.parametrize("data", [
+    b"\xff\xd8",
+    _sof_only(300, 200)[:-12],                       # SOF yarım
+    b"\xff\xd8\xff\xda\x00\x02" + b"\x00" * 20,      # SOF'tan önce SOS
+    b"\xff\xd8\x00\x00" + b"\x00" * 20,              # işaret değil
+    _sof_only(0, 200),
+])
+def test_jpeg_size_malformed_is_none(data):
+    assert _jpeg_size(data) is None
+
+
+def test_header_size_png_and_garbage():
+    ok, buf = cv.imencode(".png", _img(31, 7))
+    assert header_size(buf.tobytes()) == (31, 7)
+    assert header_size(b"not an image") is None
+
+
+def test_decode_plan_from_header_only():
+    huge = _sof_only(30000, 20000)
+    with pytest.raises(ImageTooLarge):
+        decode_plan(huge, 40_000_000, oversize="reject")
+    plan = decode_plan(huge, 40_000_000)
+    assert plan["reduce"] == 4 and plan["work_pixels"] <= 40_000_000
+    assert decode_plan(huge, 10_000_000)["reduce"] == 8
+    assert decode_plan(_sof_only(4000, 3000), 40_000_000)["reduce"] == 1
+    assert decode_plan(_sof_only(8000, 6000), 20_000_000)["reduce"] == 2
+
+    ok, png = cv.imencode(".png", _img(300, 200))
+    with pytest.raises(ImageTooLarge):
+        decode_plan(png.tobytes(), 10_000, max_decode_pixels=50_000)
+    assert decode_plan(png.tobytes(), 10_000)["reduce"] == 1
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from testly_backend.services.morphology import dilate_close, get_engine, set_engine
+
+CASES = [
+    # (dilate, close, iterations)
+    ([(10, 3), (3, 35)], (5, 5), 2),
+    ([(4, 2), (2, 6)], (6, 4), 1),
+    ([(1, 1)], (3, 3), 3),
+    ([(7, 1)], (2, 2), 0),
+    ([(120, 3), (3, 90)], (25, 25), 2),
+]
+
+
+@pytest.mark.parametrize("W", [1, 63, 64, 65, 130, 301])
+@pytest.mark.parametrize("dilate,close,iterations", CASES)
+def test_packed_matches_opencv(W, dilate, close, iterations):
+    rng = np.random.default_rng(W * 31 + iterations)
+    binv = np.where(rng.random((97, W)) < 0.02, 255, 0).astype(np.uint8)
+    ref = dilate_close(binv, dilate, close, iterations, engine="opencv")
+    out = dilate_close(binv, dilate, close, iterations, engine="packed")
+    assert out.dtype == np.uint8 and out.shape == binv.shape
+    assert np.array_equal(out, ref)
+
+
+@pytest.mark.parametrize("fill", [0, 255])
+def test_packed_matches_opencv_on_uniform_masks(fill):
+    # Sınır davranışı: dilate'te görüntü dışı 0, erode'da 255
+    binv = np.full((40, 70), fill, np.uint8)
+    assert np.array_equal(dilate_close(binv, [(9, 3)], (5, 5), 2, engine="packed"),
+                          dilate_close(binv, [(9, 3)], (5, 5), 2, engine="opencv"))
+
+
+def test_unknown_engine_is_rejected():
+    prev = get_engine()
+    with pytest.raises(ValueError):
+        set_engine("simd")
+    assert get_engine() == prev
+    with pytest.raises(ValueError):
+        dilate_close(np.zeros((4, 4), np.uint8), [(3, 3)], (3, 3), engine="simd")
@@ -0,0 +1,99 @@
+import pytest
+
+from testly_backend.services import result_cache
+from testly_backend.services.result_cache import ResultCache, cache_key, upload_hash
+
+
+class Clock:
+    def __init__(self, t=1000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(result_cache.time, "time", c)
+    return c
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    out, up = tmp_path / "outputs", tmp_path / "uploads"
+    out.mkdir()
+    up.mkdir()
+    return out, up
+
+
+def _put(cache, out, key, size, upload_name=""):
+    p = out / f"{key}_final.png"
+    p.write_bytes(b"x" * size)
+    cache.put(key, upload_name, str(p), {"width": 1, "height": 1})
+    return p
+
+
+def test_cache_key_depends_on_params():
+    d = upload_hash(b"img")
+    assert cache_key(d, {"gray": False}) == cache_key(d, {"gray": False})
+    assert cache_key(d, {"gray": False}) != cache_key(d, {"gray": True})
+    assert cache_key(d, {"gray": False}) != cache_key(upload_hash(b"other"), {"gray": False})
+
+
+def test_hit_and_miss(tmp_path, dirs, clock):
+    out, _ = dirs
+    cache = ResultCache(tmp_path / "c.sqlite3", out)
+    assert cache.get("k") is None
+    _put(cache, out, "k", 10)
+    hit = cache.get("k")
+    assert hit["output_name"] == "k_final.png" and hit["meta"] == {"width": 1, "height": 1}
+    s = cache.stats()
+    assert (s["hits"], s["misses"], s["entries"], s["bytes"]) == (1, 1, 1, 10)
+
+
+def test_evicts_least_recently_hit_over_max_bytes(tmp_path, dirs, clock):
+    out, _ = dirs
+    cache = ResultCache(tmp_path / "c.sqlite3", out, max_bytes=25)
+    _put(cache, out, "a", 10)
+    clock.t += 1
+    _put(cache, out, "b", 10)
+    clock.t += 1
+    assert cache.get("a") is not None  # a artık b'den yeni
+    clock.t += 1
+    _put(cache, out, "c", 10)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    # Yalnızca indeks: çıktı dosyası silinmez
+    assert (out / "b_final.png").exists()
+
+
+def test_expires_after_max_age(tmp_path, dirs, clock):
+    out, _ = dirs
+    cache = ResultCache(tmp_path / "c.sqlite3", out, max_age=60)
+    _put(cache, out, "k", 10)
+    clock.t += 61
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_missing_question_output_or_upload_is_a_miss(tmp_path, dirs, clock):
+    out, up = dirs
+    cache = ResultCache(tmp_path / "c.sqlite3", out, upload_dir=up)
+    qs = []
+    for i in (1, 2):
+        (out / f"m_q{i}.png").write_bytes(b"q")
+        qs.append({"output": f"m_q{i}.png"})
+    (up / "m.jpg").write_bytes(b"u")
+    cache.put("m", "m.jpg", str(out / "m_q1.png"), {"questions": qs})
+    assert cache.get("m") is not None
+    (out / "m_q2.png").unlink()
+    assert cache.get("m") is None
+
+    p = _put(cache, out, "u", 10, upload_name="u.jpg")
+    assert cache.get("u") is None  # yükleme yok
+    (up / "u.jpg").write_bytes(b"u")
+    _put(cache, out, "u", 10, upload_name="u.jpg")
+    assert cache.get("u") is not None
+    p.unlink()
+    assert cache.get("u") is None
@@ -0,0 +1,77 @@
+import pytest
+
+from testly_backend.services.results_index import ResultsIndex, question_rows
+
+
+@pytest.fixture
+def index(tmp_path):
+    out = tmp_path / "outputs"
+    out.mkdir()
+    idx = ResultsIndex(f"sqlite:///{tmp_path / 'results.sqlite3'}", output_dir=out,
+                       flush_interval=0.01)
+    yield idx, out
+    idx.flush()
+    idx.engine.dispose()
+
+
+def _rows(out, owner, n, prefix="q"):
+    rows = []
+    for i in range(n):
+        name = f"{prefix}{i}_final.png"
+        (out / name).write_bytes(b"x")
+        rows += question_rows({"width": 1, "height": 1, "score": 0.5}, "h", "", name, owner)
+    return rows
+
+
+def test_question_rows_score():
+    single = question_rows({"width": 2, "height": 3, "score": 0.71}, "h", "u.jpg", "o.png")
+    assert single[0]["score"] == 0.71 and single[0]["question_index"] == 0
+    legacy = question_rows({"width": 2, "height": 3, "candidates": [{"score": 0.6}, {"score": 0.2}]},
+                           "h", "u.jpg", "o.png")
+    assert legacy[0]["score"] == 0.6
+    multi = question_rows({"questions": [
+        {"output": "a.png", "best_box": None, "score": 0.9, "width": 1, "height": 1},
+        {"output": "b.png", "best_box": None, "score": 0.8, "width": 1, "height": 1}]},
+        "h", "u.jpg", "a.png", "me")
+    assert [(r["question_index"], r["output_path"], r["score"]) for r in multi] == \
+        [(1, "a.png", 0.9), (2, "b.png", 0.8)]
+
+
+def test_keyset_paging_newest_first_per_owner(index):
+    idx, out = index
+    idx.record(_rows(out, "alice", 5))
+    idx.record(_rows(out, "bob", 2, prefix="b"))
+    idx.flush()
+
+    seen, cursor = [], None
+    while True:
+        page = idx.list("alice", limit=2, before=cursor)
+        seen += [r["output_path"] for r in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [f"q{i}_final.png" for i in reversed(range(5))]
+    assert {r["owner"] for r in idx.list("bob", limit=10)["items"]} == {"bob"}
+
+
+def test_dedupe_skips_same_owner_and_output(index):
+    idx, out = index
+    rows = _rows(out, "alice", 1)
+    idx.record(rows)
+    idx.record(rows, dedupe=True)
+    idx.record(rows, dedupe=True)
+    idx.record(_rows(out, "bob", 1), dedupe=True)
+    idx.flush()
+    assert len(idx.list("alice")["items"]) == 1
+    assert len(idx.list("bob")["items"]) == 1
+    assert idx.stats()["written"] == 2
+
+
+def test_rows_with_deleted_output_are_pruned(index):
+    idx, out = index
+    idx.record(_rows(out, "alice", 3))
+    idx.flush()
+    (out / "q1_final.png").unlink()
+    assert [r["output_path"] for r in idx.list("alice")["items"]] == ["q2_final.png", "q0_final.png"]
+    (out / "q1_final.png").write_bytes(b"x")
+    assert len(idx.list("alice")["items"]) == 2  # satır silindi, geri gelmez
@@ -0,0 +1,47 @@
+import numpy as np
+
+from testly_backend.services.refined_question_pipeline import select_questions
+
+
+def _cand(x, y, w, h, score):
+    box = np.float32([[x, y], [x + w, y], [x + w, y + h], [x, y + h]])
+    return {"box": box, "rect": (x, y, w, h), "score": score}
+
+
+def _rects(picks):
+    return [(c["rect"], c["rank"]) for c in picks]
+
+
+def test_overlapping_lower_score_is_suppressed():
+    cands = [_cand(0, 0, 100, 100, 0.9),
+             _cand(10, 10, 100, 100, 0.8),    # IoU ~0.68 -> atılır
+             _cand(0, 200, 100, 100, 0.7)]
+    assert _rects(select_questions(cands)) == [((0, 0, 100, 100), 0), ((0, 200, 100, 100), 1)]
+
+
+def test_nms_threshold_is_exclusive():
+    # IoU tam 1/3: nms_iou=0.3 atar, 0.34 tutar
+    cands = [_cand(0, 0, 100, 100, 0.9), _cand(50, 0, 100, 100, 0.8)]
+    assert len(select_questions(cands, nms_iou=0.3)) == 1
+    assert len(select_questions(cands, nms_iou=0.34)) == 2
+
+
+def test_best_is_always_kept_below_min_score():
+    cands = [_cand(0, 0, 50, 50, 0.2), _cand(0, 100, 50, 50, 0.1)]
+    picks = select_questions(cands, min_score=0.6)
+    assert _rects(picks) == [((0, 0, 50, 50), 0)]
+
+
+def test_stops_at_min_score_and_max_questions():
+    cands = [_cand(0, 300 - 100 * i, 50, 50, s) for i, s in enumerate((0.9, 0.8, 0.7, 0.5))]
+    assert len(select_questions(cands, min_score=0.6)) == 3
+    assert len(select_questions(cands, min_score=0.0, max_questions=2)) == 2
+
+
+def test_reading_order_with_score_rank():
+    cands = [_cand(200, 0, 50, 50, 0.9),     # sağ üst
+             _cand(0, 100, 50, 50, 0.8),     # sol alt
+             _cand(0, 0, 50, 50, 0.7)]       # sol üst
+    picks = select_questions(cands)
+    assert _rects(picks) == [((0, 0, 50, 50), 2), ((200, 0, 50, 50), 0), ((0, 100, 50, 50), 1)]
+    assert all("hull" not in c and "area" not in c for c in picks)
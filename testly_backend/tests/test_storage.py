@@ -0,0 +1,74 @@
+import os
+import threading
+
+from testly_backend.services.storage import (TMP_SUFFIX, atomic_write, rel_name, shard_name,
+                                             sweep, write_new)
+
+
+def _leftovers(root):
+    return [n for _, _, files in os.walk(root) for n in files if n.endswith(TMP_SUFFIX)]
+
+
+def test_shard_name_is_stable_two_level():
+    a = shard_name("x_final.png")
+    assert a == shard_name("x_final.png")
+    parts = a.split("/")
+    assert len(parts) == 3 and all(len(p) == 2 for p in parts[:2]) and parts[2] == "x_final.png"
+
+
+def test_atomic_write_overwrites(tmp_path):
+    p = tmp_path / "a" / "b.bin"
+    assert atomic_write(p, b"one")
+    assert atomic_write(p, b"two")
+    assert p.read_bytes() == b"two"
+    assert not _leftovers(tmp_path)
+
+
+def test_atomic_write_no_overwrite_keeps_existing(tmp_path):
+    p = tmp_path / "b.bin"
+    assert atomic_write(p, b"one", overwrite=False)
+    assert not atomic_write(p, b"two", overwrite=False)
+    assert p.read_bytes() == b"one"
+    assert not _leftovers(tmp_path)
+
+
+def test_write_new_collision_gets_suffix(tmp_path):
+    first = write_new(tmp_path, "q_final.png", b"1")
+    second = write_new(tmp_path, "q_final.png", b"2")
+    assert first != second
+    assert rel_name(tmp_path, first) == shard_name("q_final.png")
+    assert second.name.startswith("q_") and second.suffix == ".png"
+    assert (first.read_bytes(), second.read_bytes()) == (b"1", b"2")
+    flat = write_new(tmp_path, "flat.png", b"3", shard=False)
+    assert flat == tmp_path / "flat.png"
+
+
+def test_write_new_concurrent_same_name_never_clobbers(tmp_path):
+    paths, barrier = [], threading.Barrier(8)
+
+    def worker(i):
+        barrier.wait()
+        paths.append(write_new(tmp_path, "same.png", str(i).encode()))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(paths)) == 8
+    assert sorted(p.read_bytes() for p in paths) == sorted(str(i).encode() for i in range(8))
+
+
+def test_sweep_age_size_and_stale_tmp(tmp_path):
+    now = 1_000_000.0
+    for name, age in (("old", 500), ("mid", 50), ("new", 10)):
+        p = tmp_path / name
+        p.write_bytes(b"x" * 10)
+        os.utime(p, (now - age, now - age))
+    tmp = tmp_path / f".half{TMP_SUFFIX}"
+    tmp.write_bytes(b"x")
+    os.utime(tmp, (now - 7200, now - 7200))
+
+    res = sweep(tmp_path, max_age=100, max_bytes=10, now=now)
+    assert sorted(os.listdir(tmp_path)) == ["new"]
+    assert res == {"files": 1, "bytes": 10, "deleted": 3, "freed": 21}
@@ -0,0 +1,99 @@
+import os
+import time
+from pathlib import Path
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from testly_backend.services.processing import ImageTooLarge
+from testly_backend.services.tracking import Tracker, sharpness
+
+ROOT = Path(__file__).resolve().parents[1]
+SAMPLE = next(iter(sorted((ROOT / "storage" / "uploads").glob("*.jpg"))), None)
+
+
+@pytest.fixture(scope="module")
+def frames():
+    if SAMPLE is None:
+        pytest.skip("sample uploads not available")
+    img = cv.imread(str(SAMPLE))
+    small = cv.resize(img, (720, 1280), interpolation=cv.INTER_AREA)
+    sharp = cv.imencode(".jpg", small)[1].tobytes()
+    blurred = cv.imencode(".jpg", cv.GaussianBlur(small, (0, 0), 3))[1].tobytes()
+    return sharp, blurred
+
+
+def test_session_tracks_and_keeps_sharpest_frame(tmp_path, frames):
+    sharp, blurred = frames
+    tr = Tracker(tmp_path, min_score=0.0)
+    sid = tr.create()
+    assert tr.best(sid) is None
+
+    r1 = tr.frame(sid, blurred, ext=".jpg")
+    assert r1["frame"] == 1 and r1["mode"] == "detect" and r1["quad"] is not None
+    assert r1["frame_size"] == [720, 1280]
+    r2 = tr.frame(sid, sharp, ext=".jpg")
+    assert r2["frame"] == 2 and r2["mode"] in ("track", "detect")
+    assert r2["best_frame"] == 2 and r2["sharpness"] > r1["sharpness"]
+    r3 = tr.frame(sid, blurred)
+    assert r3["best_frame"] == 2
+
+    best = tr.best(sid)
+    assert best["frame"] == 2 and best["data"] == sharp and best["ext"] == ".jpg"
+    assert best["size"] == (720, 1280) and best["quad"].shape == (4, 2)
+
+    assert tr.close(sid)
+    assert not tr.close(sid)
+    with pytest.raises(KeyError):
+        tr.best(sid)
+    assert tr.frame(sid, sharp) is None
+
+
+def test_state_is_shared_between_instances(tmp_path, frames):
+    sharp, _ = frames
+    a, b = Tracker(tmp_path), Tracker(tmp_path)
+    sid = a.create()
+    a.frame(sid, sharp)
+    assert b.frame(sid, sharp)["frame"] == 2
+    assert b.best(sid)["data"] == sharp
+    assert a.stats() == b.stats() == {"sessions": 1}
+
+
+def test_limits_and_bad_input(tmp_path, frames):
+    sharp, _ = frames
+    tr = Tracker(tmp_path, max_frame_bytes=len(sharp) - 1)
+    sid = tr.create()
+    with pytest.raises(ImageTooLarge):
+        tr.frame(sid, sharp)
+    assert tr.frame(sid, b"x" * 10) == {"error": "read_fail"}
+    assert tr.frame("../../etc/passwd", b"x") is None
+    assert not tr.close("not-a-session")
+
+
+def test_ttl_and_max_sessions_evict(tmp_path):
+    tr = Tracker(tmp_path, ttl=60.0, max_sessions=3)
+    old = tr.create()
+    stale = time.time() - 120
+    os.utime(tmp_path / f"{old}.json", (stale, stale))
+    with pytest.raises(KeyError):
+        tr.best(old)
+
+    sids = [tr.create() for _ in range(3)]
+    for i, sid in enumerate(sids):  # en eski son kullanım önde
+        t = time.time() - 10 + i
+        os.utime(tmp_path / f"{sid}.json", (t, t))
+    tr.create()
+    assert tr.stats() == {"sessions": 3}
+    with pytest.raises(KeyError):
+        tr.best(sids[0])
+
+
+def test_sharpness_orders_blur_and_ignores_degenerate_quad():
+    rng = np.random.default_rng(0)
+    tex = rng.integers(0, 255, (400, 400), dtype=np.uint8)
+    quad = np.float32([[50, 50], [350, 50], [50, 350], [350, 350]])
+    s = sharpness(tex, quad)
+    assert s > sharpness(cv.GaussianBlur(tex, (0, 0), 1), quad) > \
+        sharpness(cv.GaussianBlur(tex, (0, 0), 3), quad)
+    assert sharpness(tex, np.zeros((4, 2), np.float32)) == 0.0
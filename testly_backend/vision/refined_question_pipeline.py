@@ -65,6 +65,29 @@ def gaussian_score(x, mu, tol):
 
 def clamp01(x): return max(0.0, min(1.0, float(x)))
 
+def filter_components(binv, min_area=0, max_area=None,
+                      min_w=0, min_h=0, max_aspect=None, connectivity=8):
+    """
+    Küçük bileşen temizliği, label görüntüsü üzerinde tek geçişte:
+    stats'tan her etiket için tut/at tablosu (LUT) kurulur, sonra
+    clean = lut[labels]. Bileşen başına tam kare tarama yapılmaz.
+    """
+    num, labels, stats, _ = cv.connectedComponentsWithStats(binv, connectivity)
+    area = stats[:, cv.CC_STAT_AREA]
+    keep = area >= min_area
+    if max_area is not None:
+        keep &= area <= max_area
+    if min_w or min_h or max_aspect is not None:
+        bw = stats[:, cv.CC_STAT_WIDTH]
+        bh = stats[:, cv.CC_STAT_HEIGHT]
+        keep &= (bw >= min_w) & (bh >= min_h)
+        if max_aspect is not None:
+            aspect = np.maximum(bw, bh) / np.maximum(np.minimum(bw, bh), 1)
+            keep &= aspect <= max_aspect
+    keep[0] = False  # arka plan
+    lut = np.where(keep, 255, 0).astype(np.uint8)
+    return lut[labels]
+
 # ---------- YOUR PAGE CROP (integrated) ----------
 def page_crop_user(bgr, debug=True):
     """
@@ -93,11 +116,7 @@ def page_crop_user(bgr, debug=True):
     binv = cv.bitwise_and(binv, mask)
     if debug: images.append(("Thr Invert + 80% Center Mask (PC)", binv))
 
-    num, labels, stats, _ = cv.connectedComponentsWithStats(binv, 8)
-    clean = np.zeros_like(binv)
-    for i in range(1, num):
-        if stats[i, cv.CC_STAT_AREA] >= 0.00005 * W * H:
-            clean[labels == i] = 255
+    clean = filter_components(binv, min_area=0.00005 * W * H)
     if debug: images.append(("Noise Clean (PC)", clean))
 
     ker_h = cv.getStructuringElement(cv.MORPH_RECT, (10 * k, 3))
@@ -137,12 +156,7 @@ def refine_question_from_pagecrop(page_crop_bgr, invert_to_black_text=True, debu
     binv = 255 - thr
     if debug: stages.append(("Adaptive thr -> text white", binv))
 
-    num, lbl, stats, _ = cv.connectedComponentsWithStats(binv, 8)
-    clean = np.zeros_like(binv)
-    area_min = 0.00005 * W * H
-    for i in range(1, num):
-        if stats[i, cv.CC_STAT_AREA] >= area_min:
-            clean[lbl == i] = 255
+    clean = filter_components(binv, min_area=0.00005 * W * H)
     if debug: stages.append(("Small component removal", clean))
 
     ker_h = cv.getStructuringElement(cv.MORPH_RECT, (10*k, 3))
@@ -262,12 +276,43 @@ SCRIPT_DIR = Path(__file__).resolve().parent
 
 def run_folder_with_pagecrop(input_dir="sorular",
                              save_dir=None,
-                             show=False):
+                             show=False,
+                             engine="local",
+                             workers=None):
+    """
+    engine="local": bu dosyadaki hat, sırayla; çıktılar save_dir'e düz
+    <stem>_final.png (ad alınmışsa _1, _2 ...).
+    engine="batch": backend'in toplu motoru (testly_backend.services.batch,
+    süreç havuzu, workers kadar). Çıktılar girdi ağacını aynalar
+    (save_dir/<alt_klasör>/<stem>_final.png, aynı ad üzerine yazılır);
+    save_dir/.batch_journal.jsonl ile kaldığı yerden devam eder. show
+    desteklenmez; testly_backend paketi import edilebilir olmalı
+    (proje kökünden PYTHONPATH=.).
+    """
+    if engine not in ("local", "batch"):
+        raise ValueError(f"engine must be 'local' or 'batch', not {engine!r}")
+    if engine == "batch" and show:
+        raise ValueError("engine='batch' does not support show=True")
     # Varsayılan: <script_dizini>/sonsoru  (çift "vision" oluşmaz)
     save_dir = Path(save_dir) if save_dir else (SCRIPT_DIR / "sonsoru")
     save_dir.mkdir(parents=True, exist_ok=True)
     print(f"[save_dir] {save_dir.resolve()}")
 
+    if engine == "batch":
+        try:
+            from testly_backend.services.batch import run_batch
+        except ImportError as e:
+            raise ImportError("engine='batch' needs the testly_backend package "
+                              "on the path (run with PYTHONPATH=.)") from e
+
+        def progress(rec):
+            print(f"[{'ok' if rec['ok'] else 'err'}] {rec['path']}"
+                  + (f" -> {rec['output']}" if rec["ok"] else f" ({rec['error']})"))
+
+        summary = run_batch(input_dir, save_dir, workers=workers, progress=progress)
+        print(f"[done] ok {summary['ok']}, failed {summary['failed']}, "
+              f"skipped {summary['skipped']}, {summary['throughput_ips']} img/s")
+        return summary
     # Alt klasörleri de tara
     paths = sorted([
         p for p in glob.glob(str(Path(input_dir) / "**" / "*"), recursive=True)
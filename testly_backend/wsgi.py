@@ -0,0 +1,15 @@
+# wsgi.py
+# Üretim giriş noktası (pre-fork):  gunicorn -c gunicorn.conf.py
+# OpenCV/NumPy ve hat master süreçte yüklenip ısıtılır (preload_app);
+# worker'lar fork ile hazır modülleri paylaşır.
+import cv2 as cv
+
+# Master'da OpenCV thread havuzu kurulmasın: thread'ler fork'ta kopyalanmaz,
+# worker başına sayı gunicorn.conf.py post_fork'ta ayarlanır.
+cv.setNumThreads(1)
+
+from testly_backend import create_app
+from testly_backend.services.jobs import _warmup
+
+_warmup()
+app = create_app()